@@ -1,25 +1,29 @@
 import os
 import json
 import requests
-import re
+import sys
 
 
 # Get workspace root (assume script is always in bazaar-client/src/scripts/)
 WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../'))
 ITEMS_JSON = os.path.join(WORKSPACE_ROOT, 'bazaar-server/data/items.json')
 OUTPUT_DIR = os.path.join(WORKSPACE_ROOT, 'bazaar-client/public/assets/items')
+MANIFEST_PATH = os.path.join(WORKSPACE_ROOT, 'server/data/image_manifest.json')
+
+sys.path.insert(0, os.path.join(WORKSPACE_ROOT, 'server', 'scripts'))
+from bazaar_data.manifest import load_manifest, save_manifest, scan
+from bazaar_data.naming import safe_filename
 
 # Ensure output directory exists
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-def safe_filename(name):
-    # Replace spaces and unsafe chars with underscores, keep alphanum and dash/underscore/period
-    return re.sub(r'[^\w\-\.]', '_', name)
-
 def main():
     with open(ITEMS_JSON, 'r', encoding='utf-8') as f:
         items = json.load(f)
 
+    manifest = load_manifest(MANIFEST_PATH)
+    existing = scan(manifest, OUTPUT_DIR)
+
     for item in items:
         # Support both key styles
         name = item.get('name') or item.get('Items')
@@ -27,9 +31,9 @@ def main():
         if not name or not url:
             print(f"Skipping item with missing name or image: {item}")
             continue
-        filename = safe_filename(name) + os.path.splitext(url)[-1].split('?')[0]
+        filename = safe_filename(name)
         out_path = os.path.join(OUTPUT_DIR, filename)
-        if os.path.exists(out_path):
+        if filename in existing:
             print(f"Exists, skipping: {filename}")
             continue
         try:
@@ -41,5 +45,8 @@ def main():
         except Exception as e:
             print(f"Failed to download {url} as {filename}: {e}")
 
+    scan(manifest, OUTPUT_DIR)
+    save_manifest(manifest, MANIFEST_PATH)
+
 if __name__ == '__main__':
     main()
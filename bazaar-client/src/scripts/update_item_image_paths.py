@@ -1,6 +1,6 @@
 import os
 import json
-import re
+import sys
 
 # Paths
 WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../'))
@@ -8,13 +8,12 @@ ITEMS_JSON = os.path.join(WORKSPACE_ROOT, 'bazaar-server/data/items.json')
 ASSETS_DIR = 'assets/items'
 ASSETS_ABS = os.path.join(WORKSPACE_ROOT, 'bazaar-client', 'public', 'assets/items')
 
-# Use the same safe filename logic as before
-def safe_filename(name):
-    return re.sub(r'[^\w\-\.]', '_', name)
+# Same file names as the server's getImageFilename()
+sys.path.insert(0, os.path.join(WORKSPACE_ROOT, 'server', 'scripts'))
+from bazaar_data.naming import safe_filename
 
 def get_local_image_path(name, url):
-    ext = os.path.splitext(url)[-1].split('?')[0]
-    return f"{ASSETS_DIR}/{safe_filename(name)}{ext}"
+    return f"{ASSETS_DIR}/{safe_filename(name)}"
 
 def main():
     with open(ITEMS_JSON, 'r', encoding='utf-8') as f:
@@ -5,10 +5,8 @@ This script runs outside Docker containers to have proper file system access
 """
 
 import os
+import sys
 import json
-import requests
-import re
-from urllib.parse import urljoin
 import time
 
 # Paths
@@ -16,83 +14,79 @@ WORKSPACE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ITEMS_JSON = os.path.join(WORKSPACE_ROOT, 'server/data/items.json')
 PUBLIC_IMAGES_DIR = os.path.join(WORKSPACE_ROOT, 'bazaar-client/public/assets/items')
 BUILD_IMAGES_DIR = os.path.join(WORKSPACE_ROOT, 'bazaar-client/build/assets/items')
+# Shared with the server scripts (server/ is mounted at /app in the container)
+MANIFEST_PATH = os.path.join(WORKSPACE_ROOT, 'server/data/image_manifest.json')
+# Content-addressed store; the public and build images are hardlinks into it.
+# Kept with the server data (the pipeline's store), outside anything nginx serves
+IMAGE_STORE_DIR = os.path.join(WORKSPACE_ROOT, 'server/data/image_store')
+VARIANTS_PATH = os.path.join(WORKSPACE_ROOT, 'server/data/image_variants.json')
 
-def safe_filename(name):
-    """Convert item name to safe filename"""
-    return re.sub(r'[^\w\-\.]', '_', name)
+# Share the parallel image downloader with the server's scrape job
+sys.path.insert(0, os.path.join(WORKSPACE_ROOT, 'server', 'scripts'))
+from bazaar_data.manifest import load_manifest, save_manifest, scan, stale
+from bazaar_data.naming import legacy_filenames, safe_filename, wiki_filename
+from bazaar_data.optimize import available as image_optimize_available
+from bazaar_data.optimize import load_variants, optimize_images, report_optimization, save_variants
+from bazaar_data.store import ImageStore
+from bazaar_data.sync import ImageJob, report_results, sync_images
 
-def download_image(item_name, image_path, dest_dir):
-    """Download image from wiki to destination directory"""
-    try:
-        # Convert to wiki media URL format
-        # From: "/assets/items/Fire_Beetle.png"
-        # To: "https://brightershoreswiki.org/w/Special:Redirect/file/Fire_Beetle.png"
-        if image_path.startswith('/assets/items/'):
-            filename = image_path.replace('/assets/items/', '')
-            wiki_url = f"https://brightershoreswiki.org/w/Special:Redirect/file/{filename}"
-        elif image_path.startswith('/'):
-            # Try alternative wiki format
-            filename = image_path.split('/')[-1]
-            wiki_url = f"https://brightershoreswiki.org/w/Special:Redirect/file/{filename}"
-        else:
-            wiki_url = image_path
-        
-        # Generate filename
-        filename = safe_filename(item_name) + '.png'
-        dest_path = os.path.join(dest_dir, filename)
-        
-        # Skip if already exists
-        if os.path.exists(dest_path):
-            return False, f"exists: {filename}"
-        
-        print(f"Downloading: {item_name} -> {filename}")
-        
-        # Download image
-        response = requests.get(wiki_url, timeout=10)
-        response.raise_for_status()
-        
-        # Save to public directory
-        with open(dest_path, 'wb') as f:
-            f.write(response.content)
-        
-        # Also save to build directory for immediate nginx serving
-        build_dir = '/home/proniss/bazaar-dev/bazaar-client/build/assets/items'
-        os.makedirs(build_dir, exist_ok=True)
-        build_path = os.path.join(build_dir, filename)
-        with open(build_path, 'wb') as f:
-            f.write(response.content)
-        
-        return True, f"downloaded: {filename}"
-        
-    except Exception as e:
-        return False, f"failed {item_name}: {str(e)}"
+def check_existing_image(item_name, dest_dir, present, store):
+    """Check if image exists with current or old naming patterns.
 
-def check_existing_image(item_name, dest_dir):
-    """Check if image exists with current or old naming patterns"""
-    filename = safe_filename(item_name) + '.png'
+    `present` is the manifest mapping of filenames in dest_dir.
+    Returns (exists, path, renamed).
+    """
+    filename = safe_filename(item_name)
     path = os.path.join(dest_dir, filename)
     
     # Check current naming
-    if os.path.exists(path):
-        return True, path
+    if filename in present:
+        return True, path, False
     
-    # Check old "Potent" naming
+    # Check old "Potent" naming and file names from older naming schemes
     old_item_name = item_name.replace("Potion", "Potent Potion")
-    old_filename = safe_filename(old_item_name) + '.png'
-    old_path = os.path.join(dest_dir, old_filename)
+    candidates = legacy_filenames(item_name) + [safe_filename(old_item_name)] + legacy_filenames(old_item_name)
+    old_filename = next((candidate for candidate in candidates if candidate in present), None)
     
-    if os.path.exists(old_path):
-        # Copy to new naming
+    if old_filename:
+        old_path = os.path.join(dest_dir, old_filename)
+        # Link the new name to the same stored image
         try:
-            with open(old_path, 'rb') as src, open(path, 'wb') as dst:
-                dst.write(src.read())
+            store.link(old_path, path, present[old_filename]['sha256'])
             print(f"Updated naming: {old_filename} -> {filename}")
-            return True, path
+            return True, path, True
         except Exception as e:
             print(f"Failed to update {old_filename}: {e}")
-            return True, old_path  # At least the old one exists
+            return True, old_path, False  # At least the old one exists
     
-    return False, path
+    return False, path, False
+
+def sync_build_images(manifest, store):
+    """Link public images that are missing or outdated in the build directory"""
+    outdated = stale(manifest, BUILD_IMAGES_DIR, PUBLIC_IMAGES_DIR)
+    public_files = scan(manifest, PUBLIC_IMAGES_DIR)
+    for filename in sorted(outdated):
+        try:
+            store.link(os.path.join(PUBLIC_IMAGES_DIR, filename), os.path.join(BUILD_IMAGES_DIR, filename),
+                       public_files[filename]['sha256'])
+        except Exception as e:
+            print(f"⚠️  Failed to copy {filename} to build directory: {e}")
+    if outdated:
+        print(f"🔁 Synced {len(outdated)} missing/outdated images into the build directory")
+        scan(manifest, BUILD_IMAGES_DIR)
+
+def optimize_public_images(manifest, store):
+    """Generate WebP/AVIF variants and thumbnails for new or changed public images"""
+    if not image_optimize_available():
+        print("ℹ️  Pillow not installed, skipping image optimization (pip install Pillow)")
+        return
+    print("\n🖼️  Optimizing images...")
+    index = load_variants(VARIANTS_PATH)
+    start = time.perf_counter()
+    encoded = optimize_images(scan(manifest, PUBLIC_IMAGES_DIR), PUBLIC_IMAGES_DIR, index,
+                              [PUBLIC_IMAGES_DIR, BUILD_IMAGES_DIR], store=store)
+    report_optimization(encoded, time.perf_counter() - start)
+    save_variants(index, VARIANTS_PATH)
 
 def main():
     print("🔍 Checking for missing item images...")
@@ -112,6 +106,18 @@ def main():
     
     print(f"📊 Found {len(items_data)} items in database")
     
+    # One directory scan per image directory instead of a stat per item
+    manifest = load_manifest(MANIFEST_PATH)
+    store = ImageStore(IMAGE_STORE_DIR)
+    public_files = scan(manifest, PUBLIC_IMAGES_DIR)
+    
+    # Collapse duplicate copies (including identical art across variants) into the store
+    for directory, files in ((PUBLIC_IMAGES_DIR, public_files),
+                             (BUILD_IMAGES_DIR, scan(manifest, BUILD_IMAGES_DIR))):
+        relinked = store.dedupe(files, directory)
+        if relinked:
+            print(f"🔗 Linked {relinked} images in {os.path.relpath(directory, WORKSPACE_ROOT)} to the image store")
+    
     # Analyze images
     existing_count = 0
     missing_count = 0
@@ -128,11 +134,11 @@ def main():
             continue
         
         # Check if image exists in public directory
-        exists, path = check_existing_image(item_name, PUBLIC_IMAGES_DIR)
+        exists, path, renamed = check_existing_image(item_name, PUBLIC_IMAGES_DIR, public_files, store)
         
         if exists:
             existing_count += 1
-            if "Updated naming" in str(path):
+            if renamed:
                 updated_count += 1
         else:
             missing_count += 1
@@ -143,8 +149,14 @@ def main():
     print(f"   🔄 Updated naming: {updated_count}")
     print(f"   ❌ Missing images: {missing_count}")
     
+    if updated_count:
+        scan(manifest, PUBLIC_IMAGES_DIR)
+    sync_build_images(manifest, store)
+    save_manifest(manifest, MANIFEST_PATH)
+    
     if missing_count == 0:
         print("\n🎉 All images are present!")
+        optimize_public_images(manifest, store)
         return
     
     # Show some examples of missing items
@@ -159,40 +171,26 @@ def main():
     
     if download_all not in ['y', 'yes']:
         print("ℹ️  Skipping download. Run script again with 'y' to download.")
+        optimize_public_images(manifest, store)
         return
     
     print(f"\n⬇️  Downloading {missing_count} missing images...")
     
-    downloaded_count = 0
-    failed_count = 0
-    
-    for i, (item_name, image_path) in enumerate(missing_items):
-        # Download to public directory
-        success, message = download_image(item_name, image_path, PUBLIC_IMAGES_DIR)
-        
-        if success:
-            downloaded_count += 1
-            # Also copy to build directory
-            filename = safe_filename(item_name) + '.png'
-            public_path = os.path.join(PUBLIC_IMAGES_DIR, filename)
-            build_path = os.path.join(BUILD_IMAGES_DIR, filename)
-            
-            try:
-                with open(public_path, 'rb') as src, open(build_path, 'wb') as dst:
-                    dst.write(src.read())
-            except Exception as e:
-                print(f"⚠️  Failed to copy to build directory: {e}")
-        else:
-            failed_count += 1
-            if "failed" in message:
-                print(f"❌ {message}")
-        
-        # Progress indicator
-        if (i + 1) % 10 == 0:
-            print(f"   Progress: {i + 1}/{len(missing_items)} ({((i + 1) / len(missing_items) * 100):.1f}%)")
-        
-        # Small delay to be nice to the server
-        time.sleep(0.1)
+    # Parallel, rate-limited downloads; each image is stored once and linked into
+    # both the public and the build (nginx) directory
+    jobs = []
+    for item_name, image_path in missing_items:
+        filename = safe_filename(item_name)
+        destinations = [os.path.join(PUBLIC_IMAGES_DIR, filename),
+                        os.path.join(BUILD_IMAGES_DIR, filename)]
+        jobs.append(ImageJob(item_name, wiki_filename(image_path), destinations))
+    
+    results, elapsed = sync_images(jobs, progress_every=10, store=store)
+    downloaded_count = report_results(results, elapsed)
+    failed_count = len(results) - downloaded_count
+    optimize_public_images(manifest, store)
+    scan(manifest, BUILD_IMAGES_DIR)
+    save_manifest(manifest, MANIFEST_PATH)
     
     print(f"\n✅ Download Summary:")
     print(f"   📥 Successfully downloaded: {downloaded_count}")
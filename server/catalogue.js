@@ -0,0 +1,102 @@
+// Reader for data/items.catalogue.json, the compact catalogue written by
+// scripts/bazaar_data/catalogue.py next to items.json on every scrape.
+// The artifact is parsed once and kept until items.catalogue.version changes.
+const fs = require('fs');
+const path = require('path');
+
+const CATALOGUE_PATH = path.join(__dirname, 'data', 'items.catalogue.json');
+const FORMAT_VERSION = 1;
+
+// Same tables as INTERNED_FIELDS / LEVEL_FIELDS in catalogue.py
+const INTERNED_FIELDS = {
+  'Episode': 'episodes',
+  'Profession A': 'professions',
+  'Profession B': 'professions',
+  'Variant of': 'variants',
+  'Tradeable': 'tradeable'
+};
+const LEVEL_FIELDS = ['Profession Level A', 'Profession Level B'];
+const MISSING = 'None';
+
+// 32-bit FNV-1a over UTF-8 bytes, same as fnv1a() in catalogue.py
+function fnv1a(text) {
+  let hash = 0x811c9dc5;
+  for (const byte of Buffer.from(text, 'utf8')) {
+    hash = Math.imul(hash ^ byte, 0x01000193) >>> 0;
+  }
+  return hash;
+}
+
+class Catalogue {
+  constructor(data) {
+    this.version = data.version;
+    this.count = data.count;
+    this.fields = data.fields;
+    this.strings = data.strings;
+    this.columns = data.columns;
+    this.slots = data.index.slots;
+    this.rows = new Array(data.count);
+  }
+
+  // Row of an item name through the precomputed hash table, or -1
+  indexOf(name) {
+    const names = this.columns.Items;
+    const mask = this.slots.length - 1;
+    let slot = fnv1a(name) & mask;
+    while (this.slots[slot]) {
+      if (names[this.slots[slot] - 1] === name) return this.slots[slot] - 1;
+      slot = (slot + 1) & mask;
+    }
+    return -1;
+  }
+
+  // A record exactly as it appears in items.json (decoded on first use)
+  item(row) {
+    if (!this.rows[row]) {
+      const record = {};
+      for (const field of this.fields) {
+        let value = this.columns[field][row];
+        if (INTERNED_FIELDS[field]) {
+          value = value === null ? MISSING : this.strings[INTERNED_FIELDS[field]][value];
+        } else if (LEVEL_FIELDS.includes(field)) {
+          value = value === null ? MISSING : String(value);
+        } else if (field === 'Image' && value === null) {
+          value = '/assets/items/' + this.columns.Items[row].split(' ').join('_') + '.png';
+        }
+        record[field] = value;
+      }
+      this.rows[row] = record;
+    }
+    return this.rows[row];
+  }
+
+  get(name) {
+    const row = this.indexOf(name);
+    return row === -1 ? null : this.item(row);
+  }
+
+  // Distinct values of an interned table, e.g. 'episodes' or 'professions'
+  values(table) {
+    return [...(this.strings[table] || [])].sort();
+  }
+}
+
+let cached = null;
+
+// The current catalogue, or null if the scrape has not written one yet
+function loadCatalogue(cataloguePath = CATALOGUE_PATH) {
+  let version;
+  try {
+    version = fs.readFileSync(cataloguePath + '.version', 'utf8').trim();
+  } catch (err) {
+    return null;
+  }
+  if (!cached || cached.path !== cataloguePath || cached.catalogue.version !== version) {
+    const data = JSON.parse(fs.readFileSync(cataloguePath, 'utf8'));
+    if (data.format !== FORMAT_VERSION) return null;
+    cached = { path: cataloguePath, catalogue: new Catalogue(data) };
+  }
+  return cached.catalogue;
+}
+
+module.exports = { Catalogue, fnv1a, loadCatalogue };
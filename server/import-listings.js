@@ -1,39 +1,21 @@
-const fs = require('fs');
+// Loads data/listings.json into data/marketplace.db.
+// The work is done by scripts/bazaar_data/listings.py (streaming parse, field
+// coercion, batched transactions); extra arguments are passed through, e.g.
+//   node import-listings.js --mode upsert --dry-run
 const path = require('path');
-const sqlite3 = require('sqlite3').verbose();
-const { open } = require('sqlite');
+const { spawnSync } = require('child_process');
 
 const DB_PATH = path.join(__dirname, 'data', 'marketplace.db');
 const JSON_PATH = path.join(__dirname, 'data', 'listings.json');
 
-const FIELDS = [
-  'item', 'price', 'quantity', 'type', 'category', 'seller', 'sellerId', 'sellerAvatar',
-  'timestamp', 'IGN', 'priceMode', 'combatCategory', 'combatLevel', 'combatStrength',
-  'combatDmgType', 'combatDmgPercent', 'combatImpact', 'combatCryonae', 'combatArborae',
-  'combatTempestae', 'combatInfernae', 'combatNecromae'
-];
+const result = spawnSync(
+  'python3',
+  ['-m', 'bazaar_data.listings', '--db', DB_PATH, 'import', JSON_PATH, ...process.argv.slice(2)],
+  { cwd: path.join(__dirname, 'scripts'), stdio: 'inherit' }
+);
 
-(async () => {
-  const db = await open({ filename: DB_PATH, driver: sqlite3.Database });
-  const listings = JSON.parse(fs.readFileSync(JSON_PATH, 'utf8'));
-
-  for (const entry of listings) {
-    // Skip if entry is not an object or is empty
-    if (typeof entry !== 'object' || !entry) continue;
-
-    // Map contactInfo to IGN, fill missing fields with empty string
-    const values = FIELDS.map(field => {
-      if (field === 'IGN') return entry.contactInfo || '';
-      return entry[field] !== undefined && entry[field] !== null ? entry[field] : '';
-    });
-
-    // Insert into DB
-    await db.run(
-      `INSERT INTO listings (${FIELDS.join(',')}) VALUES (${FIELDS.map(() => '?').join(',')})`,
-      values
-    );
-  }
-
-  await db.close();
-  console.log('Import complete!');
-})();
\ No newline at end of file
+if (result.error) {
+  console.error('Failed to run the listings importer:', result.error.message);
+  process.exit(1);
+}
+process.exit(result.status);
@@ -1,13 +1,13 @@
 #!/bin/sh
 # backup_marketplace_db.sh
-# Backs up marketplace.db to marketplace.db.bak every hour
+# Hourly online backup of marketplace.db via the SQLite backup API.
+# Snapshots go to /app/data/backups (compressed, deduplicated, hourly/daily/weekly
+# retention); marketplace.db.bak stays an uncompressed copy of the newest one.
 
 SRC="/app/data/marketplace.db"
-DEST="/app/data/marketplace.db.bak"
 
 if [ -f "$SRC" ]; then
-  cp "$SRC" "$DEST"
-  echo "[$(date)] marketplace.db backed up to marketplace.db.bak"
+  cd /app/scripts && python3 -m bazaar_data.backup --source "$SRC"
 else
   echo "[$(date)] marketplace.db not found, skipping backup"
 fi
@@ -0,0 +1,53 @@
+"""
+BS-Bazaar item data pipeline.
+
+Stages live in their own modules (fetch, clean, diff, persist, sync, manifest,
+store, optimize, reconcile, stats, history, orderbook, search, catalogue,
+listings) and are wired together in pipeline, measured by metrics and
+scheduled by job; `python3 -m bazaar_data` is the command line entry point.
+Names below are imported on first use, so importing the package does not pull
+in pandas or requests.
+"""
+
+import importlib
+
+_EXPORTS = {
+    'FetchError': 'fetch',
+    'fetch_pages': 'fetch',
+    'RAW_COLUMNS': 'clean',
+    'clean_items': 'clean',
+    'clean_page': 'clean',
+    'catalogue_index': 'diff',
+    'diff_catalogues': 'diff',
+    'apply_item_diff': 'persist',
+    'rebuild_items_db': 'persist',
+    'ImageJob': 'sync',
+    'sync_images': 'sync',
+    'ImageStore': 'store',
+    'safe_filename': 'naming',
+    'NameIndex': 'reconcile',
+    'reconcile': 'reconcile',
+    'refresh_stats': 'stats',
+    'price_history': 'history',
+    'OrderBooks': 'orderbook',
+    'match_query': 'search',
+    'write_catalogue': 'catalogue',
+    'export_listings': 'listings',
+    'import_listings': 'listings',
+    'Pipeline': 'pipeline',
+    'PipelineError': 'pipeline',
+    'run': 'pipeline',
+    'RunMetrics': 'metrics',
+    'Checkpoint': 'job',
+    'run_job': 'job',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
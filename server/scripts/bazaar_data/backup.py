@@ -0,0 +1,298 @@
+"""
+Online, consistent backups of marketplace.db.
+
+Uses the SQLite backup API to copy the live database a few hundred pages at a
+time, sleeping between steps so the Node server's writers are never blocked
+for long. Each copy is integrity-checked, compressed (zstd when the zstandard
+module is installed, gzip otherwise) and skipped entirely if nothing changed
+since the last snapshot. Snapshots are thinned out with hourly/daily/weekly
+retention.
+
+    python3 -m bazaar_data.backup --source /app/data/marketplace.db
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SOURCE_PATH = '/app/data/marketplace.db'
+BACKUP_DIR = '/app/data/backups'
+# Uncompressed copy of the newest snapshot under the name older tooling expects
+LATEST_PATH = '/app/data/marketplace.db.bak'
+
+PAGES_PER_STEP = 256
+STEP_PAUSE_SECONDS = 0.005
+# A write from another connection restarts a stepped backup; after this many
+# restarts the copy is started over with twice the pages per step, up to
+# MAX_ATTEMPTS times. Steps stay bounded (8x the configured pages at most), so
+# writers are never locked out for a whole copy of the database.
+MAX_RESTARTS = 3
+MAX_ATTEMPTS = 4
+RETENTION = {'hourly': 24, 'daily': 7, 'weekly': 4}
+INDEX_NAME = 'index.json'
+
+
+class BackupError(Exception):
+    pass
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+@dataclass
+class Snapshot:
+    name: str
+    created: str
+    sha256: str
+    size: int
+    stored_size: int
+    duration: float
+    lock_seconds: float
+    max_step_seconds: float
+    steps: int
+    restarts: int = 0
+
+
+def compression_suffix(method):
+    return {'zstd': '.zst', 'gzip': '.gz'}[method]
+
+
+def default_compression():
+    return 'zstd' if zstandard is not None else 'gzip'
+
+
+def compress_file(source, target, method):
+    """Compress `source` into `target` atomically"""
+    tmp_path = f"{target}.part"
+    with open(source, 'rb') as src, open(tmp_path, 'wb') as dst:
+        if method == 'zstd':
+            zstandard.ZstdCompressor(level=10).copy_stream(src, dst)
+        else:
+            with gzip.GzipFile(fileobj=dst, mode='wb', compresslevel=6, mtime=0) as gz:
+                shutil.copyfileobj(src, gz, 1 << 20)
+    os.replace(tmp_path, target)
+
+
+def decompress_file(source, target):
+    """Restore a .zst/.gz snapshot into an uncompressed database file"""
+    tmp_path = f"{target}.part"
+    with open(source, 'rb') as src, open(tmp_path, 'wb') as dst:
+        if source.endswith('.zst'):
+            if zstandard is None:
+                raise BackupError("zstandard is required to restore .zst snapshots")
+            zstandard.ZstdDecompressor().copy_stream(src, dst)
+        else:
+            with gzip.GzipFile(fileobj=src, mode='rb') as gz:
+                shutil.copyfileobj(gz, dst, 1 << 20)
+    os.replace(tmp_path, target)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def copy_database(source_path, target_path, pages=PAGES_PER_STEP, pause=STEP_PAUSE_SECONDS):
+    """
+    Copy a live database with the backup API in steps of `pages` pages.
+
+    The source is only read-locked while a step runs; between steps we pause
+    so writers can get in. Returns a dict with the number of steps and
+    restarts, total seconds locked and the longest step. Raises BackupError
+    if writes kept restarting the copy through every attempt.
+    """
+    timings = {'steps': 0, 'restarts': 0, 'locked': 0.0, 'longest': 0.0}
+
+    def progress(status, remaining, total):
+        step = time.perf_counter() - timings['resumed']
+        timings['steps'] += 1
+        timings['locked'] += step
+        timings['longest'] = max(timings['longest'], step)
+        # Every step copies pages, so a step that did not shrink what is left started over
+        if remaining >= timings['remaining']:
+            timings['restarts'] += 1
+            timings['attempt_restarts'] += 1
+            if timings['attempt_restarts'] >= MAX_RESTARTS:
+                raise _TooManyRestarts()
+        timings['remaining'] = remaining
+        if remaining and pause:
+            time.sleep(pause)
+        timings['resumed'] = time.perf_counter()
+
+    for attempt in range(MAX_ATTEMPTS):
+        source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+        target = sqlite3.connect(target_path)
+        timings.update(remaining=float('inf'), attempt_restarts=0, resumed=time.perf_counter())
+        try:
+            source.backup(target, pages=pages << attempt, progress=progress)
+            return timings
+        except _TooManyRestarts:
+            continue
+        finally:
+            target.close()
+            source.close()
+    raise BackupError(f"{source_path} kept changing during the copy; gave up after {MAX_ATTEMPTS} attempts")
+
+
+def check_integrity(path):
+    conn = sqlite3.connect(path)
+    try:
+        result = conn.execute('PRAGMA integrity_check').fetchall()
+    finally:
+        conn.close()
+    if result != [('ok',)]:
+        raise BackupError(f"integrity check failed: {result[:5]}")
+
+
+def load_index(backup_dir):
+    try:
+        with open(os.path.join(backup_dir, INDEX_NAME), 'r', encoding='utf-8') as f:
+            return [Snapshot(**entry) for entry in json.load(f)]
+    except (FileNotFoundError, ValueError, TypeError):
+        return []
+
+
+def save_index(backup_dir, snapshots):
+    path = os.path.join(backup_dir, INDEX_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump([asdict(snapshot) for snapshot in snapshots], f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def retained(snapshots, policy=RETENTION, now=None):
+    """
+    Names of snapshots to keep: the newest one in each of the last
+    `hourly` hours, `daily` days and `weekly` ISO weeks.
+    """
+    now = now or datetime.now()
+    buckets = {
+        'hourly': (lambda t: t.strftime('%Y%m%d%H'), timedelta(hours=policy.get('hourly', 0))),
+        'daily': (lambda t: t.strftime('%Y%m%d'), timedelta(days=policy.get('daily', 0))),
+        'weekly': (lambda t: '%d-%02d' % t.isocalendar()[:2], timedelta(weeks=policy.get('weekly', 0))),
+    }
+    keep = set()
+    newest_first = sorted(snapshots, key=lambda s: s.created, reverse=True)
+    if newest_first:
+        keep.add(newest_first[0].name)
+    for bucket_of, window in buckets.values():
+        seen = set()
+        for snapshot in newest_first:
+            created = datetime.fromisoformat(snapshot.created)
+            if now - created > window:
+                break
+            bucket = bucket_of(created)
+            if bucket not in seen:
+                seen.add(bucket)
+                keep.add(snapshot.name)
+    return keep
+
+
+def backup(source_path=SOURCE_PATH, backup_dir=BACKUP_DIR, latest_path=LATEST_PATH,
+           compression=None, policy=RETENTION, pages=PAGES_PER_STEP, pause=STEP_PAUSE_SECONDS):
+    """
+    Take one snapshot. Returns (snapshot, created) where `created` is False if
+    the database was unchanged and the previous snapshot was kept instead.
+    """
+    if not os.path.exists(source_path):
+        raise BackupError(f"{source_path} not found")
+    compression = compression or default_compression()
+    if compression == 'zstd' and zstandard is None:
+        raise BackupError("zstandard is not installed")
+    os.makedirs(backup_dir, exist_ok=True)
+    snapshots = load_index(backup_dir)
+
+    now = datetime.now().replace(microsecond=0)
+    tmp_path = os.path.join(backup_dir, f".marketplace-{now:%Y%m%d-%H%M%S}.db.part")
+    start = time.perf_counter()
+    try:
+        timings = copy_database(source_path, tmp_path, pages, pause)
+        check_integrity(tmp_path)
+        digest = file_sha256(tmp_path)
+        size = os.path.getsize(tmp_path)
+
+        if snapshots and snapshots[-1].sha256 == digest and \
+                os.path.exists(os.path.join(backup_dir, snapshots[-1].name)):
+            return snapshots[-1], False
+
+        name = f"marketplace-{now:%Y%m%d-%H%M%S}.db{compression_suffix(compression)}"
+        compress_file(tmp_path, os.path.join(backup_dir, name), compression)
+        if latest_path:
+            os.replace(tmp_path, latest_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    snapshot = Snapshot(name=name, created=now.isoformat(), sha256=digest, size=size,
+                        stored_size=os.path.getsize(os.path.join(backup_dir, name)),
+                        duration=round(time.perf_counter() - start, 4), lock_seconds=round(timings['locked'], 4),
+                        max_step_seconds=round(timings['longest'], 4), steps=timings['steps'],
+                        restarts=timings['restarts'])
+    snapshots.append(snapshot)
+
+    keep = retained(snapshots, policy, now)
+    for old in snapshots:
+        if old.name not in keep:
+            try:
+                os.remove(os.path.join(backup_dir, old.name))
+            except FileNotFoundError:
+                pass
+    save_index(backup_dir, [s for s in snapshots if s.name in keep])
+    return snapshot, True
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Back up marketplace.db with the SQLite backup API")
+    parser.add_argument('--source', default=SOURCE_PATH)
+    parser.add_argument('--dest-dir', default=BACKUP_DIR)
+    parser.add_argument('--latest', default=LATEST_PATH, help="uncompressed copy of the newest snapshot ('' to skip)")
+    parser.add_argument('--compression', choices=['zstd', 'gzip'])
+    parser.add_argument('--hourly', type=int, default=RETENTION['hourly'])
+    parser.add_argument('--daily', type=int, default=RETENTION['daily'])
+    parser.add_argument('--weekly', type=int, default=RETENTION['weekly'])
+    parser.add_argument('--pages', type=int, default=PAGES_PER_STEP, help="pages copied per backup step")
+    parser.add_argument('--restore', metavar='SNAPSHOT', help="decompress a snapshot to --source instead")
+    args = parser.parse_args(argv)
+
+    if args.restore:
+        decompress_file(args.restore, args.source)
+        check_integrity(args.source)
+        print(f"[{datetime.now()}] Restored {args.restore} to {args.source}")
+        return 0
+
+    policy = {'hourly': args.hourly, 'daily': args.daily, 'weekly': args.weekly}
+    try:
+        snapshot, created = backup(args.source, args.dest_dir, args.latest, args.compression, policy, args.pages)
+    except (BackupError, sqlite3.Error, OSError) as e:
+        print(f"[{datetime.now()}] ❌ marketplace.db backup failed: {e}")
+        return 1
+    if not created:
+        print(f"[{datetime.now()}] marketplace.db unchanged since {snapshot.name}, no new snapshot")
+        return 0
+    print(f"[{datetime.now()}] marketplace.db backed up to {snapshot.name}: "
+          f"{snapshot.size / 1024:.0f} KiB -> {snapshot.stored_size / 1024:.0f} KiB "
+          f"in {snapshot.duration:.3f}s ({snapshot.steps} steps, {snapshot.restarts} restarts, source locked {snapshot.lock_seconds * 1000:.1f} ms, "
+          f"longest step {snapshot.max_step_seconds * 1000:.1f} ms)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Compact catalogue artifact (items.catalogue.json) for the server.
+
+items.json is pretty-printed, repeats every Episode/Profession string and
+stores levels as strings. The catalogue artifact holds the same records in a
+minified, columnar form:
+
+- one array per field; Episode, professions, Tradeable and "Variant of" are
+  indexes into interned string tables, levels are integers, and 'None'
+  becomes null
+- Image is null when it is the usual /assets/items/<Name_With_Underscores>.png
+- a precomputed open-addressing hash table (FNV-1a, linear probing) maps an
+  item name to its row without building a dict first
+- a version hash of the records, also written to items.catalogue.version so
+  a consumer can check for staleness without reading the artifact
+
+server/catalogue.js is the Node reader; decode() here gives back records
+identical to items.json.
+
+    python3 -m bazaar_data.catalogue /app/data/items.json /app/data/items.catalogue.json
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+FORMAT_VERSION = 1
+CATALOGUE_NAME = 'items.catalogue.json'
+VERSION_SUFFIX = '.version'
+
+# field -> interned string table it indexes into
+INTERNED_FIELDS = {
+    'Episode': 'episodes',
+    'Profession A': 'professions',
+    'Profession B': 'professions',
+    'Variant of': 'variants',
+    'Tradeable': 'tradeable',
+}
+LEVEL_FIELDS = ('Profession Level A', 'Profession Level B')
+# Placeholder the cleaning stage fills missing values with
+MISSING = 'None'
+
+FNV_OFFSET = 0x811C9DC5
+FNV_PRIME = 0x01000193
+
+
+def fnv1a(text):
+    """32-bit FNV-1a over UTF-8 bytes, same as fnv1a() in server/catalogue.js"""
+    value = FNV_OFFSET
+    for byte in text.encode('utf-8'):
+        value = ((value ^ byte) * FNV_PRIME) & 0xFFFFFFFF
+    return value
+
+
+def default_image(name):
+    return f"/assets/items/{name.replace(' ', '_')}.png"
+
+
+def catalogue_version(items):
+    payload = json.dumps(items, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def hash_table(names):
+    """Slots (row + 1, 0 for empty) at a load factor of at most 0.5"""
+    size = 1
+    while size < len(names) * 2:
+        size *= 2
+    slots = [0] * size
+    for row, name in enumerate(names):
+        slot = fnv1a(name) & (size - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (size - 1)
+        slots[slot] = row + 1
+    return slots
+
+
+def _level(value):
+    if value is None or value == MISSING:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def build_catalogue(items):
+    """The artifact as a dict, ready for json.dump"""
+    names = [item.get('Items') for item in items]
+    fields = list(dict.fromkeys(field for item in items for field in item))
+    strings = {}
+    positions = {}
+    columns = {}
+    for field in fields:
+        values = [item.get(field) for item in items]
+        if field in INTERNED_FIELDS:
+            table_name = INTERNED_FIELDS[field]
+            table = strings.setdefault(table_name, [])
+            lookup = positions.setdefault(table_name, {})
+            column = []
+            for value in values:
+                if value is None or value == MISSING:
+                    column.append(None)
+                    continue
+                key = json.dumps(value)
+                if key not in lookup:
+                    lookup[key] = len(table)
+                    table.append(value)
+                column.append(lookup[key])
+            columns[field] = column
+        elif field in LEVEL_FIELDS:
+            columns[field] = [_level(value) for value in values]
+        elif field == 'Image':
+            columns[field] = [None if value == default_image(name or '') else value
+                              for name, value in zip(names, values)]
+        else:
+            columns[field] = values
+    return {
+        'format': FORMAT_VERSION,
+        'version': catalogue_version(items),
+        'count': len(items),
+        'fields': fields,
+        'strings': strings,
+        'columns': columns,
+        'index': {'hash': 'fnv1a32', 'slots': hash_table(names)},
+    }
+
+
+def write_catalogue(items, path):
+    """Write the artifact and its version file atomically; returns the version"""
+    catalogue = build_catalogue(items)
+    for target, text in ((path, json.dumps(catalogue, ensure_ascii=False, separators=(',', ':'))),
+                         (path + VERSION_SUFFIX, catalogue['version'])):
+        tmp_path = f"{target}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, target)
+    return catalogue['version']
+
+
+def load_catalogue(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def decode_row(catalogue, row):
+    """One record exactly as it appears in items.json"""
+    record = {}
+    for field in catalogue['fields']:
+        value = catalogue['columns'][field][row]
+        if field in INTERNED_FIELDS:
+            value = MISSING if value is None else catalogue['strings'][INTERNED_FIELDS[field]][value]
+        elif field in LEVEL_FIELDS:
+            value = MISSING if value is None else str(value)
+        elif field == 'Image' and value is None:
+            value = default_image(catalogue['columns']['Items'][row] or '')
+        record[field] = value
+    return record
+
+
+def decode(catalogue):
+    return [decode_row(catalogue, row) for row in range(catalogue['count'])]
+
+
+def lookup(catalogue, name):
+    """Row of an item name through the hash table, or None"""
+    slots = catalogue['index']['slots']
+    names = catalogue['columns']['Items']
+    mask = len(slots) - 1
+    slot = fnv1a(name) & mask
+    while slots[slot]:
+        if names[slots[slot] - 1] == name:
+            return slots[slot] - 1
+        slot = (slot + 1) & mask
+    return None
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write the compact catalogue artifact from items.json")
+    parser.add_argument('items_json')
+    parser.add_argument('output')
+    args = parser.parse_args(argv)
+
+    with open(args.items_json, 'r', encoding='utf-8') as f:
+        items = json.load(f)
+    start = time.perf_counter()
+    version = write_catalogue(items, args.output)
+    elapsed = time.perf_counter() - start
+    if decode(load_catalogue(args.output)) != items:
+        print("❌ Catalogue does not round-trip to items.json")
+        return 1
+    print(f"✅ Wrote {args.output} ({len(items)} items, version {version}): "
+          f"{os.path.getsize(args.items_json) / 1024:.0f} KiB -> {os.path.getsize(args.output) / 1024:.0f} KiB "
+          f"in {elapsed:.3f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+Cleaning stage for the wiki item catalogue.
+
+Takes the raw Special:Ask CSV columns and produces the cleaned items table
+written to items.json/items.db. There are two implementations of the same
+rules:
+
+- clean_items: vectorized pandas operations on the combined DataFrame; the
+  output is identical to the original row-wise apply() implementation.
+- clean_page/clean_rows: a generator over the rows read_rows() parses with
+  the stdlib csv module, used by the lean scrape so the job never imports
+  pandas/NumPy. Missing values follow read_csv (the same NA tokens, booleans
+  for Tradeable, numeric levels), so both produce the same items.
+
+pandas and NumPy are only imported by the DataFrame functions.
+"""
+
+import csv
+import io
+import math
+
+# Raw Special:Ask columns; the unnamed first column holds the item name
+RAW_COLUMNS = ['Unnamed: 0', 'Image', 'Episode', 'Variant of', 'Profession A',
+               'Profession Level A', 'Profession B', 'Profession Level B', 'Tradeable']
+ITEM_COLUMNS = ['Items'] + RAW_COLUMNS[1:]
+LEVEL_COLUMNS = ['Profession Level A', 'Profession Level B']
+PROFESSION_COLUMNS = ['Profession A', 'Profession B']
+
+# Combat sub-professions are listed on the marketplace as plain 'Combat'
+COMBAT_ALIASES = {"Hammermage", "Cryoknight", "Guardian"}
+LEGACY_MARKER = '(Legacy)'
+IMAGE_PREFIX = '/assets/items/'
+
+# read_csv's default missing-value tokens and boolean spellings
+NA_VALUES = frozenset(['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                       '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'])
+TRUE_VALUES = frozenset(['True', 'TRUE', 'true'])
+FALSE_VALUES = frozenset(['False', 'FALSE', 'false'])
+
+
+def clean_image_paths(images):
+    """Map wiki 'File:Some Item.png' values to local /assets/items/Some_Item.png paths"""
+    if not images.notna().any():
+        return images
+    cleaned = (images.astype(str).where(images.notna())
+               .str.replace('File:', '', regex=False)
+               .str.replace(' ', '_', regex=False))
+    return IMAGE_PREFIX + cleaned
+
+
+def legacy_rows(df):
+    """Boolean mask of rows where any string field contains '(Legacy)'"""
+    import numpy as np
+
+    mask = np.zeros(len(df), dtype=bool)
+    for col in df.select_dtypes(include=['object', 'string']).columns:
+        try:
+            found = df[col].str.contains(LEGACY_MARKER, regex=False)
+        except AttributeError:
+            # No string values at all (e.g. only booleans), so no marker either
+            continue
+        mask |= found.to_numpy(dtype=bool, na_value=False)
+    return mask
+
+
+def strip_level_decimals(levels):
+    """Render levels as integer strings ('345.0' -> '345'), missing as 'None'"""
+    import numpy as np
+    import pandas as pd
+
+    numeric = pd.to_numeric(levels, errors='coerce').astype('float64')
+    whole = np.trunc(numeric.where(np.isfinite(numeric))).astype('Int64')
+    # Levels repeat heavily, so format each distinct value once and take by code
+    codes, uniques = pd.factorize(whole)
+    labels = np.append(uniques.astype(str).to_numpy(dtype=object), 'None')
+    result = labels[codes]
+    # Values that are neither numbers nor missing are kept as their string form
+    other = (codes == -1) & levels.notna().to_numpy() & (levels != 'None').to_numpy()
+    if other.any():
+        result[other] = levels[other].astype(str).to_numpy(dtype=object)
+    return pd.Series(result, index=levels.index, dtype=object)
+
+
+def clean_items(raw):
+    """Clean the combined raw catalogue into the items table"""
+    df = raw[RAW_COLUMNS].rename(columns={'Unnamed: 0': 'Items'})
+    df['Image'] = clean_image_paths(df['Image'])
+
+    # Remove any row where Tradeable is False (boolean or string) or where any
+    # string field contains '(Legacy)'
+    tradeable = df['Tradeable']
+    untradeable = ((tradeable == False) | (tradeable == 'False')).to_numpy(dtype=bool)  # noqa: E712
+    df = df[~(untradeable | legacy_rows(df))].copy()
+
+    # Fill NaN values with 'None' or 'unknown' for better readability
+    for col in ['Episode', 'Variant of', 'Profession A', 'Profession B']:
+        df[col] = df[col].fillna('None')
+    df['Tradeable'] = df['Tradeable'].astype(object).fillna('unknown')
+
+    for col in LEVEL_COLUMNS:
+        df[col] = strip_level_decimals(df[col])
+
+    combat = dict.fromkeys(COMBAT_ALIASES, "Combat")
+    for col in PROFESSION_COLUMNS:
+        df[col] = df[col].replace(combat)
+
+    return df
+
+
+def read_rows(content):
+    """Parse one Special:Ask CSV page into dicts keyed like read_csv's columns, missing values as None"""
+    reader = csv.reader(io.StringIO(content.decode('utf-8-sig'), newline=''))
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [name or f'Unnamed: {n}' for n, name in enumerate(header)]
+    for fields in reader:
+        if not fields:
+            continue
+        yield {column: (None if value in NA_VALUES else value) for column, value in zip(columns, fields)}
+
+
+def clean_image_path(image):
+    if image is None:
+        return None
+    return IMAGE_PREFIX + image.replace('File:', '').replace(' ', '_')
+
+
+def strip_level_decimal(level):
+    """Single-value strip_level_decimals for the text read_rows() yields"""
+    if level is None:
+        return 'None'
+    try:
+        # read_csv does not accept digit separators, float() does
+        number = float(level) if '_' not in level else math.nan
+    except ValueError:
+        return level
+    return str(math.trunc(number)) if math.isfinite(number) else level
+
+
+def clean_rows(rows, booleans=True):
+    """Yield cleaned item dicts for raw rows from read_rows(), dropping untradeable and legacy items
+
+    `booleans` is whether read_csv would have parsed the page's Tradeable
+    column as booleans (see clean_page); otherwise its values stay strings.
+    """
+    false_values = FALSE_VALUES if booleans else {'False'}
+    for raw in rows:
+        row = {column: raw.get(column) for column in RAW_COLUMNS}
+        row['Image'] = clean_image_path(row['Image'])
+        if any(value is not None and LEGACY_MARKER in value for value in row.values()):
+            continue
+        tradeable = row['Tradeable']
+        if tradeable in false_values:
+            continue
+        item = {'Items': row['Unnamed: 0'], 'Image': row['Image']}
+        for col in ['Episode', 'Variant of', 'Profession A', 'Profession B']:
+            value = row[col]
+            item[col] = 'None' if value is None else value
+        for col in PROFESSION_COLUMNS:
+            if item[col] in COMBAT_ALIASES:
+                item[col] = "Combat"
+        for col in LEVEL_COLUMNS:
+            item[col] = strip_level_decimal(row[col])
+        if tradeable is None:
+            tradeable = 'unknown'
+        elif booleans:
+            tradeable = tradeable in TRUE_VALUES
+        item['Tradeable'] = tradeable
+        yield {col: item[col] for col in ITEM_COLUMNS}
+
+
+def clean_page(content):
+    """Cleaned items of one CSV page; read_csv infers dtypes per page, so Tradeable is decided per page too"""
+    rows = list(read_rows(content))
+    booleans = all(row.get('Tradeable') is None or row['Tradeable'] in TRUE_VALUES | FALSE_VALUES for row in rows)
+    return clean_rows(rows, booleans)
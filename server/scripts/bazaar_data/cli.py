@@ -0,0 +1,114 @@
+"""
+Command line entry point for the data pipeline.
+
+    cd server/scripts
+    python3 -m bazaar_data scrape --incremental
+    python3 -m bazaar_data scrape --profile cpu --metrics-dir /tmp/metrics
+    python3 -m bazaar_data scrape --incremental --lean
+    python3 -m bazaar_data job --lean
+    python3 -m bazaar_data build-db ../data/items.json ../data/items.db
+    python3 -m bazaar_data filename "+80 Potion Strength Cryonae"
+"""
+
+import sys
+
+from .job import INTERVAL_HOURS
+from .metrics import METRICS_DIR, PROFILE_MODES
+from .pipeline import DATA_DIR, IMAGES_DIR
+
+
+def make_pipeline(args, incremental=False):
+    from .pipeline import Pipeline
+
+    return Pipeline(data_dir=args.data_dir, images_dir=args.images_dir, base_url=args.base_url,
+                    incremental=incremental, download_images=not args.no_images, image_rate=args.image_rate,
+                    metrics_dir=args.metrics_dir, profile=args.profile, lean=args.lean or None)
+
+
+def scrape(args):
+    from .pipeline import run
+
+    return run(make_pipeline(args, args.incremental))
+
+
+def job(args):
+    from .job import run_job
+
+    return run_job(make_pipeline(args), args.interval_hours, force=args.force, full=args.full)
+
+
+def build_db(args):
+    import json
+
+    from .persist import rebuild_items_db
+
+    with open(args.items_json, 'r', encoding='utf-8') as f:
+        items = json.load(f)
+    if not items:
+        print('No items found in JSON.')
+        return 1
+    count = rebuild_items_db(items, args.items_db)
+    print(f'Converted {count} items to {args.items_db}')
+    return 0
+
+
+def filename(args):
+    from .naming import safe_filename
+
+    for name in args.names:
+        print(safe_filename(name))
+    return 0
+
+
+def add_pipeline_arguments(parser):
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--images-dir', default=IMAGES_DIR)
+    parser.add_argument('--base-url', help="wiki base URL (default: WIKI_BASE_URL or the live wiki)")
+    parser.add_argument('--no-images', action='store_true', help="do not download missing images")
+    parser.add_argument('--image-rate', type=float,
+                        help="max image downloads per second, 0 for unlimited "
+                             "(default: IMAGE_SYNC_RATE or 5 per worker)")
+    parser.add_argument('--metrics-dir', default=METRICS_DIR,
+                        help="where metrics.jsonl and bazaar_scrape.prom go (default: <data-dir>/metrics)")
+    parser.add_argument('--profile', choices=PROFILE_MODES,
+                        help="dump a cProfile (cpu) and/or tracemalloc (memory) report per stage")
+    parser.add_argument('--lean', action='store_true',
+                        help="clean and aggregate with the stdlib instead of pandas "
+                             "(the default when pandas is not installed)")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='bazaar_data', description="BS-Bazaar item data pipeline")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    scrape_parser = commands.add_parser('scrape', help="refresh items.json/items.db and item images from the wiki")
+    scrape_parser.add_argument('--incremental', action='store_true',
+                               help="use conditional requests and apply only changed items")
+    add_pipeline_arguments(scrape_parser)
+    scrape_parser.set_defaults(handler=scrape)
+
+    job_parser = commands.add_parser('job', help="the scheduled refresh: locked, due-checked and resumable")
+    job_parser.add_argument('--interval-hours', type=float, default=INTERVAL_HOURS,
+                            help="hours between successful refreshes")
+    job_parser.add_argument('--force', action='store_true', help="run even if the last refresh is recent")
+    job_parser.add_argument('--full', action='store_true', help="full instead of incremental refresh")
+    add_pipeline_arguments(job_parser)
+    job_parser.set_defaults(handler=job)
+
+    build_parser = commands.add_parser('build-db', help="rebuild items.db from an items.json")
+    build_parser.add_argument('items_json')
+    build_parser.add_argument('items_db')
+    build_parser.set_defaults(handler=build_db)
+
+    filename_parser = commands.add_parser('filename', help="print the image file name the server uses for items")
+    filename_parser.add_argument('names', nargs='+')
+    filename_parser.set_defaults(handler=filename)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
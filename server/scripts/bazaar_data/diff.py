@@ -0,0 +1,149 @@
+"""
+Item-level change detection between two catalogue snapshots.
+
+Each item gets a content hash and an attribute hash (everything except the
+name and the name-derived image path). Comparing the two hash indexes yields
+added, removed, updated and renamed items; a removed and an added item with
+the same attributes count as a rename.
+
+Offline usage against two snapshots:
+
+    python3 -m bazaar_data.diff old/items.json new/items.json --output items_diff.json
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+DIFF_PATH = '/app/data/items_diff.json'
+
+# Fields that change with the item name and so are ignored for rename matching
+NAME_FIELDS = ('Items', 'Image')
+
+# Fields earlier runs added to items.json after cleaning (image variants), not catalogue content
+DERIVED_FIELDS = ('Variants',)
+
+
+def _digest(record):
+    payload = json.dumps(record, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def item_hash(item):
+    """Hash of the full item record"""
+    return _digest({k: v for k, v in item.items() if k not in DERIVED_FIELDS})
+
+
+def attribute_hash(item):
+    """Hash of the item record without its name-derived fields"""
+    return _digest({k: v for k, v in item.items() if k not in NAME_FIELDS + DERIVED_FIELDS})
+
+
+def catalogue_index(items):
+    """Map item name -> [item hash, attribute hash]"""
+    return {item['Items']: [item_hash(item), attribute_hash(item)]
+            for item in items if item.get('Items')}
+
+
+def diff_catalogues(old_index, new_index):
+    """
+    Compare two catalogue indexes.
+
+    Returns {'added', 'removed', 'updated', 'renamed', 'unchanged'}; item
+    lists are sorted names and renames are {'from', 'to'} pairs.
+    """
+    old_names = set(old_index)
+    new_names = set(new_index)
+    added = new_names - old_names
+    removed = old_names - new_names
+    common = old_names & new_names
+    updated = sorted(name for name in common if old_index[name][0] != new_index[name][0])
+
+    # Pair removed and added items whose attributes match exactly once each way
+    removed_by_attrs = {}
+    for name in removed:
+        removed_by_attrs.setdefault(old_index[name][1], []).append(name)
+    added_by_attrs = {}
+    for name in added:
+        added_by_attrs.setdefault(new_index[name][1], []).append(name)
+    renamed = []
+    for attrs, old_names_for_attrs in removed_by_attrs.items():
+        new_names_for_attrs = added_by_attrs.get(attrs, [])
+        if len(old_names_for_attrs) == 1 and len(new_names_for_attrs) == 1:
+            renamed.append({'from': old_names_for_attrs[0], 'to': new_names_for_attrs[0]})
+    renamed.sort(key=lambda pair: pair['from'])
+    added -= {pair['to'] for pair in renamed}
+    removed -= {pair['from'] for pair in renamed}
+
+    return {
+        'added': sorted(added),
+        'removed': sorted(removed),
+        'updated': updated,
+        'renamed': renamed,
+        'unchanged': len(common) - len(updated),
+    }
+
+
+def is_empty(diff):
+    return not (diff['added'] or diff['removed'] or diff['updated'] or diff['renamed'])
+
+
+def write_diff(diff, path=DIFF_PATH):
+    """Write the diff as JSON for downstream steps, with a generation timestamp"""
+    payload = dict(diff, generated_at=int(time.time()))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_diff(path=DIFF_PATH):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def summarize(diff, limit=5):
+    """Human-readable summary lines for the log"""
+    lines = [f"ℹ️  Catalogue diff: {len(diff['added'])} added, {len(diff['removed'])} removed, "
+             f"{len(diff['updated'])} updated, {len(diff['renamed'])} renamed"]
+    for label, names in (('+', diff['added']), ('-', diff['removed']), ('~', diff['updated'])):
+        for name in names[:limit]:
+            lines.append(f"   {label} {name}")
+        if len(names) > limit:
+            lines.append(f"   {label} ... and {len(names) - limit} more")
+    for pair in diff['renamed'][:limit]:
+        lines.append(f"   > {pair['from']} -> {pair['to']}")
+    if len(diff['renamed']) > limit:
+        lines.append(f"   > ... and {len(diff['renamed']) - limit} more")
+    return lines
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Diff two items.json snapshots")
+    parser.add_argument('old', help="previous items.json")
+    parser.add_argument('new', help="current items.json")
+    parser.add_argument('--output', help="write the machine-readable diff here")
+    args = parser.parse_args(argv)
+
+    indexes = []
+    for path in (args.old, args.new):
+        with open(path, 'r', encoding='utf-8') as f:
+            indexes.append(catalogue_index(json.load(f)))
+    diff = diff_catalogues(*indexes)
+
+    if args.output:
+        write_diff(diff, args.output)
+    else:
+        json.dump(diff, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    for line in summarize(diff):
+        print(line, file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""
+Fetch stage for the Brighter Shores Wiki item catalogue.
+
+The Special:Ask CSV export is paged with offset/limit. Pages are generated from
+a single query template and fetched concurrently over one pooled session until
+a short page comes back.
+"""
+
+import csv
+import io
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+import requests
+from requests.adapters import HTTPAdapter
+
+WIKI_BASE_URL = os.environ.get('WIKI_BASE_URL', 'https://brightershoreswiki.org')
+PAGE_LIMIT = 500
+MAX_WORKERS = 4
+MAX_RETRIES = 3
+BACKOFF_SECONDS = 1.0
+REQUEST_TIMEOUT = 30
+
+# Special:Ask query for every tradeable item, sorted by Profession Level A.
+ASK_QUERY_TEMPLATE = (
+    '{base_url}/w/Special:Ask/format%3Dcsv/link%3Dall/headers%3Dshow/searchlabel%3DCSV'
+    '/class%3Dsortable-20wikitable-20smwtable/prefix%3Dnone/sort%3DProfession-20Level-20A'
+    '/order%3Dasc/offset%3D{offset}/limit%3D{limit}/-5B-5BInfobox::Item-5D-5D/-3F/-3FImage-23-2D'
+    '/-3FEpisode/-3FVariant-20of/-3FProfession-20A/-3FProfession-20Level-20A/-3FProfession-20B'
+    '/-3FProfession-20Level-20B/-3FTradeable/mainlabel%3D/prettyprint%3Dtrue/unescape%3Dtrue'
+)
+QUERY_PARAMETERS = {"downloadformat": "csv"}
+
+# Status codes worth retrying; anything else is a hard failure for the page.
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    """Raised when a catalogue page cannot be fetched after all retries."""
+
+
+@dataclass
+class PageResult:
+    offset: int
+    url: str
+    status: int
+    content: bytes
+    rows: int
+    elapsed: float
+    attempts: int
+    etag: str = None
+    last_modified: str = None
+    not_modified: bool = False
+    # Status code (or exception name) of every attempt, retries included
+    statuses: list = field(default_factory=list)
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+
+def page_url(offset, limit=PAGE_LIMIT, base_url=WIKI_BASE_URL):
+    """Build the Special:Ask CSV export URL for one page"""
+    return ASK_QUERY_TEMPLATE.format(base_url=base_url.rstrip('/'), offset=offset, limit=limit)
+
+
+def make_session(pool_size=MAX_WORKERS):
+    """Create a requests session whose connection pool fits the worker count"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = 'BS-Bazaar item scraper'
+    return session
+
+
+def count_csv_rows(content):
+    """Count data rows in a CSV page, excluding the header"""
+    if not content:
+        return 0
+    reader = csv.reader(io.StringIO(content.decode('utf-8')))
+    return max(sum(1 for _ in reader) - 1, 0)
+
+
+def backoff_delay(attempt, base=BACKOFF_SECONDS):
+    """Exponential backoff with jitter for the given (1-based) attempt"""
+    return base * (2 ** (attempt - 1)) * (0.5 + random.random())
+
+
+def conditional_headers(cached):
+    """If-None-Match/If-Modified-Since headers for a previously fetched page"""
+    headers = {}
+    if cached:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+    return headers
+
+
+def fetch_page(session, offset, limit=PAGE_LIMIT, base_url=WIKI_BASE_URL,
+               retries=MAX_RETRIES, backoff=BACKOFF_SECONDS, timeout=REQUEST_TIMEOUT,
+               cached=None):
+    """
+    Fetch one catalogue page, retrying transient failures with backoff.
+
+    `cached` is the previous copy of the page ({'url', 'etag', 'last_modified',
+    'content'}); when given, the request is conditional and a 304 answer
+    reuses the cached content.
+    """
+    url = page_url(offset, limit, base_url)
+    if cached and cached.get('url', url) != url:
+        # Cached under a different query (e.g. another page size); not comparable
+        cached = None
+    headers = conditional_headers(cached)
+    start = time.perf_counter()
+    last_error = None
+    statuses = []
+    for attempt in range(1, retries + 2):
+        try:
+            response = session.get(url, params=QUERY_PARAMETERS, headers=headers, timeout=timeout)
+            statuses.append(response.status_code)
+            not_modified = response.status_code == 304 and cached is not None
+            if response.status_code == 200 or not_modified:
+                content = cached['content'] if not_modified else response.content
+                return PageResult(
+                    offset=offset,
+                    url=url,
+                    status=response.status_code,
+                    content=content,
+                    rows=count_csv_rows(content),
+                    elapsed=time.perf_counter() - start,
+                    attempts=attempt,
+                    etag=response.headers.get('ETag') or (cached or {}).get('etag'),
+                    last_modified=(response.headers.get('Last-Modified')
+                                   or (cached or {}).get('last_modified')),
+                    not_modified=not_modified,
+                    statuses=statuses,
+                )
+            last_error = f"HTTP {response.status_code}"
+            if response.status_code not in RETRY_STATUS_CODES:
+                break
+        except requests.RequestException as e:
+            statuses.append(type(e).__name__)
+            last_error = str(e)
+        if attempt <= retries:
+            time.sleep(backoff_delay(attempt, backoff))
+    raise FetchError(f"offset {offset}: {last_error} after {attempt} attempt(s)")
+
+
+def fetch_pages(base_url=WIKI_BASE_URL, limit=PAGE_LIMIT, workers=MAX_WORKERS,
+                max_pages=100, session=None, cache=None, **fetch_options):
+    """
+    Fetch catalogue pages concurrently until a short page is returned.
+
+    Up to `workers` offsets are in flight at once. As soon as a page comes back
+    with fewer than `limit` rows it marks the end of the catalogue; pages past it
+    are discarded. `cache` maps offsets to previously fetched pages for
+    conditional requests. Returns the pages in offset order.
+    """
+    cache = cache or {}
+    own_session = session is None
+    if own_session:
+        session = make_session(workers)
+
+    results = {}
+    end_offset = None
+    next_offset = 0
+    in_flight = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                while (len(in_flight) < workers and end_offset is None
+                       and next_offset < max_pages * limit):
+                    future = pool.submit(fetch_page, session, next_offset, limit, base_url,
+                                         cached=cache.get(next_offset), **fetch_options)
+                    in_flight[future] = next_offset
+                    next_offset += limit
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    offset = in_flight.pop(future)
+                    try:
+                        page = future.result()
+                    except FetchError:
+                        # A failure beyond a known end of catalogue does not matter
+                        if end_offset is not None and offset > end_offset:
+                            continue
+                        raise
+                    results[offset] = page
+                    if page.rows < limit and (end_offset is None or offset < end_offset):
+                        end_offset = offset
+    finally:
+        if own_session:
+            session.close()
+
+    if end_offset is None:
+        raise FetchError(f"no short page within {max_pages} pages; catalogue may be truncated")
+    return [results[offset] for offset in sorted(results) if offset <= end_offset]
+
+
+def report_timings(pages, total_elapsed):
+    """Print wall-clock time per page and in total"""
+    for page in pages:
+        retry_note = f", {page.attempts - 1} retr{'y' if page.attempts == 2 else 'ies'}" if page.attempts > 1 else ""
+        cache_note = " (not modified)" if page.not_modified else ""
+        print(f"   offset {page.offset:>5}: {page.rows:>4} rows, {len(page.content):>7} bytes "
+              f"in {page.elapsed:.2f}s{retry_note}{cache_note}")
+    total_rows = sum(page.rows for page in pages)
+    print(f"⏱️  Fetched {len(pages)} pages ({total_rows} rows) in {total_elapsed:.2f}s")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fetch the wiki item catalogue pages")
+    parser.add_argument('--base-url', default=WIKI_BASE_URL,
+                        help="wiki base URL, e.g. a local stand-in (default: %(default)s)")
+    parser.add_argument('--limit', type=int, default=PAGE_LIMIT, help="rows per page")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="concurrent page fetches")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        pages = fetch_pages(args.base_url, args.limit, args.workers)
+    except FetchError as e:
+        print(f"❌ Error fetching catalogue: {e}")
+        return 1
+    report_timings(pages, time.perf_counter() - start)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,413 @@
+"""
+Price history for marketplace items.
+
+marketplace.db only holds current listings, so every SNAPSHOT_INTERVAL the
+order book of each item (best bid, best ask, listed quantity per side) is
+appended to price_points in price_history.db. A point is only written when an
+item's book changed since its previous point, so an item that sits unchanged
+for a month costs nothing; readers carry the last point forward.
+
+Points are rolled up into hourly, daily and weekly OHLC buckets of the
+reference price (the bid/ask midpoint, or whichever side exists). Raw points
+and each rollup have their own retention. Both tables are keyed on
+(item, time), so a range query for one item is a single index range scan.
+
+History from before the snapshots existed can be rebuilt from listings.json,
+old marketplace.db copies and the compressed backups:
+
+    python3 -m bazaar_data.history snapshot
+    python3 -m bazaar_data.history backfill /app/data/listings.json /app/data/marketplace.db.old
+    python3 -m bazaar_data.history query "Cake" --interval day --days 365
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from itertools import groupby
+
+HISTORY_DB_PATH = '/app/data/price_history.db'
+MARKETPLACE_DB_PATH = '/app/data/marketplace.db'
+
+MINUTE_MS = 60 * 1000
+DAY_MS = 24 * 60 * MINUTE_MS
+SNAPSHOT_INTERVAL_MS = 15 * MINUTE_MS
+INTERVALS = {'hour': 60 * MINUTE_MS, 'day': DAY_MS, 'week': 7 * DAY_MS}
+# 1970-01-01 was a Thursday; weekly buckets start on Mondays
+WEEK_OFFSET_MS = 4 * DAY_MS
+# Days kept per table (None keeps everything)
+RETENTION_DAYS = {'raw': 30, 'hour': 90, 'day': 3 * 365, 'week': None}
+
+# Listings with priceMode 'Total' store the price of the whole stack
+UNIT_PRICE_SQL = "CASE WHEN priceMode = 'Total' AND quantity > 0 THEN price / quantity ELSE price END"
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS price_points (
+        item TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        best_bid INTEGER,
+        best_ask INTEGER,
+        bid_volume INTEGER NOT NULL,
+        ask_volume INTEGER NOT NULL,
+        listings INTEGER NOT NULL,
+        PRIMARY KEY (item, ts)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS price_rollups (
+        interval TEXT NOT NULL,
+        item TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        open INTEGER,
+        high INTEGER,
+        low INTEGER,
+        close INTEGER,
+        best_bid INTEGER,
+        best_ask INTEGER,
+        volume INTEGER NOT NULL,
+        samples INTEGER NOT NULL,
+        PRIMARY KEY (interval, item, bucket)
+    ) WITHOUT ROWID''',
+    # The newest point per item, to decide whether a snapshot changed anything
+    '''CREATE TABLE IF NOT EXISTS price_latest (
+        item TEXT PRIMARY KEY,
+        ts INTEGER NOT NULL,
+        best_bid INTEGER,
+        best_ask INTEGER,
+        bid_volume INTEGER NOT NULL,
+        ask_volume INTEGER NOT NULL,
+        listings INTEGER NOT NULL
+    ) WITHOUT ROWID''',
+]
+
+BOOK_FIELDS = ('best_bid', 'best_ask', 'bid_volume', 'ask_volume', 'listings')
+EMPTY_BOOK = (None, None, 0, 0, 0)
+
+BOOKS_QUERY = f'''
+    SELECT item,
+        MAX(CASE WHEN type = 'buy' THEN unit_price END),
+        MIN(CASE WHEN type = 'sell' THEN unit_price END),
+        SUM(CASE WHEN type = 'buy' THEN quantity ELSE 0 END),
+        SUM(CASE WHEN type = 'sell' THEN quantity ELSE 0 END),
+        COUNT(*)
+    FROM (SELECT item, type, quantity, {UNIT_PRICE_SQL} AS unit_price FROM listings)
+    GROUP BY item
+'''
+
+
+def unit_price(price, quantity, price_mode):
+    """Python twin of UNIT_PRICE_SQL"""
+    if price_mode == 'Total' and quantity and quantity > 0:
+        return int(price) // int(quantity)
+    return int(price)
+
+
+def connect(path=HISTORY_DB_PATH):
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    for statement in SCHEMA:
+        conn.execute(statement)
+    return conn
+
+
+def tick(ts, interval=SNAPSHOT_INTERVAL_MS):
+    return ts - ts % interval
+
+
+def bucket_start(ts, interval):
+    size = INTERVALS[interval]
+    offset = WEEK_OFFSET_MS if interval == 'week' else 0
+    return ts - (ts - offset) % size
+
+
+def reference_price(best_bid, best_ask):
+    """Price an OHLC bucket tracks: the midpoint, or whichever side exists"""
+    if best_bid is not None and best_ask is not None:
+        return (best_bid + best_ask) // 2
+    return best_ask if best_ask is not None else best_bid
+
+
+def current_books(marketplace_db_path):
+    """Order book summary per item from the live listings"""
+    conn = sqlite3.connect(f"file:{marketplace_db_path}?mode=ro", uri=True)
+    try:
+        return {row[0]: tuple(row[1:]) for row in conn.execute(BOOKS_QUERY)}
+    finally:
+        conn.close()
+
+
+def book_of(listings):
+    """Order book summary for (type, unit price, quantity) listings"""
+    bids = [(price, quantity) for kind, price, quantity in listings if kind == 'buy']
+    asks = [(price, quantity) for kind, price, quantity in listings if kind == 'sell']
+    return (max((price for price, _ in bids), default=None), min((price for price, _ in asks), default=None),
+            sum(quantity for _, quantity in bids), sum(quantity for _, quantity in asks), len(listings))
+
+
+def record_points(conn, points, replace=True):
+    """Append (item, ts, *book) points and keep price_latest current"""
+    verb = 'INSERT OR REPLACE' if replace else 'INSERT OR IGNORE'
+    conn.executemany(f'{verb} INTO price_points (item, ts, {", ".join(BOOK_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                     points)
+    conn.executemany(f'''
+        INSERT INTO price_latest (item, ts, {", ".join(BOOK_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(item) DO UPDATE SET ts = excluded.ts, best_bid = excluded.best_bid,
+            best_ask = excluded.best_ask, bid_volume = excluded.bid_volume,
+            ask_volume = excluded.ask_volume, listings = excluded.listings
+        WHERE excluded.ts >= price_latest.ts
+    ''', points)
+
+
+def snapshot(history_conn, marketplace_db_path=MARKETPLACE_DB_PATH, now=None):
+    """Record a point for every item whose book changed; returns the points written"""
+    ts = tick(now if now is not None else int(time.time() * 1000))
+    books = current_books(marketplace_db_path)
+    latest = {row[0]: tuple(row[1:]) for row in history_conn.execute(
+        f'SELECT item, {", ".join(BOOK_FIELDS)} FROM price_latest')}
+
+    points = [(item, ts) + book for item, book in books.items() if latest.get(item) != book]
+    # Items whose last listing disappeared get an empty point so charts stop there
+    points += [(item, ts) + EMPTY_BOOK for item, book in latest.items()
+               if item not in books and book != EMPTY_BOOK]
+    with history_conn:
+        record_points(history_conn, points)
+    return points
+
+
+def rollup(conn, since):
+    """Recompute every rollup bucket from the one containing `since` onwards"""
+    written = 0
+    with conn:
+        for interval in INTERVALS:
+            start = bucket_start(since, interval)
+            # The book in effect when the first bucket opened, per item
+            carried = {row[0]: reference_price(row[1], row[2]) for row in conn.execute('''
+                SELECT p.item, p.best_bid, p.best_ask FROM price_points p
+                JOIN (SELECT item, MAX(ts) AS ts FROM price_points WHERE ts < ? GROUP BY item) last
+                    ON p.item = last.item AND p.ts = last.ts
+            ''', (start,))}
+            points = conn.execute('''
+                SELECT item, ts, best_bid, best_ask, bid_volume + ask_volume
+                FROM price_points WHERE ts >= ? ORDER BY item, ts
+            ''', (start,))
+            rows = []
+            for item, item_points in groupby(points, key=lambda point: point[0]):
+                current = carried.get(item)
+                for bucket, bucket_points in groupby(item_points, key=lambda point: bucket_start(point[1], interval)):
+                    bucket_points = list(bucket_points)
+                    prices = [reference_price(point[2], point[3]) for point in bucket_points]
+                    if current is not None:
+                        prices.insert(0, current)
+                    current = prices[-1]
+                    quoted = [price for price in prices if price is not None]
+                    bids = [point[2] for point in bucket_points if point[2] is not None]
+                    asks = [point[3] for point in bucket_points if point[3] is not None]
+                    rows.append((interval, item, bucket,
+                                 quoted[0] if quoted else None, max(quoted, default=None),
+                                 min(quoted, default=None), prices[-1],
+                                 max(bids, default=None), min(asks, default=None),
+                                 max(point[4] for point in bucket_points), len(bucket_points)))
+            # Replace only buckets that have points: older buckets may outlive their pruned raw points
+            conn.executemany('INSERT OR REPLACE INTO price_rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            written += len(rows)
+    return written
+
+
+def prune(conn, now=None, retention=RETENTION_DAYS):
+    """Drop raw points and rollup buckets older than their retention; returns (raw points, rollup rows) removed"""
+    now = now if now is not None else int(time.time() * 1000)
+    points = buckets = 0
+    with conn:
+        if retention.get('raw'):
+            points = conn.execute('DELETE FROM price_points WHERE ts < ?',
+                                  (now - retention['raw'] * DAY_MS,)).rowcount
+        for interval in INTERVALS:
+            if retention.get(interval):
+                buckets += conn.execute('DELETE FROM price_rollups WHERE interval = ? AND bucket < ?',
+                                        (interval, now - retention[interval] * DAY_MS)).rowcount
+    return points, buckets
+
+
+def price_history(conn, item, start, end, interval='raw'):
+    """Points (interval 'raw') or OHLC buckets for one item between two ms timestamps"""
+    if interval == 'raw':
+        cursor = conn.execute(f'''
+            SELECT ts, {", ".join(BOOK_FIELDS)} FROM price_points
+            WHERE item = ? AND ts BETWEEN ? AND ? ORDER BY ts
+        ''', (item, start, end))
+    else:
+        cursor = conn.execute('''
+            SELECT bucket, open, high, low, close, best_bid, best_ask, volume, samples FROM price_rollups
+            WHERE interval = ? AND item = ? AND bucket BETWEEN ? AND ? ORDER BY bucket
+        ''', (interval, item, bucket_start(start, interval), end))
+    columns = [description[0] for description in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+
+# --- Backfill -----------------------------------------------------------------
+
+def listings_from_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def listings_from_db(path):
+    """Listings in a marketplace.db copy ([] if it has no listings table)"""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'listings'").fetchone():
+            return []
+        return [dict(row) for row in conn.execute('SELECT * FROM listings')]
+    finally:
+        conn.close()
+
+
+def load_source(path):
+    """(listings, as-of ms) for listings.json, a marketplace.db copy or a compressed backup"""
+    as_of = int(os.path.getmtime(path) * 1000)
+    if path.endswith('.json'):
+        return listings_from_json(path), as_of
+    if path.endswith(('.gz', '.zst')):
+        from .backup import decompress_file
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            restored = os.path.join(tmp_dir, 'marketplace.db')
+            decompress_file(path, restored)
+            return listings_from_db(restored), as_of
+    return listings_from_db(path), as_of
+
+
+def listing_versions(sources):
+    """
+    Every (listing id, timestamp) version seen in the sources with the span it
+    was live: from its timestamp until the next edit of the same listing, or
+    the newest source that still contained it.
+    """
+    versions = {}
+    for listings, as_of in sources:
+        for listing in listings:
+            if not listing.get('item') or listing.get('timestamp') is None:
+                continue
+            listing_id = listing.get('id')
+            if listing_id is None:
+                listing_id = (listing['item'], listing.get('seller'), listing.get('type'))
+            key = (listing_id, int(listing['timestamp']))
+            price = unit_price(listing.get('price') or 0, listing.get('quantity'), listing.get('priceMode'))
+            version = versions.setdefault(key, {
+                'item': listing['item'], 'type': listing.get('type'), 'price': price,
+                'quantity': int(listing.get('quantity') or 0), 'start': key[1], 'end': as_of,
+            })
+            version['end'] = max(version['end'], as_of)
+
+    by_listing = defaultdict(list)
+    for (listing_id, ts), version in versions.items():
+        by_listing[listing_id].append(version)
+    for listing_versions_ in by_listing.values():
+        listing_versions_.sort(key=lambda version: version['start'])
+        for earlier, later in zip(listing_versions_, listing_versions_[1:]):
+            earlier['end'] = min(earlier['end'], later['start'])
+    return [version for version in versions.values() if version['end'] > version['start']]
+
+
+def replay(versions, interval=SNAPSHOT_INTERVAL_MS):
+    """Points the snapshot job would have written had it been running"""
+    events = sorted([(version['start'], 1, index) for index, version in enumerate(versions)] +
+                    [(version['end'], 0, index) for index, version in enumerate(versions)])
+    active = defaultdict(dict)
+    last = {}
+    points = []
+    position = 0
+    ts = tick(events[0][0], interval) + interval if events else None
+    while position < len(events):
+        changed = set()
+        while position < len(events) and events[position][0] < ts:
+            _, starting, index = events[position]
+            version = versions[index]
+            if starting:
+                active[version['item']][index] = (version['type'], version['price'], version['quantity'])
+            else:
+                active[version['item']].pop(index, None)
+            changed.add(version['item'])
+            position += 1
+        for item in changed:
+            book = book_of(list(active[item].values())) if active[item] else EMPTY_BOOK
+            if last.get(item, EMPTY_BOOK) != book:
+                points.append((item, ts) + book)
+                last[item] = book
+        # Skip idle stretches instead of stepping through every empty tick
+        if position < len(events):
+            ts = max(ts + interval, tick(events[position][0], interval) + interval)
+    return points
+
+
+def backfill(conn, paths, interval=SNAPSHOT_INTERVAL_MS):
+    """Replay old listing dumps into price_points; returns (points, rollup rows)"""
+    sources = []
+    for path in paths:
+        listings, as_of = load_source(path)
+        print(f"   {path}: {len(listings)} listings as of {datetime.fromtimestamp(as_of / 1000):%Y-%m-%d %H:%M}")
+        sources.append((listings, as_of))
+    points = replay(listing_versions(sources), interval)
+    if not points:
+        return 0, 0
+    with conn:
+        # Never overwrite points the live snapshot job recorded
+        record_points(conn, points, replace=False)
+    return len(points), rollup(conn, min(point[1] for point in points))
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Marketplace price history")
+    parser.add_argument('--history-db', default=HISTORY_DB_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    snapshot_parser = commands.add_parser('snapshot', help="record changed order books and refresh rollups")
+    snapshot_parser.add_argument('--db', default=MARKETPLACE_DB_PATH)
+
+    backfill_parser = commands.add_parser('backfill', help="rebuild history from old listing dumps")
+    backfill_parser.add_argument('sources', nargs='+', help="listings.json, marketplace.db copies or backups")
+
+    query_parser = commands.add_parser('query', help="print an item's history")
+    query_parser.add_argument('item')
+    query_parser.add_argument('--interval', choices=['raw'] + list(INTERVALS), default='day')
+    query_parser.add_argument('--days', type=float, default=365)
+    args = parser.parse_args(argv)
+
+    conn = connect(args.history_db)
+    try:
+        start = time.perf_counter()
+        if args.command == 'snapshot':
+            if not os.path.exists(args.db):
+                print(f"[{datetime.now()}] ℹ️  {args.db} not found, no snapshot taken")
+                return 0
+            points = snapshot(conn, args.db)
+            rows = rollup(conn, min(point[1] for point in points)) if points else 0
+            expired_points, expired_buckets = prune(conn)
+            print(f"[{datetime.now()}] ✅ Price snapshot: {len(points)} items changed, {rows} rollup buckets, "
+                  f"{expired_points} expired points and {expired_buckets} expired buckets removed "
+                  f"in {time.perf_counter() - start:.3f}s")
+        elif args.command == 'backfill':
+            # Retention is left to the next snapshot, which reports what it drops
+            points, rows = backfill(conn, args.sources)
+            print(f"✅ Backfilled {points} price points into {rows} rollup buckets "
+                  f"in {time.perf_counter() - start:.3f}s")
+        else:
+            end = int(time.time() * 1000)
+            rows = price_history(conn, args.item, end - int(args.days * DAY_MS), end, args.interval)
+            elapsed = time.perf_counter() - start
+            for row in rows:
+                key = 'ts' if args.interval == 'raw' else 'bucket'
+                print(json.dumps({**row, key: datetime.fromtimestamp(row[key] / 1000).isoformat()}))
+            print(f"{len(rows)} rows in {elapsed * 1000:.2f} ms")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,289 @@
+"""
+The scheduled catalogue refresh: one run at a time, resumable after a crash.
+
+check_and_scrape.sh calls this from cron every hour. A run:
+
+- takes an exclusive lock (data/scrape.lock), so a refresh that outlasts the
+  hour is never overlapped by the next tick;
+- resumes an interrupted refresh straight away, otherwise starts one only when
+  `--interval-hours` have passed since data/last_scrape_time (written only
+  after a successful run);
+- checkpoints every completed stage to data/scrape_job.json. Fetched pages,
+  the cleaned catalogue and its diff are kept next to it in data/scrape_job/,
+  and image downloads record every finished file, so a resumed run continues
+  from the last completed unit instead of fetching and downloading again.
+
+A completed run removes the checkpoint. Checkpoints older than
+MAX_CHECKPOINT_AGE are discarded rather than resumed, so stale pages are
+never published.
+
+    cd server/scripts
+    python3 -m bazaar_data job --lean
+    python3 -m bazaar_data job --force --full
+"""
+
+import fcntl
+import json
+import os
+import shutil
+import signal
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+LOCK_NAME = 'scrape.lock'
+CHECKPOINT_NAME = 'scrape_job.json'
+CHECKPOINT_DIR = 'scrape_job'
+LAST_RUN_NAME = 'last_scrape_time'
+INTERVAL_HOURS = 25
+# Older interrupted runs start over instead of resuming
+MAX_CHECKPOINT_AGE = 12 * 60 * 60
+# Image results recorded between checkpoint writes
+IMAGE_CHECKPOINT_EVERY = 25
+CHECKPOINT_VERSION = 1
+
+
+class JobLocked(Exception):
+    """Another refresh holds the lock"""
+
+
+@contextmanager
+def exclusive_lock(path):
+    """Hold an exclusive flock on `path` for the block; raises JobLocked if another process has it"""
+    with open(path, 'a+', encoding='ascii') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.seek(0)
+            raise JobLocked(f"another run holds {path} (pid {f.read().strip() or 'unknown'})")
+        try:
+            f.seek(0)
+            f.truncate()
+            f.write(str(os.getpid()))
+            f.flush()
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _write_json(data, path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class Checkpoint:
+    """Completed stages and image progress of one refresh, saved after every unit of work"""
+
+    def __init__(self, data_dir, incremental=False):
+        self.path = os.path.join(data_dir, CHECKPOINT_NAME)
+        self.directory = os.path.join(data_dir, CHECKPOINT_DIR)
+        self.data_dir = data_dir
+        self.state = None
+        self._unsaved_images = 0
+        try:
+            state = _read_json(self.path)
+        except (FileNotFoundError, ValueError):
+            state = None
+        if state and state.get('version') == CHECKPOINT_VERSION \
+                and time.time() - state.get('started_at', 0) < MAX_CHECKPOINT_AGE:
+            self.state = state
+            self.resumed = True
+        else:
+            self.clear()
+            self.state = {'version': CHECKPOINT_VERSION, 'started_at': int(time.time()),
+                          'incremental': incremental, 'stages': {}, 'images': {}}
+            self.resumed = False
+
+    @classmethod
+    def pending(cls, data_dir):
+        """True if an interrupted refresh recent enough to resume is waiting"""
+        try:
+            state = _read_json(os.path.join(data_dir, CHECKPOINT_NAME))
+        except (FileNotFoundError, ValueError):
+            return False
+        return state.get('version') == CHECKPOINT_VERSION \
+            and time.time() - state.get('started_at', 0) < MAX_CHECKPOINT_AGE
+
+    @property
+    def incremental(self):
+        return self.state['incremental']
+
+    def save(self):
+        _write_json(self.state, self.path)
+        self._unsaved_images = 0
+
+    def clear(self):
+        """Forget the run: remove the checkpoint and its saved pages/catalogue"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def done(self, stage):
+        return stage in self.state['stages']
+
+    def complete(self, stage, pipeline):
+        """Save what later stages need from `stage` and mark it done"""
+        saver = SAVERS.get(stage)
+        os.makedirs(self.directory, exist_ok=True)
+        self.state['stages'][stage] = dict(saver(self, pipeline) if saver else {}, finished_at=int(time.time()))
+        self.save()
+
+    def restore(self, stage, pipeline):
+        """Put what `stage` produced back on the pipeline"""
+        restorer = RESTORERS.get(stage)
+        if restorer:
+            restorer(self, pipeline, self.state['stages'][stage])
+
+    def image_done(self, filename):
+        """True if the interrupted attempt downloaded `filename`; failures are tried again"""
+        return self.state['images'].get(filename) == 'ok'
+
+    def record_image(self, filename, ok):
+        """Record one finished download; the file is written every IMAGE_CHECKPOINT_EVERY results"""
+        self.state['images'][filename] = 'ok' if ok else 'failed'
+        self._unsaved_images += 1
+        if self._unsaved_images >= IMAGE_CHECKPOINT_EVERY:
+            self.save()
+
+    def file(self, name):
+        return os.path.join(self.directory, name)
+
+
+def save_pages(checkpoint, pipeline):
+    pages = []
+    for page in pipeline.pages:
+        with open(checkpoint.file(f"page-{page.offset}.csv"), 'wb') as f:
+            f.write(page.content)
+        pages.append({'offset': page.offset, 'url': page.url, 'status': page.status, 'rows': page.rows,
+                      'etag': page.etag, 'last_modified': page.last_modified, 'not_modified': page.not_modified})
+    return {'pages': pages}
+
+
+def restore_pages(checkpoint, pipeline, saved):
+    from .fetch import PageResult
+    from .state import empty_state, load_state
+
+    pipeline.state = load_state(pipeline.path('scrape_state.json')) if pipeline.incremental else empty_state()
+    pipeline.pages = []
+    for meta in saved['pages']:
+        with open(checkpoint.file(f"page-{meta['offset']}.csv"), 'rb') as f:
+            content = f.read()
+        pipeline.pages.append(PageResult(content=content, elapsed=0.0, attempts=0, **meta))
+
+
+def save_pages_changed(checkpoint, pipeline):
+    return {'pages_changed': pipeline.pages_changed}
+
+
+def restore_pages_changed(checkpoint, pipeline, saved):
+    from .state import record_pages
+
+    # Re-record so the state saved by persist has this run's validators; the
+    # comparison itself is taken from the first attempt, since a completed
+    # persist has already saved them
+    record_pages(pipeline.state, pipeline.pages, pipeline.path('scrape_cache'))
+    pipeline.pages_changed = saved['pages_changed']
+
+
+def save_items(checkpoint, pipeline):
+    _write_json(pipeline.items, checkpoint.file('items.json'))
+    return {}
+
+
+def restore_items(checkpoint, pipeline, saved):
+    pipeline.items = _read_json(checkpoint.file('items.json'))
+
+
+def save_diff(checkpoint, pipeline):
+    _write_json(pipeline.diff, checkpoint.file('diff.json'))
+    return {}
+
+
+def restore_diff(checkpoint, pipeline, saved):
+    pipeline.diff = _read_json(checkpoint.file('diff.json'))
+
+
+# Stage name -> what to keep from it for a resumed run, and how to put it back
+SAVERS = {'fetch': save_pages, 'record': save_pages_changed, 'clean': save_items, 'diff': save_diff}
+RESTORERS = {'fetch': restore_pages, 'record': restore_pages_changed, 'clean': restore_items, 'diff': restore_diff}
+
+
+def read_last_run(data_dir):
+    try:
+        with open(os.path.join(data_dir, LAST_RUN_NAME), 'r', encoding='ascii') as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_last_run(data_dir, timestamp):
+    path = os.path.join(data_dir, LAST_RUN_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='ascii') as f:
+        f.write(f"{timestamp}\n")
+    os.replace(tmp_path, path)
+
+
+def run_job(pipeline, interval_hours=INTERVAL_HOURS, force=False, full=False):
+    """
+    Run (or resume) the refresh if it is due; returns a process exit code.
+
+    The first refresh, and any with `full`, is a full scrape; later ones are
+    incremental. A failed run keeps its checkpoint for the next attempt.
+    """
+    from .pipeline import log, run
+
+    os.makedirs(pipeline.data_dir, exist_ok=True)
+    # A container stop sends SIGTERM: unwind so metrics and image progress are saved
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+    try:
+        with exclusive_lock(os.path.join(pipeline.data_dir, LOCK_NAME)):
+            started = int(time.time())
+            last_run = read_last_run(pipeline.data_dir)
+            resuming = Checkpoint.pending(pipeline.data_dir)
+            if not (force or resuming or last_run is None):
+                elapsed = started - last_run
+                if elapsed < interval_hours * 3600:
+                    remaining = (interval_hours * 3600 - elapsed) / 3600
+                    log(f"Only {elapsed // 3600} hours since last scrape. {remaining:.0f} hours remaining "
+                        f"until next run.")
+                    return 0
+
+            checkpoint = Checkpoint(pipeline.data_dir, incremental=last_run is not None and not full)
+            pipeline.incremental = checkpoint.incremental
+            pipeline.checkpoint = checkpoint
+            if checkpoint.resumed:
+                done = ', '.join(checkpoint.state['stages']) or 'nothing'
+                log(f"Resuming the refresh started at {datetime.fromtimestamp(checkpoint.state['started_at'])} "
+                    f"(done: {done}; {len(checkpoint.state['images'])} images)")
+            elif last_run is None:
+                log("First run detected. Running initial scrape...")
+            else:
+                log(f"{(started - last_run) // 3600}+ hours have passed since last scrape. Running scrape now...")
+
+            try:
+                code = run(pipeline)
+            except BaseException:
+                checkpoint.save()
+                raise
+            if code != 0:
+                checkpoint.save()
+                log("Scrape failed; the next run resumes from the last completed stage.")
+                return code
+            write_last_run(pipeline.data_dir, started)
+            checkpoint.clear()
+            log("Scrape completed and timestamp updated.")
+            return 0
+    except JobLocked as e:
+        log(f"⏭️  Skipping: {e}")
+        return 0
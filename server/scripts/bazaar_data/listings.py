@@ -0,0 +1,452 @@
+"""
+Bulk import and export of marketplace listings.
+
+Replaces server/import-listings.js (one awaited INSERT per listing, each in
+its own autocommit transaction) and the ad hoc copies between marketplace.db,
+marketplace.db.old and listings.json.
+
+Import streams a JSON array or NDJSON file (optionally .gz) one record at a
+time, so memory stays flat however large the dump is; NDJSON lines are parsed
+with orjson when it is installed. Each record is
+validated and coerced to the listings schema: price, quantity and timestamp
+become integers ("1,000" and 5000.0 are accepted), contactInfo fills IGN when
+IGN is missing, totalPrice is computed when absent, missing text fields are
+'' where import-listings.js wrote '', and fields the table does not have are
+dropped. Rows are written with executemany in batches of
+BATCH_SIZE, one transaction per batch.
+
+    insert   new rows with fresh ids (what import-listings.js did)
+    upsert   keyed on id: rows that exist are updated if they changed,
+             the rest are inserted; --dry-run prints the diff instead
+
+Export streams the table with fetchmany as NDJSON, CSV or a JSON array in the
+listings.json layout, without loading it into memory.
+
+    python3 -m bazaar_data.listings import /app/data/listings.json --mode upsert --dry-run
+    python3 -m bazaar_data.listings export /app/data/listings.ndjson
+    python3 -m bazaar_data.listings export - --format csv > listings.csv
+"""
+
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass, field
+from itertools import chain, islice
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MARKETPLACE_DB_PATH = '/app/data/marketplace.db'
+BATCH_SIZE = 10_000
+READ_CHUNK = 1 << 16
+
+# listings as created by server.js initDatabase() plus its ALTER TABLE migrations
+CREATE_LISTINGS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS listings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        item TEXT NOT NULL,
+        price INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        type TEXT NOT NULL,
+        category TEXT,
+        seller TEXT NOT NULL,
+        userId TEXT,
+        sellerAvatar TEXT,
+        timestamp INTEGER NOT NULL,
+        IGN TEXT,
+        priceMode TEXT DEFAULT 'Each',
+        combatCategory TEXT,
+        combatLevel TEXT,
+        combatStrength TEXT,
+        combatDmgType TEXT,
+        combatDmgPercent TEXT,
+        combatImpact TEXT,
+        combatCryonae TEXT,
+        combatArborae TEXT,
+        combatTempestae TEXT,
+        combatInfernae TEXT,
+        combatNecromae TEXT,
+        rarity TEXT,
+        totalPrice INTEGER,
+        contactInfo TEXT,
+        notes TEXT,
+        sellerId TEXT
+    )
+'''
+INTEGER_FIELDS = frozenset(['id', 'price', 'quantity', 'timestamp', 'totalPrice'])
+# Text columns import-listings.js filled with '' when a record lacked them;
+# server.js filters on them with = '' and !== '', so they never become NULL
+EMPTY_TEXT_FIELDS = frozenset(['category', 'sellerId', 'sellerAvatar', 'IGN', 'combatCategory', 'combatLevel',
+                               'combatStrength', 'combatDmgType', 'combatDmgPercent', 'combatImpact', 'combatCryonae',
+                               'combatArborae', 'combatTempestae', 'combatInfernae', 'combatNecromae'])
+REQUIRED_FIELDS = ('item', 'price', 'quantity', 'type', 'seller', 'timestamp')
+LISTING_TYPES = ('buy', 'sell')
+PRICE_MODES = ('Each', 'Total')
+MODES = ('insert', 'upsert')
+FORMATS = ('ndjson', 'csv', 'json')
+# Changed listings printed per dry run
+MAX_SHOWN_CHANGES = 20
+
+
+class ListingError(ValueError):
+    pass
+
+
+@dataclass
+class ImportReport:
+    read: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    rejected: list = field(default_factory=list)
+    changes: list = field(default_factory=list)
+
+
+def _open_text(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', newline='')
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def iter_json_array(f, chunk_size=READ_CHUNK, prefix=''):
+    """Yield the elements of a top-level JSON array, reading `f` in chunks"""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = prefix, 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    skip(' \t\r\n')
+    if buffer[pos:pos + 1] != '[':
+        raise ListingError("expected a JSON array")
+    pos += 1
+    while True:
+        skip(' \t\r\n,')
+        if pos >= len(buffer):
+            raise ListingError("unexpected end of JSON array")
+        if buffer[pos] == ']':
+            return
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+            # A number cut off at the chunk boundary ("44" of "4444.5") still decodes,
+            # so only trust a value that is followed by a delimiter
+            complete = eof or (end < len(buffer) and buffer[end] in ' \t\r\n,]')
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
+        if not complete:
+            fill()
+            continue
+        pos = end
+        yield value
+
+
+def _dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value).decode('utf-8')
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def iter_ndjson(lines):
+    loads = orjson.loads if orjson is not None else json.loads
+    for line in lines:
+        if not line.isspace():
+            yield loads(line)
+
+
+def read_records(path):
+    """Stream the records of a JSON array or NDJSON file ('-' for stdin)"""
+    f = sys.stdin if path == '-' else _open_text(path, 'r')
+    try:
+        head = f.read(1)
+        while head.isspace():
+            head = f.read(1)
+        if head == '[':
+            yield from iter_json_array(f, prefix=head)
+        elif head:
+            yield from iter_ndjson(chain([head + f.readline()], f))
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _integer(value, name):
+    if isinstance(value, bool):
+        raise ListingError(f"{name} is not a number: {value!r}")
+    if isinstance(value, int):
+        return value
+    try:
+        number = float(value.replace(',', '').strip()) if isinstance(value, str) else float(value)
+    except (TypeError, ValueError):
+        raise ListingError(f"{name} is not a number: {value!r}") from None
+    if not number.is_integer():
+        raise ListingError(f"{name} is not a whole number: {value!r}")
+    return int(number)
+
+
+def coerce_listing(record, columns):
+    """Row dict for the `columns` the listings table has; raises ListingError"""
+    if not isinstance(record, dict) or not record:
+        raise ListingError("not a listing object")
+    for name in REQUIRED_FIELDS:
+        if record.get(name) in (None, ''):
+            raise ListingError(f"missing {name}")
+    row = {}
+    for name in columns:
+        value = record.get(name)
+        if value is None:
+            row[name] = '' if name in EMPTY_TEXT_FIELDS else None
+        elif name in INTEGER_FIELDS:
+            row[name] = value if type(value) is int else _integer(value, name)
+        else:
+            row[name] = value if type(value) is str else str(value)
+    if 'IGN' in row and not row['IGN'] and record.get('contactInfo'):
+        row['IGN'] = str(record['contactInfo'])
+    if row['price'] < 0 or row['quantity'] <= 0:
+        raise ListingError(f"price/quantity out of range: {row['price']}/{row['quantity']}")
+    row['type'] = row['type'].lower()
+    if row['type'] not in LISTING_TYPES:
+        raise ListingError(f"unknown type {row['type']!r}")
+    if 'priceMode' in row:
+        row['priceMode'] = row['priceMode'] or 'Each'
+        if row['priceMode'] not in PRICE_MODES:
+            raise ListingError(f"unknown priceMode {row['priceMode']!r}")
+    if 'totalPrice' in row and row['totalPrice'] is None:
+        row['totalPrice'] = row['price'] * row['quantity']
+    return row
+
+
+def listing_columns(conn, create=True):
+    """Columns of the listings table; if it is missing, those of the full schema (created when `create`)"""
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(listings)')]
+    if not columns:
+        target = conn if create else sqlite3.connect(':memory:')
+        target.execute(CREATE_LISTINGS_TABLE)
+        columns = [row[1] for row in target.execute('PRAGMA table_info(listings)')]
+    return columns
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _existing(conn, columns, ids):
+    """{id: row dict} for the ids already in listings"""
+    ids = [listing_id for listing_id in ids if listing_id is not None]
+    existing = {}
+    # Stay under SQLITE_MAX_VARIABLE_NUMBER on older builds
+    for chunk in _batches(ids, 900):
+        query = f"SELECT {', '.join(columns)} FROM listings WHERE id IN ({', '.join('?' * len(chunk))})"
+        for row in conn.execute(query, chunk):
+            existing[row[0]] = dict(zip(columns, row))
+    return existing
+
+
+def import_listings(db_path, records, mode='insert', batch_size=BATCH_SIZE, dry_run=False):
+    """
+    Write listing records to db_path in batched transactions.
+
+    In insert mode every valid record becomes a new row and ids in the input
+    are ignored. In upsert mode records are matched on id; only rows that
+    differ are written. With dry_run nothing is written and the report's
+    `changes` lists (id, {field: (old, new)}) for updated rows. Invalid records
+    are skipped and listed in `rejected` as (position, reason).
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    report = ImportReport()
+    if dry_run:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) if os.path.exists(db_path) \
+            else sqlite3.connect(':memory:')
+    else:
+        conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            has_table = conn.execute('PRAGMA table_info(listings)').fetchone() is not None
+            columns = listing_columns(conn, create=not dry_run)
+        # ids of an insert come from AUTOINCREMENT
+        write_columns = columns if mode == 'upsert' else [name for name in columns if name != 'id']
+        insert = (f"INSERT INTO listings ({', '.join(write_columns)}) "
+                  f"VALUES ({', '.join('?' * len(write_columns))})")
+        update = (f"UPDATE listings SET {', '.join(f'{name} = ?' for name in columns if name != 'id')} "
+                  f"WHERE id = ?")
+
+        for batch in _batches(enumerate(records), batch_size):
+            rows = []
+            for position, record in batch:
+                report.read += 1
+                try:
+                    rows.append(coerce_listing(record, columns))
+                except ListingError as e:
+                    report.rejected.append((position, str(e)))
+            existing = {}
+            if mode == 'upsert':
+                # A listing repeated within one batch: the last record wins
+                rows = list({row['id'] if row['id'] is not None else ('new', n): row
+                             for n, row in enumerate(rows)}.values())
+                if has_table or not dry_run:
+                    existing = _existing(conn, columns, [row['id'] for row in rows])
+            inserts, updates = [], []
+            for row in rows:
+                old = existing.get(row['id'])
+                if old is None:
+                    inserts.append(tuple(row[name] for name in write_columns))
+                    continue
+                changed = {name: (old[name], row[name]) for name in columns if old[name] != row[name]}
+                if not changed:
+                    report.unchanged += 1
+                    continue
+                updates.append(tuple(row[name] for name in columns if name != 'id') + (row['id'],))
+                if dry_run:
+                    report.changes.append((row['id'], changed))
+            report.inserted += len(inserts)
+            report.updated += len(updates)
+            if dry_run:
+                continue
+            with conn:
+                if updates:
+                    conn.executemany(update, updates)
+                if inserts:
+                    conn.executemany(insert, inserts)
+    finally:
+        conn.close()
+    return report
+
+
+def listing_rows(db_path, batch_size=BATCH_SIZE):
+    """Yield (columns, row tuple) for every listing, oldest id first, fetchmany at a time"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute('SELECT * FROM listings ORDER BY id')
+        columns = [description[0] for description in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield columns, row
+    finally:
+        conn.close()
+
+
+def write_listings(rows, f, fmt='ndjson'):
+    """Write listing_rows() output to a text file in `fmt`; returns the row count"""
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}")
+    count = 0
+    writer = None
+    if fmt == 'json':
+        f.write('[')
+    for columns, row in rows:
+        if fmt == 'csv':
+            if writer is None:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+            writer.writerow(['' if value is None else value for value in row])
+        else:
+            text = _dumps(dict(zip(columns, row)))
+            if fmt == 'json':
+                f.write((',\n  ' if count else '\n  ') + text)
+            else:
+                f.write(text + '\n')
+        count += 1
+    if fmt == 'json':
+        f.write('\n]\n' if count else ']\n')
+    return count
+
+
+def export_listings(db_path, output, fmt='ndjson', batch_size=BATCH_SIZE):
+    """Stream listings to `output` ('-' for stdout, .gz compresses); written atomically"""
+    rows = listing_rows(db_path, batch_size)
+    if output == '-':
+        return write_listings(rows, sys.stdout, fmt)
+    tmp_path = f"{output}.tmp" + ('.gz' if output.endswith('.gz') else '')
+    try:
+        with _open_text(tmp_path, 'w') as f:
+            count = write_listings(rows, f, fmt)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, output)
+    return count
+
+
+def format_from_path(path):
+    for suffix, fmt in (('.csv', 'csv'), ('.ndjson', 'ndjson'), ('.jsonl', 'ndjson'), ('.json', 'json')):
+        if path.removesuffix('.gz').endswith(suffix):
+            return fmt
+    return 'ndjson'
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bulk import/export of marketplace listings")
+    parser.add_argument('--db', default=MARKETPLACE_DB_PATH)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help="load a JSON array or NDJSON file of listings")
+    import_parser.add_argument('source', help="listings file (.json, .ndjson, optionally .gz) or - for stdin")
+    import_parser.add_argument('--mode', choices=MODES, default='insert')
+    import_parser.add_argument('--dry-run', action='store_true', help="report what would change without writing")
+
+    export_parser = commands.add_parser('export', help="stream the listings table to a file")
+    export_parser.add_argument('output', help="output file (.gz compresses) or - for stdout")
+    export_parser.add_argument('--format', choices=FORMATS, help="default: from the file extension, else ndjson")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.command == 'export':
+        if not os.path.exists(args.db):
+            print(f"❌ {args.db} not found", file=sys.stderr)
+            return 1
+        count = export_listings(args.db, args.output, args.format or format_from_path(args.output), args.batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"✅ Exported {count} listings in {elapsed:.2f}s ({count / max(elapsed, 1e-9):,.0f} rows/s)",
+              file=sys.stderr)
+        return 0
+
+    report = import_listings(args.db, read_records(args.source), args.mode, args.batch_size, args.dry_run)
+    elapsed = time.perf_counter() - start
+    for listing_id, changed in report.changes[:MAX_SHOWN_CHANGES]:
+        print(f"   ~ {listing_id}: " + ', '.join(f"{name} {old!r} -> {new!r}" for name, (old, new) in changed.items()))
+    if len(report.changes) > MAX_SHOWN_CHANGES:
+        print(f"   ... and {len(report.changes) - MAX_SHOWN_CHANGES} more changed listings")
+    for position, reason in report.rejected[:MAX_SHOWN_CHANGES]:
+        print(f"   ⚠️  record {position}: {reason}")
+    verb = 'Would import' if args.dry_run else 'Imported'
+    print(f"{'ℹ️ ' if args.dry_run else '✅'} {verb} {report.read} records into {args.db}: {report.inserted} inserted, "
+          f"{report.updated} updated, {report.unchanged} unchanged, {len(report.rejected)} rejected "
+          f"in {elapsed:.2f}s ({report.read / max(elapsed, 1e-9):,.0f} rows/s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
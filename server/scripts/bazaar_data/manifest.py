@@ -0,0 +1,140 @@
+"""
+Persistent manifest of item image files.
+
+One os.scandir pass per directory records every image's size, mtime and
+SHA-256. Later scans only rehash files whose size or mtime changed, and
+"what is missing or stale" becomes set arithmetic against the manifest
+instead of an os.path.exists probe per item.
+
+    python3 -m bazaar_data.manifest /usr/share/nginx/html/assets/items
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+MANIFEST_PATH = os.environ.get('IMAGE_MANIFEST', '/app/data/image_manifest.json')
+MANIFEST_VERSION = 1
+
+# In-progress downloads and temp files are not images
+IGNORED_SUFFIXES = ('.part', '.tmp')
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """Load the manifest, or an empty one if missing, unreadable or outdated"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        manifest = {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        manifest = {'version': MANIFEST_VERSION, 'directories': {}}
+    return manifest
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    """Write the manifest atomically"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def _directory_key(directory):
+    return os.path.abspath(directory)
+
+
+def scan(manifest, directory):
+    """
+    Refresh the manifest entry for `directory` from a single os.scandir pass.
+
+    Unchanged files (same size and mtime) keep their recorded hash; new or
+    modified files are rehashed; vanished files are dropped. Returns the
+    {filename: {'size', 'mtime_ns', 'sha256'}} mapping.
+    """
+    key = _directory_key(directory)
+    previous = manifest['directories'].get(key, {}).get('files', {})
+    files = {}
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        entries = []
+    for entry in entries:
+        if entry.name.startswith('.') or entry.name.endswith(IGNORED_SUFFIXES):
+            continue
+        try:
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            known = previous.get(entry.name)
+            if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+                files[entry.name] = known
+                continue
+            files[entry.name] = {
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': file_hash(entry.path),
+            }
+        except FileNotFoundError:
+            # Removed while we were scanning
+            continue
+    manifest['directories'][key] = {'scanned_at': int(time.time()), 'files': files}
+    return files
+
+
+def files_in(manifest, directory):
+    """Recorded files for a directory (scan() it first)"""
+    return manifest['directories'].get(_directory_key(directory), {}).get('files', {})
+
+
+def missing(manifest, directory, expected):
+    """Expected filenames that are not present in `directory`"""
+    return set(expected) - files_in(manifest, directory).keys()
+
+
+def stale(manifest, directory, reference_directory):
+    """Filenames in `reference_directory` whose copy in `directory` is missing or differs"""
+    files = files_in(manifest, directory)
+    reference = files_in(manifest, reference_directory)
+    return {name for name, entry in reference.items()
+            if files.get(name, {}).get('sha256') != entry['sha256']}
+
+
+def unreferenced(manifest, directory, expected):
+    """Files in `directory` that no expected filename refers to"""
+    return files_in(manifest, directory).keys() - set(expected)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or refresh the image manifest")
+    parser.add_argument('directories', nargs='+', help="image directories to scan")
+    parser.add_argument('--manifest', default=MANIFEST_PATH)
+    args = parser.parse_args(argv)
+
+    manifest = load_manifest(args.manifest)
+    for directory in args.directories:
+        start = time.perf_counter()
+        files = scan(manifest, directory)
+        total = sum(entry['size'] for entry in files.values())
+        print(f"📁 {directory}: {len(files)} images, {total / 1024 / 1024:.1f} MiB "
+              f"in {time.perf_counter() - start:.2f}s")
+    save_manifest(manifest, args.manifest)
+    print(f"✅ Manifest saved to {args.manifest}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
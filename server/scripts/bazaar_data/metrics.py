@@ -0,0 +1,298 @@
+"""
+Per-stage metrics for the catalogue refresh.
+
+Every pipeline stage runs inside RunMetrics.stage(), which records wall time,
+CPU time and peak RSS for the stage; the stage itself adds what only it knows
+(bytes fetched, rows in/out, HTTP status counts, retries) through
+Pipeline.count(). Failures, including the ones best-effort stages survive,
+are recorded with their traceback instead of only being printed.
+
+At the end of a run the stages are appended to metrics.jsonl (one JSON object
+per stage plus one for the run) and written to bazaar_scrape.prom in the
+Prometheus textfile-collector format; point BAZAAR_METRICS_DIR at
+node_exporter's --collector.textfile.directory to scrape it.
+
+Profiling is opt-in: `cpu` dumps a cProfile file per stage (open it with
+`python3 -m pstats`), `memory` traces allocations with tracemalloc and
+writes the top allocation sites per stage.
+
+    python3 -m bazaar_data scrape --incremental --profile cpu
+    python3 -m bazaar_data.metrics /app/data/metrics/metrics.jsonl --runs 7
+"""
+
+import json
+import os
+import resource
+import sys
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+
+METRICS_DIR = os.environ.get('BAZAAR_METRICS_DIR')
+JSONL_NAME = 'metrics.jsonl'
+TEXTFILE_NAME = 'bazaar_scrape.prom'
+PROFILE_MODES = ('cpu', 'memory', 'all')
+# Allocation sites written per stage when tracing memory
+TRACEMALLOC_TOP = 25
+PREFIX = 'bazaar_scrape'
+
+# metric name -> (StageMetrics field, help text)
+STAGE_GAUGES = {
+    'stage_wall_seconds': ('wall_seconds', "Wall-clock time of the stage"),
+    'stage_cpu_seconds': ('cpu_seconds', "CPU time (user + system, all threads) of the stage"),
+    'stage_peak_rss_bytes': ('peak_rss_bytes', "Peak resident set size of the process during the stage"),
+    'stage_bytes_fetched': ('bytes_fetched', "Bytes downloaded by the stage"),
+    'stage_rows_in': ('rows_in', "Rows the stage consumed"),
+    'stage_rows_out': ('rows_out', "Rows the stage produced or wrote"),
+    'stage_retries': ('retries', "HTTP requests the stage had to retry"),
+}
+
+
+@dataclass
+class StageMetrics:
+    stage: str
+    status: str = 'ok'
+    started_at: str = None
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    peak_rss_bytes: int = None
+    bytes_fetched: int = 0
+    rows_in: int = 0
+    rows_out: int = 0
+    retries: int = 0
+    http_statuses: dict = field(default_factory=dict)
+    errors: list = field(default_factory=list)
+
+
+def _proc_status(key):
+    try:
+        with open('/proc/self/status', 'r', encoding='ascii') as f:
+            for line in f:
+                if line.startswith(key + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS mark (Linux); returns False where unsupported"""
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='ascii') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss():
+    """Peak RSS in bytes since the last reset_peak_rss(), else since start"""
+    value = _proc_status('VmHWM')
+    if value is not None:
+        return value
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+class RunMetrics:
+    """Collects StageMetrics for one pipeline run"""
+
+    def __init__(self, profile=None, profile_dir=None):
+        if profile not in (None,) + PROFILE_MODES:
+            raise ValueError(f"profile must be one of {PROFILE_MODES}")
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self.run_id = datetime.now().strftime('%Y%m%d-%H%M%S')
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.stages = []
+        self.current = None
+
+    @contextmanager
+    def stage(self, name):
+        """Measure one stage; exceptions are recorded and re-raised"""
+        metrics = StageMetrics(stage=name, started_at=datetime.now().isoformat(timespec='seconds'))
+        self.stages.append(metrics)
+        self.current = metrics
+        profiler = self._start_profiling()
+        reset_peak_rss()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield metrics
+        except BaseException as e:
+            self.error(e)
+            raise
+        finally:
+            metrics.wall_seconds = time.perf_counter() - wall
+            metrics.cpu_seconds = time.process_time() - cpu
+            metrics.peak_rss_bytes = peak_rss()
+            self._stop_profiling(name, profiler)
+            self.current = None
+
+    def count(self, **values):
+        """Add to the current stage's counters; dicts (http_statuses) are merged"""
+        if self.current is None:
+            return
+        for key, value in values.items():
+            if isinstance(value, dict):
+                merged = Counter(getattr(self.current, key))
+                merged.update({str(code): n for code, n in value.items()})
+                setattr(self.current, key, dict(merged))
+            else:
+                setattr(self.current, key, getattr(self.current, key) + value)
+
+    def error(self, exc):
+        """Record a failure of the current stage (also ones the stage carries on after)"""
+        if self.current is None:
+            return
+        self.current.status = 'error'
+        self.current.errors.append({
+            'type': type(exc).__name__,
+            'message': str(exc),
+            'traceback': ''.join(traceback.format_exception(type(exc), exc, exc.__traceback__)),
+        })
+
+    def skip(self, name):
+        self.stages.append(StageMetrics(stage=name, status='skipped',
+                                        started_at=datetime.now().isoformat(timespec='seconds')))
+
+    @property
+    def ok(self):
+        return all(stage.status != 'error' for stage in self.stages)
+
+    def _start_profiling(self):
+        if not self.profile:
+            return None
+        profiler = None
+        if self.profile in ('cpu', 'all'):
+            import cProfile
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+        if self.profile in ('memory', 'all'):
+            import tracemalloc
+
+            tracemalloc.start()
+        return profiler
+
+    def _stop_profiling(self, name, profiler):
+        if not self.profile:
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base = os.path.join(self.profile_dir, f"{self.run_id}-{name}")
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(base + '.prof')
+        if self.profile in ('memory', 'all'):
+            import tracemalloc
+
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(base + '.tracemalloc.txt', 'w', encoding='utf-8') as f:
+                f.write(f"{name}: {current / 1024:.0f} KiB still allocated, peak {peak / 1024:.0f} KiB traced\n")
+                for stat in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+                    f.write(f"{stat}\n")
+
+    def records(self):
+        """JSON-ready dicts: one per stage, then one for the whole run"""
+        records = [{'run': self.run_id, **asdict(stage)} for stage in self.stages]
+        records.append({
+            'run': self.run_id,
+            'stage': '_run',
+            'status': 'ok' if self.ok else 'error',
+            'started_at': self.started_at,
+            'wall_seconds': sum(stage.wall_seconds for stage in self.stages),
+            'cpu_seconds': sum(stage.cpu_seconds for stage in self.stages),
+            'peak_rss_bytes': max((stage.peak_rss_bytes or 0 for stage in self.stages), default=0),
+        })
+        return records
+
+    def write_jsonl(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            for record in self.records():
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def textfile(self):
+        """The run in Prometheus text exposition format"""
+        lines = []
+        measured = [stage for stage in self.stages if stage.status != 'skipped']
+        for metric, (attribute, help_text) in STAGE_GAUGES.items():
+            lines += [f"# HELP {PREFIX}_{metric} {help_text}", f"# TYPE {PREFIX}_{metric} gauge"]
+            for stage in measured:
+                value = getattr(stage, attribute)
+                if value is not None:
+                    lines.append(f'{PREFIX}_{metric}{{stage="{stage.stage}"}} {value}')
+        lines += [f"# HELP {PREFIX}_stage_http_responses Responses per HTTP status in the stage",
+                  f"# TYPE {PREFIX}_stage_http_responses gauge"]
+        for stage in measured:
+            for code, count in sorted(stage.http_statuses.items()):
+                lines.append(f'{PREFIX}_stage_http_responses{{stage="{stage.stage}",code="{code}"}} {count}')
+        lines += [f"# HELP {PREFIX}_stage_success 1 if the stage ran without errors, 0 if it failed",
+                  f"# TYPE {PREFIX}_stage_success gauge"]
+        for stage in measured:
+            lines.append(f'{PREFIX}_stage_success{{stage="{stage.stage}"}} {int(stage.status == "ok")}')
+        lines += [f"# HELP {PREFIX}_last_run_timestamp_seconds When the last refresh finished",
+                  f"# TYPE {PREFIX}_last_run_timestamp_seconds gauge",
+                  f"{PREFIX}_last_run_timestamp_seconds {time.time():.0f}",
+                  f"# HELP {PREFIX}_last_run_success 1 if every stage of the last refresh succeeded",
+                  f"# TYPE {PREFIX}_last_run_success gauge",
+                  f"{PREFIX}_last_run_success {int(self.ok)}"]
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """Atomic write, so the collector never reads a partial file"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.textfile())
+        os.replace(tmp_path, path)
+
+    def write(self, metrics_dir):
+        self.write_jsonl(os.path.join(metrics_dir, JSONL_NAME))
+        self.write_textfile(os.path.join(metrics_dir, TEXTFILE_NAME))
+
+
+def load_runs(path):
+    """{run id: {stage: record}} from a metrics.jsonl, oldest run first"""
+    runs = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                runs.setdefault(record['run'], {})[record['stage']] = record
+    return runs
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show per-stage scrape metrics across recent runs")
+    parser.add_argument('jsonl', help="metrics.jsonl written by the scrape")
+    parser.add_argument('--runs', type=int, default=5, help="number of most recent runs to show")
+    parser.add_argument('--field', default='wall_seconds', help="metric to tabulate (e.g. cpu_seconds, rows_out)")
+    args = parser.parse_args(argv)
+
+    runs = list(load_runs(args.jsonl).items())[-args.runs:]
+    if not runs:
+        print("No runs recorded")
+        return 0
+    stages = list(dict.fromkeys(stage for _, records in runs for stage in records))
+    print(f"{args.field:<14}" + ''.join(f"{run_id:>17}" for run_id, _ in runs))
+    for stage in stages:
+        cells = []
+        for _, records in runs:
+            record = records.get(stage)
+            value = record.get(args.field) if record and record.get('status') != 'skipped' else None
+            mark = '!' if record and record.get('status') == 'error' else ' '
+            cells.append(f"{value:>16.3f}{mark}" if isinstance(value, float) else f"{str(value or '-'):>16}{mark}")
+        print(f"{stage:<14}" + ''.join(cells))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""
+Item image file names.
+
+safe_filename() is the single Python implementation of server.js
+getImageFilename(): the API serves /assets/items/<safe_filename(name)>, so every
+script that downloads or checks images must produce exactly the same name.
+
+The wiki names the file differently for many items ('+80_Potion...png' is
+saved as '_80_Potion...png', 'Bone_Boots_(fine).png' as 'Bone_Boots__fine_.png'),
+so downloads ask for wiki_filename(item['Image']) and save under safe_filename().
+"""
+
+import re
+from urllib.parse import unquote
+
+UNSAFE_CHARACTERS = re.compile(r'[^a-zA-Z0-9]')
+
+
+def safe_filename(name):
+    """Image file name for an item, identical to server.js getImageFilename()"""
+    if name.startswith('+'):
+        return '_' + UNSAFE_CHARACTERS.sub('_', name[1:]) + '.png'
+    return UNSAFE_CHARACTERS.sub('_', name) + '.png'
+
+
+def legacy_filenames(name):
+    """
+    File names older scripts saved an item's image under.
+
+    The server scrape stripped punctuation and the client scripts kept
+    '-' and '.', so existing images can be linked to the canonical name
+    instead of downloaded again.
+    """
+    stripped = re.sub(r'[^\w\s-]', '', name.strip())
+    stripped = re.sub(r'[-\s]+', '_', stripped)
+    stripped = re.sub(r'^\+', '_', stripped)
+    replaced = re.sub(r'[^\w\-\.]', '_', name)
+    canonical = safe_filename(name)
+    return [filename for filename in dict.fromkeys([stripped + '.png', replaced + '.png'])
+            if filename != canonical]
+
+
+def wiki_filename(image_path):
+    """Wiki file name (for Special:Redirect/file/) of an items.json Image path; None if there is no image"""
+    if not image_path:
+        return None
+    # From: "/assets/items/Fire_Beetle.png"
+    # To: "Fire_Beetle.png"
+    if image_path.startswith('/assets/items/'):
+        return image_path.replace('/assets/items/', '')
+    return unquote(image_path.split('/')[-1])
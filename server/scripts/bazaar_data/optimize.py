@@ -0,0 +1,245 @@
+"""
+Optimization stage for item images.
+
+Encodes every source PNG into compressed WebP (and AVIF when Pillow supports
+it) plus fixed-size WebP thumbnails across a process pool. Outputs live next
+to the sources in one sub-directory per variant (items/webp/Fire_Beetle.webp,
+items/thumb64/Fire_Beetle.webp). A variant that comes out no smaller than its
+source PNG is dropped, so clients get the original instead. Images whose
+source hash has not changed since the last run are skipped.
+
+Requires Pillow; without it the stage is skipped.
+
+    python3 -m bazaar_data.optimize /usr/share/nginx/html/assets/items
+"""
+
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+
+VARIANTS_PATH = os.environ.get('IMAGE_VARIANTS', '/app/data/image_variants.json')
+VARIANTS_VERSION = 2
+MAX_WORKERS = os.cpu_count() or 2
+
+# variant -> (Pillow format, file extension, max width/height or None, save options)
+VARIANTS = {
+    'webp': ('WEBP', '.webp', None, {'quality': 80, 'method': 4}),
+    'avif': ('AVIF', '.avif', None, {'quality': 60}),
+    'thumb32': ('WEBP', '.webp', 32, {'quality': 80, 'method': 6}),
+    'thumb64': ('WEBP', '.webp', 64, {'quality': 80, 'method': 6}),
+}
+
+# Web path the items directory is served under
+ASSETS_URL = '/assets/items'
+
+
+def available():
+    return Image is not None
+
+
+def default_variants():
+    """Variants this Pillow build can encode"""
+    if not available():
+        return []
+    names = ['webp', 'thumb32', 'thumb64']
+    if features.check('avif'):
+        names.insert(1, 'avif')
+    return names
+
+
+def variant_filename(filename, variant):
+    """Relative output path of `variant` for a source file name"""
+    extension = VARIANTS[variant][1]
+    return os.path.join(variant, os.path.splitext(filename)[0] + extension)
+
+
+def encode_image(path, variants):
+    """
+    Encode one source image into each variant (runs in a worker process).
+
+    Returns ({variant: bytes}, seconds spent).
+    """
+    start = time.perf_counter()
+    outputs = {}
+    with Image.open(path) as source:
+        source.load()
+        image = source.convert('RGBA') if source.mode not in ('RGB', 'RGBA') else source
+        for variant in variants:
+            image_format, _, size, options = VARIANTS[variant]
+            encoded = image
+            if size and max(image.size) > size:
+                encoded = image.copy()
+                encoded.thumbnail((size, size), Image.LANCZOS)
+            buffer = io.BytesIO()
+            encoded.save(buffer, image_format, **options)
+            outputs[variant] = buffer.getvalue()
+    return outputs, time.perf_counter() - start
+
+
+def load_variants(path=VARIANTS_PATH):
+    """Load the variant index, or an empty one if missing, unreadable or outdated"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (FileNotFoundError, ValueError):
+        index = {}
+    if index.get('version') != VARIANTS_VERSION:
+        index = {'version': VARIANTS_VERSION, 'images': {}}
+    return index
+
+
+def save_variants(index, path=VARIANTS_PATH):
+    """Write the variant index atomically"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def _write_outputs(filename, outputs, output_dirs, store):
+    recorded = {}
+    for variant, content in outputs.items():
+        relative = variant_filename(filename, variant)
+        if store is not None:
+            sha256 = store.put_bytes(content, VARIANTS[variant][1])
+            for directory in output_dirs:
+                store.materialize(sha256, os.path.join(directory, relative))
+        else:
+            from .sync import write_atomic
+            for directory in output_dirs:
+                write_atomic(os.path.join(directory, relative), content)
+        recorded[variant] = {'path': f"{ASSETS_URL}/{relative}", 'size': len(content)}
+    return recorded
+
+
+def _remove_outputs(filename, variants, output_dirs):
+    for variant in variants:
+        for directory in output_dirs:
+            try:
+                os.remove(os.path.join(directory, variant_filename(filename, variant)))
+            except FileNotFoundError:
+                pass
+
+
+def optimize_images(files, source_dir, index, output_dirs=None, variants=None,
+                    workers=MAX_WORKERS, store=None, force=False):
+    """
+    Bring the variants of every file in `files` up to date.
+
+    `files` is the image manifest mapping for `source_dir`; its hashes decide
+    which images need re-encoding. Outputs are written to each of
+    `output_dirs` (default: `source_dir`), linked through `store` if given.
+    `index` is updated in place. Returns a list of
+    (filename, source size, {variant: size}, seconds) for encoded images.
+    """
+    output_dirs = output_dirs or [source_dir]
+    variants = variants if variants is not None else default_variants()
+    images = index['images']
+
+    todo = []
+    for filename, entry in files.items():
+        known = images.get(filename)
+        if (not force and known and known['sha256'] == entry['sha256']
+                and set(variants) <= set(known['variants']) | set(known['dropped'])):
+            continue
+        todo.append(filename)
+
+    # Sources that disappeared take their variants with them
+    for filename in set(images) - set(files):
+        _remove_outputs(filename, images.pop(filename)['variants'], output_dirs)
+
+    encoded = []
+    if not todo or not variants:
+        return encoded
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(encode_image, os.path.join(source_dir, filename), variants): filename
+                   for filename in todo}
+        for future in as_completed(futures):
+            filename = futures[future]
+            try:
+                outputs, elapsed = future.result()
+            except Exception as e:
+                print(f"⚠️  Could not optimize {filename}: {e}")
+                continue
+            # A variant no smaller than the source only costs bytes
+            source_size = files[filename]['size']
+            dropped = sorted(variant for variant, content in outputs.items() if len(content) >= source_size)
+            _remove_outputs(filename, dropped, output_dirs)
+            kept = {variant: content for variant, content in outputs.items() if variant not in dropped}
+            images[filename] = {
+                'sha256': files[filename]['sha256'],
+                'size': source_size,
+                'variants': _write_outputs(filename, kept, output_dirs, store),
+                'dropped': dropped,
+            }
+            encoded.append((filename, source_size, {variant: len(content) for variant, content in kept.items()},
+                            elapsed))
+    return encoded
+
+
+def item_variants(index, filenames):
+    """Map item name -> {variant: {'path', 'size'}} for items whose image has variants"""
+    images = index['images']
+    return {name: images[filename]['variants'] for name, filename in filenames.items() if filename in images}
+
+
+def report_optimization(encoded, elapsed):
+    """Print bytes saved per variant and time per image"""
+    if not encoded:
+        print("✅ Image variants are up to date")
+        return
+    print(f"🖼️  Optimized {len(encoded)} images in {elapsed:.1f}s "
+          f"({elapsed / len(encoded) * 1000:.1f} ms/image wall, "
+          f"{sum(seconds for *_, seconds in encoded) / len(encoded) * 1000:.1f} ms/image CPU)")
+    for variant in sorted({variant for _, _, sizes, _ in encoded for variant in sizes}):
+        kept = [(size, sizes[variant]) for _, size, sizes, _ in encoded if variant in sizes]
+        total = sum(variant_size for _, variant_size in kept)
+        source_bytes = sum(size for size, _ in kept)
+        dropped = len(encoded) - len(kept)
+        dropped = f", dropped for {dropped} no smaller than the PNG" if dropped else ''
+        print(f"   {variant}: {total / 1024:.0f} KiB vs {source_bytes / 1024:.0f} KiB PNG "
+              f"({100 * (1 - total / source_bytes):.0f}% smaller{dropped})")
+
+
+def main(argv=None):
+    import argparse
+
+    from .manifest import MANIFEST_PATH, load_manifest, save_manifest, scan
+
+    parser = argparse.ArgumentParser(description="Generate WebP/AVIF variants and thumbnails for item images")
+    parser.add_argument('directory', help="directory of source PNGs")
+    parser.add_argument('--output', action='append', help="output directory (repeatable, default: directory)")
+    parser.add_argument('--variants', help=f"comma-separated subset of {','.join(VARIANTS)}")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--manifest', default=MANIFEST_PATH)
+    parser.add_argument('--index', default=VARIANTS_PATH)
+    parser.add_argument('--force', action='store_true', help="re-encode unchanged images")
+    args = parser.parse_args(argv)
+
+    if not available():
+        print("❌ Pillow is not installed (pip install Pillow)")
+        return 1
+
+    manifest = load_manifest(args.manifest)
+    index = load_variants(args.index)
+    variants = args.variants.split(',') if args.variants else None
+    start = time.perf_counter()
+    encoded = optimize_images(scan(manifest, args.directory), args.directory, index, args.output,
+                              variants, args.workers, force=args.force)
+    report_optimization(encoded, time.perf_counter() - start)
+    save_variants(index, args.index)
+    save_manifest(manifest, args.manifest)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,510 @@
+"""
+Order books for marketplace listings: best bid/ask, spreads and crossable matches.
+
+Every item with listings gets a book of two heaps with price-time priority:
+bids by highest unit price, asks by lowest, and the older listing first at
+equal prices. Prices are normalized to a unit price the way price history
+does (UNIT_PRICE_SQL), so a priceMode 'Total' stack of 10 for 500 sits next
+to a 50 'Each' listing.
+
+Listings that cross (a bid at or above an ask) are paired in priority order,
+skipping pairs from the same user, and each pair trades at the older
+listing's price. Matches are only reported, never executed: the listings stay
+up until their owners trade in game and take them down.
+
+The books are written to two tables in marketplace.db that server.js reads:
+order_book_spreads (one row per item) and order_book_matches (the first
+MATCH_LIMIT pairs per item). Triggers on listings log every insert, update and
+delete to listing_changes, including the ones the Node server makes, so the
+watcher only re-reads the listings that changed and only rewrites the books
+they belong to. A book update is a few heap operations, not a rescan. The log
+keeps at most MAX_PENDING_CHANGES entries when no watcher drains it; a log
+that long is applied as a rebuild anyway, so the trimmed entries are not lost.
+
+    python3 -m bazaar_data.orderbook rebuild --db /app/data/marketplace.db
+    python3 -m bazaar_data.orderbook watch --db /app/data/marketplace.db --interval 1
+    python3 -m bazaar_data.orderbook show "Cake"
+"""
+
+import heapq
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from .history import unit_price
+
+MARKETPLACE_DB_PATH = '/app/data/marketplace.db'
+LOCK_NAME = 'orderbook.lock'
+POLL_SECONDS = 1.0
+# Crossable pairs kept per item
+MATCH_LIMIT = 20
+# Listings looked at per side while pairing, so one user's many self-crossing listings cannot stall it
+MATCH_SCAN = MATCH_LIMIT * 8
+# A heap is rebuilt once it holds more stale entries than COMPACT_MIN plus its live ones
+COMPACT_MIN = 64
+# More pending changes than this (a bulk import) are cheaper to apply as a rebuild
+REBUILD_CHANGES = 100_000
+# listing_changes is trimmed to this many entries, one more than sync() applies one at a time
+MAX_PENDING_CHANGES = REBUILD_CHANGES + 1
+# Listing ids per SELECT ... WHERE id IN (...)
+FETCH_BATCH = 500
+
+LISTING_COLUMNS = ('id', 'item', 'type', 'price', 'quantity', 'priceMode', 'timestamp', 'userId')
+# Columns whose change can move a listing in its book
+BOOK_COLUMNS = ('item', 'type', 'price', 'quantity', 'priceMode', 'timestamp', 'userId')
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS order_book_spreads (
+        item TEXT PRIMARY KEY,
+        best_bid INTEGER,
+        best_ask INTEGER,
+        spread INTEGER,
+        bid_volume INTEGER NOT NULL,
+        ask_volume INTEGER NOT NULL,
+        bids INTEGER NOT NULL,
+        asks INTEGER NOT NULL,
+        crossed_quantity INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS order_book_matches (
+        item TEXT NOT NULL,
+        rank INTEGER NOT NULL,
+        bid_id INTEGER NOT NULL,
+        ask_id INTEGER NOT NULL,
+        bid_price INTEGER NOT NULL,
+        ask_price INTEGER NOT NULL,
+        price INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL,
+        PRIMARY KEY (item, rank)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS listing_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        listing_id INTEGER NOT NULL
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS listing_changes_insert AFTER INSERT ON listings BEGIN
+        INSERT INTO listing_changes (listing_id) VALUES (new.id);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS listing_changes_update AFTER UPDATE OF {", ".join(BOOK_COLUMNS)} ON listings
+    BEGIN
+        INSERT INTO listing_changes (listing_id) VALUES (new.id);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS listing_changes_delete AFTER DELETE ON listings BEGIN
+        INSERT INTO listing_changes (listing_id) VALUES (old.id);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS listing_changes_cap AFTER INSERT ON listing_changes BEGIN
+        DELETE FROM listing_changes WHERE seq <= new.seq - {MAX_PENDING_CHANGES};
+    END''',
+]
+
+
+class Order:
+    """One listing in a book; a listing that moves (price, side, item, time) becomes a new Order"""
+
+    __slots__ = ('id', 'item', 'side', 'price', 'quantity', 'timestamp', 'user')
+
+    def __init__(self, listing_id, item, side, price, quantity, timestamp, user):
+        self.id = listing_id
+        self.item = item
+        self.side = side
+        self.price = price
+        self.quantity = quantity
+        self.timestamp = timestamp
+        self.user = user
+
+    def __lt__(self, other):
+        # Reached only for a stale entry with the same key as a live one, whose order does not matter
+        return False
+
+
+def order_from_row(row):
+    """Order for a LISTING_COLUMNS row, or None for listings that cannot trade"""
+    listing_id, item, kind, price, quantity, price_mode, timestamp, user = row
+    side = kind.lower() if isinstance(kind, str) else None
+    if not item or side not in ('buy', 'sell') or price is None or quantity is None:
+        return None
+    try:
+        price, quantity = int(price), int(quantity)
+    except (TypeError, ValueError):
+        return None
+    if price <= 0 or quantity <= 0:
+        return None
+    return Order(listing_id, item, side, unit_price(price, quantity, price_mode), quantity,
+                 int(timestamp or 0), str(user) if user is not None else None)
+
+
+def _entry(order):
+    # Heaps are min-heaps: bids are keyed on the negated price; the id breaks timestamp ties
+    if order.side == 'buy':
+        return (-order.price, order.timestamp, order.id, order)
+    return (order.price, order.timestamp, order.id, order)
+
+
+class Book:
+    """Bids and asks of one item, with lazily deleted heap entries"""
+
+    __slots__ = ('item', 'bids', 'asks', 'stale', 'bid_count', 'ask_count', 'bid_volume', 'ask_volume')
+
+    def __init__(self, item):
+        self.item = item
+        self.bids = []
+        self.asks = []
+        self.stale = {'buy': 0, 'sell': 0}
+        self.bid_count = self.ask_count = 0
+        self.bid_volume = self.ask_volume = 0
+
+    def __len__(self):
+        return self.bid_count + self.ask_count
+
+    def heap(self, side):
+        return self.bids if side == 'buy' else self.asks
+
+    def count(self, order, sign):
+        if order.side == 'buy':
+            self.bid_count += sign
+            self.bid_volume += sign * order.quantity
+        else:
+            self.ask_count += sign
+            self.ask_volume += sign * order.quantity
+
+
+class OrderBooks:
+    """
+    Books of every item, kept current one listing at a time.
+
+    upsert() and remove() are O(log n) in the size of the item's book; the
+    entries they replace stay in the heap until they surface or the heap is
+    compacted. summary() and matches() only look at the top of the book.
+    """
+
+    def __init__(self, match_limit=MATCH_LIMIT):
+        self.match_limit = match_limit
+        self.books = {}
+        self.orders = {}
+
+    def __len__(self):
+        return len(self.orders)
+
+    def load(self, rows):
+        """Fill empty books from LISTING_COLUMNS rows in one pass (heapify instead of pushes)"""
+        for row in rows:
+            order = order_from_row(row)
+            if order is None:
+                continue
+            self.orders[order.id] = order
+            book = self.books.get(order.item)
+            if book is None:
+                book = self.books[order.item] = Book(order.item)
+            book.heap(order.side).append(_entry(order))
+            book.count(order, 1)
+        for book in self.books.values():
+            heapq.heapify(book.bids)
+            heapq.heapify(book.asks)
+        return len(self.orders)
+
+    def _valid(self, entry):
+        return self.orders.get(entry[2]) is entry[3]
+
+    def remove(self, listing_id):
+        """Take a listing out of its book; returns its item, or None if it was not in one"""
+        order = self.orders.pop(listing_id, None)
+        if order is None:
+            return None
+        book = self.books[order.item]
+        book.count(order, -1)
+        if not book:
+            del self.books[order.item]
+            return order.item
+        book.stale[order.side] += 1
+        self._compact(book, order.side)
+        return order.item
+
+    def upsert(self, row):
+        """Add or update a listing from a LISTING_COLUMNS row; returns the items whose book changed"""
+        order = order_from_row(row)
+        current = self.orders.get(row[0])
+        if order is None:
+            return {self.remove(row[0])} if current is not None else set()
+        if current is not None and (current.item, current.side, current.price, current.timestamp) == \
+                (order.item, order.side, order.price, order.timestamp):
+            # Same place in the book: only the quantity (or owner) changed
+            book = self.books[current.item]
+            book.count(current, -1)
+            current.quantity, current.user = order.quantity, order.user
+            book.count(current, 1)
+            return {current.item}
+        changed = {self.remove(row[0])} if current is not None else set()
+        self.orders[order.id] = order
+        book = self.books.get(order.item)
+        if book is None:
+            book = self.books[order.item] = Book(order.item)
+        heapq.heappush(book.heap(order.side), _entry(order))
+        book.count(order, 1)
+        changed.add(order.item)
+        return changed
+
+    def _compact(self, book, side):
+        heap = book.heap(side)
+        live = book.bid_count if side == 'buy' else book.ask_count
+        if book.stale[side] > COMPACT_MIN + live:
+            heap[:] = [entry for entry in heap if self._valid(entry)]
+            heapq.heapify(heap)
+            book.stale[side] = 0
+
+    def _top(self, book, side):
+        """Best live order of one side, dropping stale entries that surface"""
+        heap = book.heap(side)
+        while heap and not self._valid(heap[0]):
+            heapq.heappop(heap)
+            book.stale[side] -= 1
+        return heap[0][3] if heap else None
+
+    def _take(self, book, side, taken):
+        """Pop the best live order of one side into `taken` (put back by the caller)"""
+        heap = book.heap(side)
+        while heap:
+            entry = heapq.heappop(heap)
+            if self._valid(entry):
+                taken.append(entry)
+                return entry[3]
+            book.stale[side] -= 1
+        return None
+
+    def matches(self, item):
+        """
+        Up to match_limit (bid, ask, price, quantity) pairs in price-time
+        priority: the best bid is filled from the best asks at or below its
+        price, then the next bid from what is left, and so on.
+        """
+        book = self.books.get(item)
+        if book is None:
+            return []
+        best_bid, best_ask = self._top(book, 'buy'), self._top(book, 'sell')
+        if best_bid is None or best_ask is None or best_bid.price < best_ask.price:
+            return []
+        pairs = []
+        taken_bids, taken_asks = [], []
+        # [ask, quantity left] for the asks pulled so far, in priority order
+        asks = []
+        try:
+            while len(pairs) < self.match_limit and len(taken_bids) < MATCH_SCAN:
+                bid = self._take(book, 'buy', taken_bids)
+                if bid is None:
+                    break
+                remaining = bid.quantity
+                position = 0
+                # Whether any ask at or below this bid still has quantity left
+                crossing = False
+                while remaining and len(pairs) < self.match_limit:
+                    if position == len(asks):
+                        ask = self._take(book, 'sell', taken_asks) if len(taken_asks) < MATCH_SCAN else None
+                        if ask is None:
+                            break
+                        asks.append([ask, ask.quantity])
+                    ask, left = asks[position]
+                    if ask.price > bid.price:
+                        break
+                    position += 1
+                    if not left:
+                        continue
+                    crossing = True
+                    if bid.user is not None and bid.user == ask.user:
+                        continue
+                    quantity = min(remaining, left)
+                    asks[position - 1][1] -= quantity
+                    remaining -= quantity
+                    # The older listing was there first and sets the price
+                    maker = bid if (bid.timestamp, bid.id) < (ask.timestamp, ask.id) else ask
+                    pairs.append((bid, ask, maker.price, quantity))
+                if not crossing:
+                    # Later bids are no higher, so nothing crosses them either
+                    break
+        finally:
+            for entry in taken_bids:
+                heapq.heappush(book.bids, entry)
+            for entry in taken_asks:
+                heapq.heappush(book.asks, entry)
+        return pairs
+
+    def summary(self, item):
+        """(best bid, best ask, spread, bid volume, ask volume, bids, asks) of one item"""
+        book = self.books.get(item)
+        if book is None:
+            return None
+        best_bid, best_ask = self._top(book, 'buy'), self._top(book, 'sell')
+        bid = best_bid.price if best_bid else None
+        ask = best_ask.price if best_ask else None
+        spread = ask - bid if bid is not None and ask is not None else None
+        return (bid, ask, spread, book.bid_volume, book.ask_volume, book.bid_count, book.ask_count)
+
+
+def ensure_schema(conn):
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+
+def read_listings(conn, ids=None):
+    """LISTING_COLUMNS rows of every listing, or of the given ids"""
+    columns = ', '.join(f'"{column}"' for column in LISTING_COLUMNS)
+    if ids is None:
+        yield from conn.execute(f'SELECT {columns} FROM listings')
+        return
+    ids = list(ids)
+    for start in range(0, len(ids), FETCH_BATCH):
+        batch = ids[start:start + FETCH_BATCH]
+        yield from conn.execute(f'SELECT {columns} FROM listings WHERE id IN ({", ".join("?" * len(batch))})',
+                                batch)
+
+
+def write_books(conn, books, items, now=None):
+    """Replace the spread and match rows of `items`; items without a book lose theirs"""
+    now = now if now is not None else int(time.time() * 1000)
+    spreads, matches, emptied = [], [], []
+    for item in items:
+        summary = books.summary(item)
+        if summary is None:
+            emptied.append((item,))
+            continue
+        pairs = books.matches(item)
+        spreads.append((item,) + summary + (sum(quantity for *_, quantity in pairs), now))
+        matches += [(item, rank, bid.id, ask.id, bid.price, ask.price, price, quantity, now)
+                    for rank, (bid, ask, price, quantity) in enumerate(pairs, 1)]
+    conn.executemany('DELETE FROM order_book_matches WHERE item = ?', [(item,) for item in items])
+    conn.executemany('DELETE FROM order_book_spreads WHERE item = ?', emptied)
+    conn.executemany('INSERT OR REPLACE INTO order_book_spreads VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', spreads)
+    conn.executemany('INSERT INTO order_book_matches VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', matches)
+    return len(spreads), len(matches)
+
+
+def last_change(conn):
+    return conn.execute('SELECT COALESCE(MAX(seq), 0) FROM listing_changes').fetchone()[0]
+
+
+def rebuild(conn, match_limit=MATCH_LIMIT):
+    """Load every book from listings and rewrite both tables; returns the OrderBooks"""
+    with conn:
+        ensure_schema(conn)
+    # Changes logged while listings are read are applied again by the next sync; upserts are idempotent
+    seen = last_change(conn)
+    books = OrderBooks(match_limit)
+    books.load(read_listings(conn))
+    with conn:
+        conn.execute('DELETE FROM order_book_matches')
+        conn.execute('DELETE FROM order_book_spreads')
+        write_books(conn, books, list(books.books))
+        conn.execute('DELETE FROM listing_changes WHERE seq <= ?', (seen,))
+    return books
+
+
+def sync(conn, books):
+    """
+    Apply the logged listing changes to `books` and rewrite the books they
+    touched; returns (changes applied, items rewritten). A backlog over
+    REBUILD_CHANGES is applied as a rebuild instead, reported as (-1, items).
+    """
+    changes = conn.execute('SELECT seq, listing_id FROM listing_changes ORDER BY seq LIMIT ?',
+                           (REBUILD_CHANGES + 1,)).fetchall()
+    if not changes:
+        return 0, 0
+    if len(changes) > REBUILD_CHANGES:
+        fresh = rebuild(conn, books.match_limit)
+        books.books, books.orders = fresh.books, fresh.orders
+        return -1, len(books.books)
+    seen = changes[-1][0]
+    ids = {listing_id for _, listing_id in changes}
+    items = set()
+    found = set()
+    for row in read_listings(conn, ids):
+        found.add(row[0])
+        items |= books.upsert(row)
+    for listing_id in ids - found:
+        item = books.remove(listing_id)
+        if item is not None:
+            items.add(item)
+    with conn:
+        write_books(conn, books, sorted(items))
+        conn.execute('DELETE FROM listing_changes WHERE seq <= ?', (seen,))
+    return len(changes), len(items)
+
+
+def watch(db_path=MARKETPLACE_DB_PATH, interval=POLL_SECONDS, match_limit=MATCH_LIMIT):
+    """Rebuild once, then apply listing changes every `interval` seconds until interrupted"""
+    from .job import exclusive_lock
+
+    with exclusive_lock(os.path.join(os.path.dirname(os.path.abspath(db_path)), LOCK_NAME)):
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            start = time.perf_counter()
+            books = rebuild(conn, match_limit)
+            print(f"[{datetime.now()}] ✅ Loaded {len(books)} listings into {len(books.books)} order books "
+                  f"in {time.perf_counter() - start:.2f}s; watching for changes every {interval:g}s")
+            while True:
+                time.sleep(interval)
+                start = time.perf_counter()
+                changes, items = sync(conn, books)
+                if changes:
+                    what = "rebuilt after a bulk change" if changes < 0 else f"{changes} listing changes"
+                    print(f"[{datetime.now()}] 📈 {what}: {items} books rewritten in "
+                          f"{(time.perf_counter() - start) * 1000:.1f} ms")
+        finally:
+            conn.close()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Marketplace order books, spreads and crossable matches")
+    parser.add_argument('--db', default=MARKETPLACE_DB_PATH)
+    parser.add_argument('--match-limit', type=int, default=MATCH_LIMIT, help="crossable pairs kept per item")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('rebuild', help="rebuild every book and rewrite the spread and match tables")
+    watch_parser = commands.add_parser('watch', help="rebuild, then keep the books current as listings change")
+    watch_parser.add_argument('--interval', type=float, default=POLL_SECONDS, help="seconds between polls")
+    show_parser = commands.add_parser('show', help="print an item's spread and matches from the tables")
+    show_parser.add_argument('item')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"[{datetime.now()}] ℹ️  {args.db} not found")
+        return 0
+    if args.command == 'watch':
+        from .job import JobLocked
+
+        try:
+            watch(args.db, args.interval, args.match_limit)
+        except JobLocked as e:
+            print(f"[{datetime.now()}] ⏭️  Skipping: {e}")
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    try:
+        if args.command == 'rebuild':
+            start = time.perf_counter()
+            books = rebuild(conn, args.match_limit)
+            crossed = conn.execute('SELECT COUNT(*) FROM order_book_spreads WHERE spread <= 0').fetchone()[0]
+            print(f"[{datetime.now()}] ✅ {len(books)} listings in {len(books.books)} order books, "
+                  f"{crossed} crossed, in {time.perf_counter() - start:.2f}s")
+        else:
+            spread = conn.execute('SELECT * FROM order_book_spreads WHERE item = ?', (args.item,)).fetchone()
+            if spread is None:
+                print(f"No order book for {args.item!r}")
+                return 1
+            _, bid, ask, gap, bid_volume, ask_volume, bids, asks, crossed, _ = spread
+            print(f"{args.item}: bid {bid} ({bids} listings, {bid_volume} units) / ask {ask} ({asks} listings, "
+                  f"{ask_volume} units), spread {gap}, {crossed} units crossable")
+            for rank, bid_id, ask_id, bid_price, ask_price, price, quantity in conn.execute(
+                    'SELECT rank, bid_id, ask_id, bid_price, ask_price, price, quantity FROM order_book_matches '
+                    'WHERE item = ? ORDER BY rank', (args.item,)):
+                print(f"   {rank:>3}. buy #{bid_id} @ {bid_price} x sell #{ask_id} @ {ask_price}: "
+                      f"{quantity} at {price}")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
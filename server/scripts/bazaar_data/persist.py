@@ -0,0 +1,261 @@
+"""
+Persistence stage for items.db.
+
+The database is rebuilt into a fresh file next to the live one and swapped in
+with an atomic rename, so the Node server never sees a missing or half-filled
+items table while the catalogue refreshes.
+
+Items are stored typed and normalized: catalogue_items has integer levels
+(NULL when missing), episode/profession/variant-of ids into lookup tables and
+tradeable as 1/0/NULL. The items view puts the old all-TEXT columns ("345",
+"None", "1"/"unknown") back on top, so existing queries keep working.
+"""
+
+import os
+import re
+import sqlite3
+
+from .search import ensure_items_search
+
+ITEM_FIELDS = ['Items', 'Image', 'Episode', 'Variant of', 'Profession A', 'Profession Level A',
+               'Profession B', 'Profession Level B', 'Tradeable']
+
+# Placeholder the cleaning stage fills missing values with
+MISSING = 'None'
+
+# lookup table -> the item fields whose values it holds
+LOOKUP_TABLES = {
+    'episodes': ('Episode',),
+    'professions': ('Profession A', 'Profession B'),
+    'variant_bases': ('Variant of',),
+}
+
+# The original items table, column for column
+ITEMS_VIEW = '''CREATE VIEW items AS
+SELECT i.id AS id,
+    i.name AS Items,
+    i.image AS Image,
+    COALESCE(e.name, 'None') AS Episode,
+    COALESCE(v.name, 'None') AS [Variant of],
+    COALESCE(pa.name, 'None') AS [Profession A],
+    CASE WHEN i.profession_a_level IS NULL THEN 'None' ELSE CAST(i.profession_a_level AS TEXT) END
+        AS [Profession Level A],
+    COALESCE(pb.name, 'None') AS [Profession B],
+    CASE WHEN i.profession_b_level IS NULL THEN 'None' ELSE CAST(i.profession_b_level AS TEXT) END
+        AS [Profession Level B],
+    CASE i.tradeable WHEN 1 THEN '1' WHEN 0 THEN '0' ELSE 'unknown' END AS Tradeable
+FROM catalogue_items i
+LEFT JOIN episodes e ON e.id = i.episode_id
+LEFT JOIN variant_bases v ON v.id = i.variant_of_id
+LEFT JOIN professions pa ON pa.id = i.profession_a_id
+LEFT JOIN professions pb ON pb.id = i.profession_b_id'''
+
+CREATE_ITEMS_SCHEMA = [
+    'CREATE TABLE episodes (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)',
+    'CREATE TABLE professions (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)',
+    # Base items variants point at (most bases are not catalogue items themselves)
+    'CREATE TABLE variant_bases (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)',
+    '''CREATE TABLE catalogue_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        image TEXT,
+        episode_id INTEGER REFERENCES episodes (id),
+        variant_of_id INTEGER REFERENCES variant_bases (id),
+        profession_a_id INTEGER REFERENCES professions (id),
+        profession_a_level INTEGER,
+        profession_b_id INTEGER REFERENCES professions (id),
+        profession_b_level INTEGER,
+        tradeable INTEGER
+    )''',
+    ITEMS_VIEW,
+]
+
+# Name lookups, plus covering indexes for "episode X" and "profession X between
+# levels A and B" filters
+ITEMS_INDEXES = {
+    'idx_items_name': 'name',
+    'idx_items_episode': 'episode_id, name',
+    'idx_items_variant_of': 'variant_of_id, name',
+    'idx_items_profession_a': 'profession_a_id, profession_a_level, name',
+    'idx_items_profession_b': 'profession_b_id, profession_b_level, name',
+}
+
+ROW_FIELDS = ['name', 'image', 'episode_id', 'variant_of_id', 'profession_a_id', 'profession_a_level',
+              'profession_b_id', 'profession_b_level', 'tradeable']
+INSERT_ITEM = (f"INSERT INTO catalogue_items ({', '.join(ROW_FIELDS)}) "
+               f"VALUES ({', '.join('?' * len(ROW_FIELDS))})")
+UPDATE_ITEM = f"UPDATE catalogue_items SET {', '.join(f'{field} = ?' for field in ROW_FIELDS)} WHERE name = ?"
+
+# Optimized image variants (WebP/AVIF/thumbnails) per item, written by the image stage
+CREATE_VARIANTS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS item_image_variants (
+        Items TEXT NOT NULL,
+        variant TEXT NOT NULL,
+        path TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        PRIMARY KEY (Items, variant)
+    ) WITHOUT ROWID
+'''
+
+
+def parse_level(value):
+    """Integer level from '345', 345.0 or '1,000'; None for missing or unparseable values"""
+    if value is None or value == MISSING or value == '':
+        return None
+    try:
+        return int(float(re.sub(r'[,\s]', '', str(value))))
+    except ValueError:
+        return None
+
+
+def parse_tradeable(value):
+    if value is True or str(value).lower() in ('true', '1'):
+        return 1
+    if value is False or str(value).lower() in ('false', '0'):
+        return 0
+    return None
+
+
+def lookup_ids(conn, items):
+    """Add any new episode/profession/variant base names; returns {table: {name: id}}"""
+    ids = {}
+    for table, fields in LOOKUP_TABLES.items():
+        names = {item.get(field) for item in items for field in fields} - {None, MISSING}
+        conn.executemany(f'INSERT OR IGNORE INTO {table} (name) VALUES (?)', ((name,) for name in sorted(names)))
+        ids[table] = dict(conn.execute(f'SELECT name, id FROM {table}'))
+    return ids
+
+
+def item_row(item, ids):
+    """catalogue_items parameter tuple for one item record"""
+    return (
+        item.get('Items'),
+        item.get('Image'),
+        ids['episodes'].get(item.get('Episode')),
+        ids['variant_bases'].get(item.get('Variant of')),
+        ids['professions'].get(item.get('Profession A')),
+        parse_level(item.get('Profession Level A')),
+        ids['professions'].get(item.get('Profession B')),
+        parse_level(item.get('Profession Level B')),
+        parse_tradeable(item.get('Tradeable')),
+    )
+
+
+def item_rows(items, ids):
+    """Yield catalogue_items parameter tuples for item records"""
+    for item in items:
+        yield item_row(item, ids)
+
+
+def is_normalized(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'catalogue_items'").fetchone() \
+        is not None
+
+
+def _fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def rebuild_items_db(items, db_path):
+    """
+    Write `items` to a new database file and atomically replace `db_path`.
+
+    The load runs in a single transaction with journaling and fsyncs disabled,
+    since a crash only loses the temporary file. Returns the number of rows.
+    """
+    tmp_path = f"{db_path}.tmp"
+    for stale in (tmp_path, tmp_path + '-journal'):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('BEGIN')
+        for statement in CREATE_ITEMS_SCHEMA:
+            conn.execute(statement)
+        conn.executemany(INSERT_ITEM, item_rows(items, lookup_ids(conn, items)))
+        for name, columns in ITEMS_INDEXES.items():
+            conn.execute(f'CREATE INDEX {name} ON catalogue_items ({columns})')
+        ensure_items_search(conn)
+        conn.execute('COMMIT')
+        count = conn.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+    except Exception:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+
+    # Make the new file durable before it becomes visible under the live name
+    _fsync_path(tmp_path)
+    os.replace(tmp_path, db_path)
+    _fsync_path(os.path.dirname(os.path.abspath(db_path)))
+    return count
+
+
+def apply_item_diff(db_path, diff, items):
+    """
+    Apply a diff_catalogues() result to an existing items.db in one transaction.
+
+    Only removed, updated, renamed and added rows are touched; lookups go
+    through the name index. Falls back to a full rebuild if there is no
+    database yet or it still has the old all-TEXT items table. Returns the
+    number of rows written or deleted.
+    """
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            normalized = is_normalized(conn)
+        finally:
+            conn.close()
+    if not os.path.exists(db_path) or not normalized:
+        rebuild_items_db(items, db_path)
+        return len(items)
+
+    by_name = {item['Items']: item for item in items}
+    changed = [by_name[name] for name in diff['updated'] + diff['added']] + \
+        [by_name[pair['to']] for pair in diff['renamed']]
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            # Triggers keep items_fts in step with the changes below
+            ensure_items_search(conn)
+            ids = lookup_ids(conn, changed)
+            changes = {
+                'DELETE FROM catalogue_items WHERE name = ?': [(name,) for name in diff['removed']],
+                UPDATE_ITEM: ([item_row(by_name[name], ids) + (name,) for name in diff['updated']]
+                              + [item_row(by_name[pair['to']], ids) + (pair['from'],) for pair in diff['renamed']]),
+                INSERT_ITEM: list(item_rows((by_name[name] for name in diff['added']), ids)),
+            }
+            for statement, rows in changes.items():
+                if rows:
+                    conn.executemany(statement, rows)
+    finally:
+        conn.close()
+    return sum(len(rows) for rows in changes.values())
+
+
+def write_image_variants(db_path, variants):
+    """
+    Replace the item_image_variants table in one transaction.
+
+    `variants` maps item name -> {variant: {'path', 'size'}}. Returns the
+    number of rows written.
+    """
+    rows = [(name, variant, meta['path'], meta['size'])
+            for name, item_variants in variants.items()
+            for variant, meta in item_variants.items()]
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute(CREATE_VARIANTS_TABLE)
+            conn.execute('DELETE FROM item_image_variants')
+            conn.executemany('INSERT INTO item_image_variants (Items, variant, path, size) VALUES (?, ?, ?, ?)', rows)
+    finally:
+        conn.close()
+    return len(rows)
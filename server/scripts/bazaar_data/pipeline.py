@@ -0,0 +1,505 @@
+"""
+The catalogue refresh as explicit stages.
+
+fetch -> clean -> diff -> persist -> marketplace -> stats -> search -> images
+-> optimize. Each stage is a function of a Pipeline context, so stages can be
+timed, profiled or reused on their own. run() measures every stage with
+metrics.RunMetrics; stages report their own counters through
+Pipeline.count(). pandas, requests and Pillow are only imported by the
+stages that need them; a lean pipeline (the default when pandas is not
+installed) cleans pages with the stdlib csv module and never imports pandas.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+
+DATA_DIR = os.environ.get('BAZAAR_DATA_DIR', '/app/data')
+IMAGES_DIR = os.environ.get('BAZAAR_IMAGES_DIR', '/usr/share/nginx/html/assets/items')
+
+
+class PipelineError(Exception):
+    """A stage failed in a way that must stop the refresh"""
+
+
+@dataclass
+class Pipeline:
+    data_dir: str = DATA_DIR
+    images_dir: str = IMAGES_DIR
+    base_url: str = None
+    incremental: bool = False
+    download_images: bool = True
+    # Image downloads per second across all workers (None: sync.REQUESTS_PER_SECOND)
+    image_rate: float = None
+    # Where metrics.jsonl and the Prometheus textfile go (default: <data_dir>/metrics)
+    metrics_dir: str = None
+    # None, 'cpu', 'memory' or 'all': per-stage cProfile/tracemalloc dumps
+    profile: str = None
+    # Clean and aggregate without pandas (None: only when pandas is not installed)
+    lean: bool = None
+    # job.Checkpoint of a scheduled run: completed stages are restored, not rerun
+    checkpoint: object = None
+
+    # Filled in as the stages run
+    state: dict = None
+    pages: list = field(default_factory=list)
+    pages_changed: bool = True
+    items: list = field(default_factory=list)
+    diff: dict = None
+    manifest: dict = None
+    store: object = None
+    metrics: object = None
+
+    def path(self, name):
+        return os.path.join(self.data_dir, name)
+
+    def count(self, **values):
+        """Add to the running stage's metrics (no-op when a stage runs on its own)"""
+        if self.metrics is not None:
+            self.metrics.count(**values)
+
+    def record_error(self, exc):
+        """Record an error a stage reports and carries on after"""
+        if self.metrics is not None:
+            self.metrics.error(exc)
+
+    @property
+    def items_json(self):
+        return self.path('items.json')
+
+    @property
+    def items_db(self):
+        return self.path('items.db')
+
+    @property
+    def catalogue_changed(self):
+        from .diff import is_empty
+        return not self.incremental or not is_empty(self.diff)
+
+
+def pandas_available():
+    import importlib.util
+
+    return importlib.util.find_spec('pandas') is not None
+
+
+def log(message):
+    print(f"[{datetime.now()}] {message}")
+
+
+def _to_json(value, indent=''):
+    """One value formatted the way pandas' to_json(indent=2) formats it"""
+    if isinstance(value, dict):
+        inner = indent + '  '
+        fields = ',\n'.join(f'{inner}{_to_json(str(key))}:{_to_json(field, inner)}' for key, field in value.items())
+        return f"{{\n{fields}\n{indent}}}"
+    if isinstance(value, float) and value != value:
+        return 'null'
+    # to_json escapes '/' and leaves DEL unescaped
+    return json.dumps(value).replace('/', '\\/').replace('\\u007f', '\x7f')
+
+
+def items_json_text(items):
+    """items.json byte for byte as DataFrame(items).to_json(orient='records', indent=2) writes it"""
+    # Records missing a column get null for it, as in a DataFrame
+    columns = list(dict.fromkeys(key for item in items for key in item))
+    rows = ',\n'.join(f"  {_to_json({column: item.get(column) for column in columns}, '  ')}" for item in items)
+    return f"[\n{rows}\n]"
+
+
+def write_items_json(items, path):
+    """Write items.json in the format the scrape has always produced"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as json_file:
+        json_file.write(items_json_text(items))
+    os.replace(tmp_path, path)
+
+
+def write_catalogue_artifact(pipeline):
+    """Write the compact catalogue the server reads instead of items.json"""
+    from .catalogue import CATALOGUE_NAME, write_catalogue
+
+    try:
+        version = write_catalogue(pipeline.items, pipeline.path(CATALOGUE_NAME))
+        print(f"✅ Catalogue artifact written (version {version})")
+    except Exception as e:
+        pipeline.record_error(e)
+        print(f"⚠️  Error writing catalogue artifact: {e}")
+
+
+def fetch_stage(pipeline):
+    """Download the catalogue pages concurrently (conditionally on incremental runs)"""
+    from .fetch import WIKI_BASE_URL, FetchError, fetch_pages, report_timings
+    from .state import cached_pages, empty_state, load_state
+
+    cache_dir = pipeline.path('scrape_cache')
+    pipeline.state = load_state(pipeline.path('scrape_state.json')) if pipeline.incremental else empty_state()
+    start = time.perf_counter()
+    try:
+        pipeline.pages = fetch_pages(pipeline.base_url or WIKI_BASE_URL,
+                                     cache=cached_pages(pipeline.state, cache_dir) if pipeline.incremental else None)
+    except FetchError as e:
+        raise PipelineError(f"Error fetching item catalogue: {e}")
+    report_timings(pipeline.pages, time.perf_counter() - start)
+    pipeline.count(rows_out=sum(page.rows for page in pipeline.pages),
+                   bytes_fetched=sum(len(page.content) for page in pipeline.pages if not page.not_modified),
+                   retries=sum(page.attempts - 1 for page in pipeline.pages),
+                   http_statuses=Counter(status for page in pipeline.pages for status in page.statuses))
+
+
+def record_stage(pipeline):
+    """Remember page validators and bodies for the next incremental run"""
+    from .state import record_pages
+
+    pipeline.pages_changed = record_pages(pipeline.state, pipeline.pages, pipeline.path('scrape_cache'))
+
+
+def clean_stage(pipeline):
+    """Parse every page straight from memory and clean the combined catalogue"""
+    if pipeline.lean:
+        return lean_clean_stage(pipeline)
+
+    import io
+
+    import pandas as pd
+
+    from .clean import clean_items
+
+    print("Parsing catalogue pages...")
+    frames = [pd.read_csv(io.BytesIO(page.content), encoding='utf-8') for page in pipeline.pages if page.rows]
+    if not frames:
+        raise PipelineError("Item catalogue is empty, leaving existing data untouched")
+    print("Cleaning data...")
+    pipeline.items = clean_items(pd.concat(frames, ignore_index=True)).to_dict(orient='records')
+    pipeline.count(rows_in=sum(len(frame) for frame in frames), rows_out=len(pipeline.items))
+
+
+def lean_clean_stage(pipeline):
+    """clean_stage with the stdlib csv module, streaming each page through the cleaning rules"""
+    from .clean import clean_page
+
+    pages = [page for page in pipeline.pages if page.rows]
+    if not pages:
+        raise PipelineError("Item catalogue is empty, leaving existing data untouched")
+    print("Parsing and cleaning catalogue pages...")
+    pipeline.items = [item for page in pages for item in clean_page(page.content)]
+    pipeline.count(rows_in=sum(page.rows for page in pages), rows_out=len(pipeline.items))
+
+
+def diff_stage(pipeline):
+    """Diff against the previously published catalogue"""
+    from .diff import catalogue_index, diff_catalogues, summarize, write_diff
+
+    old_index = pipeline.state['items']
+    if not old_index and os.path.exists(pipeline.items_json):
+        with open(pipeline.items_json, 'r', encoding='utf-8') as f:
+            old_index = catalogue_index(json.load(f))
+    pipeline.diff = diff_catalogues(old_index, catalogue_index(pipeline.items))
+    pipeline.count(rows_in=len(pipeline.items),
+                   rows_out=sum(len(pipeline.diff[kind]) for kind in ('added', 'removed', 'updated', 'renamed')))
+    try:
+        write_diff(pipeline.diff, pipeline.path('items_diff.json'))
+    except Exception as e:
+        pipeline.record_error(e)
+        print(f"⚠️  Error writing catalogue diff: {e}")
+    for line in summarize(pipeline.diff):
+        print(line)
+
+
+def persist_stage(pipeline):
+    """Write items.json and items.db from the same in-memory records"""
+    from .diff import catalogue_index
+    from .persist import apply_item_diff, rebuild_items_db
+    from .state import save_state
+
+    pipeline.count(rows_in=len(pipeline.items))
+    if pipeline.catalogue_changed:
+        print("Writing items.json...")
+        try:
+            write_items_json(pipeline.items, pipeline.items_json)
+        except Exception as e:
+            raise PipelineError(f"Error creating JSON file: {e}")
+        print(f"✅ JSON file updated in server: {pipeline.items_json}")
+        write_catalogue_artifact(pipeline)
+        log("Data processing complete!")
+        print(f"Updated items.json with {len(pipeline.items)} items")
+
+        print("Writing items.db...")
+        try:
+            # A resumed run may have committed the diff before it was interrupted
+            if pipeline.incremental and not (pipeline.checkpoint and pipeline.checkpoint.resumed):
+                # Apply only the changed rows inside one transaction
+                changed_rows = apply_item_diff(pipeline.items_db, pipeline.diff, pipeline.items)
+                print(f"✅ SQLite database updated at: {pipeline.items_db} ({changed_rows} rows changed)")
+            else:
+                # Build a fresh file and swap it in atomically
+                changed_rows = rebuild_items_db(pipeline.items, pipeline.items_db)
+                print(f"✅ SQLite database rebuilt at: {pipeline.items_db} ({changed_rows} items)")
+            pipeline.count(rows_out=changed_rows)
+        except Exception as e:
+            pipeline.record_error(e)
+            print(f"❌ Error creating SQLite database: {e}")
+    else:
+        print("✅ No item changes, items.json left as is")
+
+    pipeline.state['items'] = catalogue_index(pipeline.items)
+    save_state(pipeline.state, pipeline.path('scrape_state.json'))
+
+
+def marketplace_stage(pipeline):
+    """Rename outdated item names in marketplace listings to current catalogue names"""
+    from .reconcile import reconcile, write_renames
+
+    print("Updating marketplace database with current item names...")
+    marketplace_db_path = pipeline.path('marketplace.db')
+    if not os.path.exists(marketplace_db_path):
+        print("ℹ️  Marketplace database not found, skipping item name updates")
+        return
+    renamed = {pair['from']: pair['to'] for pair in (pipeline.diff or {}).get('renamed', [])}
+    renames, unresolved, updated = reconcile(marketplace_db_path, [item.get('Items') for item in pipeline.items],
+                                             renamed)
+    write_renames(renames, unresolved, pipeline.path('item_renames.json'))
+    pipeline.count(rows_out=updated)
+    applied = [rename for rename in renames.values() if rename.applied]
+    if updated > 0:
+        print(f"✅ Updated {updated} marketplace listings across {len(applied)} renamed items")
+    else:
+        print("✅ No marketplace item names needed updating")
+    proposals = len(renames) - len(applied)
+    if proposals:
+        print(f"ℹ️  {proposals} fuzzy item name matches proposed for review (see item_renames.json)")
+    if unresolved:
+        print(f"ℹ️  {len(unresolved)} listing item names have no catalogue match (see item_renames.json)")
+
+
+def search_stage(pipeline):
+    """Make sure marketplace.db has its listings search index"""
+    from .search import ensure_listings_search
+
+    marketplace_db_path = pipeline.path('marketplace.db')
+    if not os.path.exists(marketplace_db_path):
+        return
+    conn = sqlite3.connect(marketplace_db_path)
+    try:
+        with conn:
+            built = ensure_listings_search(conn)
+    finally:
+        conn.close()
+    if built:
+        print("✅ Built listings search index")
+
+
+def stats_stage(pipeline):
+    """Refresh item_stats for items whose listings changed (including renames)"""
+    from .stats import refresh_stats
+
+    marketplace_db_path = pipeline.path('marketplace.db')
+    if not os.path.exists(marketplace_db_path):
+        return
+    written, removed = refresh_stats(marketplace_db_path, incremental=True, lean=pipeline.lean)
+    pipeline.count(rows_out=written + removed)
+    print(f"✅ Market statistics refreshed for {written} items ({removed} removed)")
+
+
+def images_stage(pipeline):
+    """Link renamed/legacy-named images and download the ones still missing"""
+    from .manifest import load_manifest, missing, save_manifest, scan
+    from .naming import legacy_filenames, safe_filename, wiki_filename
+    from .store import ImageStore
+
+    log("Checking for missing images...")
+    images_dir = pipeline.images_dir
+    manifest_path = pipeline.path('image_manifest.json')
+    pipeline.store = ImageStore(pipeline.path('image_store'))
+    pipeline.manifest = load_manifest(manifest_path)
+    present = scan(pipeline.manifest, images_dir)
+
+    # Check the whole catalogue on every run, so a download that failed before is retried
+    filenames = {item['Items']: safe_filename(item['Items']) for item in pipeline.items if item.get('Items')}
+    pipeline.count(rows_in=len(filenames))
+    missing_files = missing(pipeline.manifest, images_dir, filenames.values())
+
+    # A renamed item, or one saved under an older naming scheme, keeps its art:
+    # link the existing file under the canonical name instead of downloading it
+    previous_names = {pair['to']: pair['from'] for pair in (pipeline.diff or {}).get('renamed', [])}
+    linked = 0
+    for name, filename in filenames.items():
+        if filename not in missing_files:
+            continue
+        candidates = legacy_filenames(name)
+        if name in previous_names:
+            candidates = [safe_filename(previous_names[name])] + legacy_filenames(previous_names[name]) + candidates
+        source = next((candidate for candidate in candidates if candidate in present), None)
+        if source:
+            pipeline.store.link(os.path.join(images_dir, source), os.path.join(images_dir, filename),
+                                present[source]['sha256'])
+            linked += 1
+    if linked:
+        print(f"🔗 Linked {linked} renamed or legacy-named images")
+        scan(pipeline.manifest, images_dir)
+        missing_files = missing(pipeline.manifest, images_dir, filenames.values())
+
+    # The wiki file name comes from the Image column; it often differs from the local name
+    wiki_names = {item['Items']: wiki_filename(item.get('Image')) for item in pipeline.items if item.get('Items')}
+    missing_images = [(name, filename) for name, filename in filenames.items() if filename in missing_files]
+    no_image = sum(1 for name, _ in missing_images if not wiki_names[name])
+    missing_images = [(name, filename) for name, filename in missing_images if wiki_names[name]]
+    if no_image:
+        print(f"ℹ️  {no_image} items have no image on the wiki")
+    if missing_images and pipeline.download_images:
+        from .fetch import WIKI_BASE_URL
+        from .sync import REQUESTS_PER_SECOND, ImageJob, report_results, sync_images
+
+        print(f"📥 Downloading {len(missing_images)} missing images...")
+        # Parallel, rate-limited downloads over one keep-alive session
+        jobs = [ImageJob(name, wiki_names[name], [os.path.join(images_dir, filename)])
+                for name, filename in missing_images]
+        on_result = None
+        if pipeline.checkpoint is not None:
+            # A resumed run skips what the interrupted attempt downloaded and retries its failures
+            jobs = [job for job in jobs if not pipeline.checkpoint.image_done(job.filename)]
+            on_result = lambda result: pipeline.checkpoint.record_image(result.job.filename, result.ok)  # noqa: E731
+        rate = REQUESTS_PER_SECOND if pipeline.image_rate is None else pipeline.image_rate
+        results, elapsed = sync_images(jobs, pipeline.base_url or WIKI_BASE_URL, rate=rate, store=pipeline.store,
+                                       on_result=on_result)
+        downloaded = report_results(results, elapsed)
+        pipeline.count(rows_out=downloaded, bytes_fetched=sum(result.size for result in results),
+                       retries=sum(max(result.attempts - 1, 0) for result in results),
+                       http_statuses=Counter(status for result in results for status in result.statuses))
+        scan(pipeline.manifest, images_dir)
+        if downloaded > 0:
+            print("ℹ️  New images added - nginx will serve them automatically")
+    elif missing_images:
+        print(f"ℹ️  {len(missing_images)} images missing, downloads disabled")
+    else:
+        print("✅ All item images are present")
+    save_manifest(pipeline.manifest, manifest_path)
+
+
+def optimize_stage(pipeline):
+    """Generate WebP/AVIF variants and thumbnails and record them per item"""
+    from .manifest import files_in
+    from .naming import safe_filename
+    from .optimize import available, item_variants, load_variants, optimize_images, report_optimization, save_variants
+    from .persist import write_image_variants
+
+    if not available():
+        print("ℹ️  Pillow not installed, skipping image optimization")
+        return
+    log("Optimizing item images...")
+    variants_path = pipeline.path('image_variants.json')
+    index = load_variants(variants_path)
+    start = time.perf_counter()
+    encoded = optimize_images(files_in(pipeline.manifest, pipeline.images_dir), pipeline.images_dir, index,
+                              store=pipeline.store)
+    report_optimization(encoded, time.perf_counter() - start)
+    pipeline.count(rows_out=len(encoded))
+    save_variants(index, variants_path)
+
+    # Record the variants so the API can offer the cheapest format a client accepts
+    variants = item_variants(index, {item['Items']: safe_filename(item['Items'])
+                                     for item in pipeline.items if item.get('Items')})
+    if not variants:
+        return
+    variant_rows = write_image_variants(pipeline.items_db, variants)
+    print(f"✅ Recorded {variant_rows} image variants for {len(variants)} items")
+
+
+def load_published_items(pipeline):
+    """Take the catalogue from items.json, with an empty diff, when the pages did not change"""
+    from .diff import DERIVED_FIELDS, catalogue_index, diff_catalogues
+
+    try:
+        with open(pipeline.items_json, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+    except (OSError, ValueError) as e:
+        raise PipelineError(f"Error reading {pipeline.items_json}: {e}")
+    # items.json written by older runs can still carry image variants
+    pipeline.items = [{key: value for key, value in item.items() if key not in DERIVED_FIELDS} for item in items]
+    index = catalogue_index(pipeline.items)
+    pipeline.diff = diff_catalogues(index, index)
+
+
+# Stages after persist are best-effort: a failure is logged and the refresh carries on
+BEST_EFFORT_STAGES = [
+    (marketplace_stage, "updating marketplace item names"),
+    (stats_stage, "refreshing market statistics"),
+    (search_stage, "building the listings search index"),
+    (images_stage, "checking/downloading images"),
+    (optimize_stage, "optimizing images"),
+]
+
+
+def run_stage(pipeline, stage):
+    """Run one stage under metrics, or restore it from the checkpoint of an interrupted run"""
+    name = stage_name(stage)
+    checkpoint = pipeline.checkpoint
+    if checkpoint is not None and checkpoint.done(name):
+        checkpoint.restore(name, pipeline)
+        pipeline.metrics.skip(name)
+        print(f"⏭️  {name}: completed before the interruption")
+        return
+    with pipeline.metrics.stage(name):
+        stage(pipeline)
+    if checkpoint is not None:
+        checkpoint.complete(name, pipeline)
+
+
+def stage_name(stage):
+    """'fetch' for fetch_stage"""
+    return stage.__name__.removesuffix('_stage')
+
+
+def run(pipeline):
+    """Run the full refresh; returns a process exit code"""
+    from .metrics import RunMetrics
+
+    if pipeline.lean is None:
+        pipeline.lean = not pandas_available()
+    metrics_dir = pipeline.metrics_dir or pipeline.path('metrics')
+    pipeline.metrics = RunMetrics(pipeline.profile, os.path.join(metrics_dir, 'profiles'))
+    try:
+        return _run_stages(pipeline)
+    finally:
+        measured = [stage for stage in pipeline.metrics.stages if stage.status != 'skipped']
+        print("⏱️  Stages: " + ', '.join(f"{stage.stage} {stage.wall_seconds:.2f}s"
+                                         + (' (failed)' if stage.status == 'error' else '') for stage in measured))
+        try:
+            pipeline.metrics.write(metrics_dir)
+        except OSError as e:
+            print(f"⚠️  Error writing metrics: {e}")
+
+
+def _run_stages(pipeline):
+    log("Starting automated data scraping...")
+    metrics = pipeline.metrics
+    try:
+        run_stage(pipeline, fetch_stage)
+        run_stage(pipeline, record_stage)
+        if pipeline.incremental and not pipeline.pages_changed and os.path.exists(pipeline.items_json):
+            from .state import save_state
+            save_state(pipeline.state, pipeline.path('scrape_state.json'))
+            for stage in (clean_stage, diff_stage, persist_stage):
+                metrics.skip(stage_name(stage))
+            print("✅ Catalogue pages unchanged since last scrape, items.json left as is")
+            # Images, stats and the rest still catch up with the published catalogue
+            load_published_items(pipeline)
+        else:
+            for stage in (clean_stage, diff_stage, persist_stage):
+                run_stage(pipeline, stage)
+    except PipelineError as e:
+        print(f"❌ {e}")
+        return 1
+
+    for stage, description in BEST_EFFORT_STAGES:
+        try:
+            run_stage(pipeline, stage)
+        except Exception as e:
+            print(f"⚠️  Error {description}: {e}")
+
+    log("Automated scraping completed successfully!")
+    return 0
@@ -0,0 +1,398 @@
+"""
+Query-plan profiler and index advisor for marketplace.db.
+
+QUERIES is the canonical set of statements server.js runs against
+marketplace.db (listings pages, market stats, a user's listings, offers and
+user lookups), each with sample parameters drawn from the database itself.
+For every query the profiler records the EXPLAIN QUERY PLAN tree and the
+median latency, and flags full table scans, whole-index walks that filter
+rows and temp B-tree sorts.
+
+Each query also names the index that would serve its access path
+(equality columns, then the ORDER BY column, then any columns that make it
+covering). The advisor proposes those indexes for flagged queries, and for
+queries whose plan is not yet covering, when no existing index already
+serves them, and merges them: an index that is a prefix of
+another is dropped, and covering columns are appended to an index that
+starts with the same key.
+
+The proposals are then created inside a transaction and every query is
+profiled again, which gives a before/after latency report. The transaction
+is rolled back unless --apply is given, and writes are always rolled back.
+
+    python3 -m bazaar_data.queryplan --db /app/data/marketplace.db
+    python3 -m bazaar_data.queryplan --db /app/data/marketplace.db --apply --json report.json
+"""
+
+import json
+import sqlite3
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+
+MARKETPLACE_DB_PATH = '/app/data/marketplace.db'
+REPEAT = 5
+# Slow queries (whole-table dumps at scale) stop repeating after this long
+MAX_QUERY_SECONDS = 3.0
+PAGE = 50
+DEEP_OFFSET = 5000
+FLAG_SCAN = 'full scan'
+FLAG_INDEX_SCAN = 'index scan'
+FLAG_TEMP_BTREE = 'temp b-tree'
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    table: str
+    columns: tuple
+    # Extra columns that make the index covering for the query
+    include: tuple = ()
+
+    @property
+    def all_columns(self):
+        return self.columns + tuple(column for column in self.include if column not in self.columns)
+
+    @property
+    def name(self):
+        return f"idx_{self.table}_{'_'.join(column.lower() for column in self.all_columns)}"
+
+    @property
+    def sql(self):
+        return f"CREATE INDEX IF NOT EXISTS {self.name} ON {self.table}({', '.join(self.all_columns)})"
+
+
+@dataclass
+class Query:
+    name: str
+    endpoint: str
+    sql: str
+    # Sample parameter names (see sample_parameters)
+    params: tuple = ()
+    # The index that would serve the query's access path
+    wants: tuple = ()
+    # Tables the query needs (besides listings)
+    tables: tuple = ()
+    write: bool = False
+
+
+QUERIES = [
+    Query('listings_all', 'GET /listings',
+          "SELECT l.*, u.user_flags FROM listings l LEFT JOIN users u ON l.userId = u.id "
+          "WHERE l.item IS NOT NULL AND l.item != '' ORDER BY l.timestamp DESC",
+          wants=(IndexSpec('listings', ('timestamp',)),), tables=('users',)),
+    Query('api_listings_all', 'GET /api/listings',
+          "SELECT * FROM listings WHERE item IS NOT NULL AND item != '' ORDER BY timestamp DESC",
+          wants=(IndexSpec('listings', ('timestamp',)),)),
+    Query('listings_page', 'GET /api/listings-with-items',
+          'SELECT * FROM listings ORDER BY timestamp DESC LIMIT ? OFFSET ?', ('limit', 'offset'),
+          wants=(IndexSpec('listings', ('timestamp',)),)),
+    Query('listings_page_deep', 'GET /api/listings-with-items?offset=5000',
+          'SELECT * FROM listings ORDER BY timestamp DESC LIMIT ? OFFSET ?', ('limit', 'deep_offset'),
+          wants=(IndexSpec('listings', ('timestamp',)),)),
+    Query('listings_page_type', 'GET /api/listings-with-items?type=',
+          'SELECT * FROM listings WHERE type = ? ORDER BY timestamp DESC LIMIT ? OFFSET ?',
+          ('type', 'limit', 'offset'), wants=(IndexSpec('listings', ('type', 'timestamp')),)),
+    Query('listings_count_type', 'GET /api/listings-with-items?type= (total)',
+          'SELECT COUNT(*) as count FROM listings WHERE type = ?', ('type',),
+          wants=(IndexSpec('listings', ('type',)),)),
+    Query('listings_page_item_like', 'GET /api/listings-with-items?item_name= (no FTS)',
+          'SELECT * FROM listings WHERE item LIKE ? ORDER BY timestamp DESC LIMIT ? OFFSET ?',
+          ('item_like', 'limit', 'offset')),
+    Query('listings_page_item_fts', 'GET /api/listings-with-items?item_name=',
+          'SELECT * FROM listings WHERE id IN (SELECT rowid FROM listings_fts WHERE listings_fts MATCH ?) '
+          'ORDER BY timestamp DESC LIMIT ? OFFSET ?', ('item_match', 'limit', 'offset'), tables=('listings_fts',)),
+    Query('market_stats', 'GET /api/market-stats/:item',
+          'SELECT * FROM item_stats WHERE item = ?', ('item',), tables=('item_stats',)),
+    Query('market_stats_fallback', 'GET /api/market-stats/:item (no item_stats row)',
+          "SELECT COUNT(*) AS total_listings, SUM(type = 'buy') AS buy_listings, SUM(type = 'sell') AS sell_listings, "
+          "ROUND(AVG(price)) AS average_price, MIN(CASE WHEN type = 'sell' THEN price END) AS lowest_sell_price, "
+          "MAX(CASE WHEN type = 'buy' THEN price END) AS highest_buy_price, "
+          "COALESCE(SUM(quantity), 0) AS total_quantity FROM listings WHERE item = ?", ('item',),
+          wants=(IndexSpec('listings', ('item',), ('type', 'price', 'quantity')),)),
+    Query('market_stats_recent', 'GET /api/market-stats/:item',
+          'SELECT * FROM listings WHERE item = ? ORDER BY timestamp DESC LIMIT 10', ('item',),
+          wants=(IndexSpec('listings', ('item', 'timestamp')),)),
+    Query('listing_by_id', 'GET /api/listings/:id', 'SELECT * FROM listings WHERE id = ?', ('listing_id',)),
+    Query('user_listings', 'GET /api/users/:id/listings',
+          'SELECT * FROM listings WHERE userId = ? ORDER BY timestamp DESC', ('user_id_text',),
+          wants=(IndexSpec('listings', ('userId', 'timestamp')),)),
+    Query('rename_user_listings', 'PUT /api/auth/username',
+          'UPDATE listings SET seller = ?, IGN = ? WHERE userId = ?', ('username', 'username', 'user_id_text'),
+          wants=(IndexSpec('listings', ('userId',)),), write=True),
+    Query('offers_for_listing', 'GET /api/offers/listing/:id',
+          'SELECT o.*, u.avatar as user_avatar FROM offers o LEFT JOIN users u ON o.user_id = u.id '
+          'WHERE o.listing_id = ? ORDER BY o.created_at DESC', ('offer_listing_id',),
+          wants=(IndexSpec('offers', ('listing_id', 'created_at')),), tables=('offers', 'users')),
+    Query('offers_by_user', 'GET /api/offers/user',
+          'SELECT o.*, l.item, l.seller, l.price as listing_price, l.type as listing_type FROM offers o '
+          'LEFT JOIN listings l ON o.listing_id = l.id WHERE o.user_id = ? ORDER BY o.created_at DESC',
+          ('user_id',), wants=(IndexSpec('offers', ('user_id', 'created_at')),), tables=('offers',)),
+    Query('offers_received', 'GET /api/offers/received',
+          'SELECT o.*, l.item, l.seller, l.price as listing_price, l.type as listing_type, u.avatar as user_avatar '
+          'FROM offers o LEFT JOIN listings l ON o.listing_id = l.id LEFT JOIN users u ON o.user_id = u.id '
+          'WHERE l.userId = ? ORDER BY o.created_at DESC', ('user_id_text',),
+          wants=(IndexSpec('listings', ('userId',)),), tables=('offers', 'users')),
+    Query('pending_offer', 'POST /api/offers',
+          "SELECT * FROM offers WHERE listing_id = ? AND user_id = ? AND status = 'pending'",
+          ('offer_listing_id', 'user_id'), wants=(IndexSpec('offers', ('listing_id', 'user_id')),),
+          tables=('offers',)),
+    Query('user_by_email', 'POST /api/auth/login', 'SELECT * FROM users WHERE email = ?', ('email',),
+          wants=(IndexSpec('users', ('email',)),), tables=('users',)),
+    Query('user_by_id_or_discord', 'GET /api/auth/me', 'SELECT * FROM users WHERE id = ? OR discord_id = ?',
+          ('user_id', 'user_id'), tables=('users',)),
+    Query('user_by_verification_token', 'GET /api/auth/verify-email',
+          'SELECT * FROM users WHERE email_verification_token = ?', ('verification_token',),
+          wants=(IndexSpec('users', ('email_verification_token',)),), tables=('users',)),
+]
+
+
+def has_table(conn, name):
+    return conn.execute('SELECT 1 FROM sqlite_master WHERE name = ?', (name,)).fetchone() is not None
+
+
+def sample_parameters(conn):
+    """Representative parameter values: the busiest item, seller and listing"""
+    def first(sql, params=(), default=None):
+        try:
+            row = conn.execute(sql, params).fetchone()
+        except sqlite3.OperationalError:
+            return default
+        return row[0] if row and row[0] is not None else default
+
+    item = first('SELECT item FROM listings GROUP BY item ORDER BY COUNT(*) DESC LIMIT 1', default='')
+    user_id = first('SELECT userId FROM listings WHERE userId IS NOT NULL GROUP BY userId '
+                    'ORDER BY COUNT(*) DESC LIMIT 1', default='')
+    return {
+        'limit': PAGE,
+        'offset': 0,
+        'deep_offset': DEEP_OFFSET,
+        'type': 'sell',
+        'item': item,
+        'item_like': f"%{item.split(' ')[-1]}%",
+        'item_match': f'item : "{item.split(" ")[-1]}"*',
+        'listing_id': first('SELECT MAX(id) / 2 FROM listings', default=1),
+        'user_id_text': str(user_id),
+        'user_id': first('SELECT id FROM users WHERE id = ?', (user_id,),
+                         first('SELECT MIN(id) FROM users', default=1)),
+        'username': first('SELECT username FROM users WHERE id = ?', (user_id,), 'trader'),
+        'email': first('SELECT email FROM users WHERE email IS NOT NULL LIMIT 1', default=''),
+        'verification_token': first('SELECT email_verification_token FROM users '
+                                    'WHERE email_verification_token IS NOT NULL LIMIT 1', default=''),
+        'offer_listing_id': first('SELECT listing_id FROM offers GROUP BY listing_id ORDER BY COUNT(*) DESC LIMIT 1',
+                                  default=1),
+    }
+
+
+def explain(conn, sql, params):
+    """EXPLAIN QUERY PLAN rows as (depth, detail)"""
+    rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    depth = {0: -1}
+    plan = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        plan.append((depth[node_id], detail))
+    return plan
+
+
+def plan_flags(plan):
+    """
+    FLAG_SCAN for full table scans, FLAG_INDEX_SCAN for walks of a whole index
+    (cheap only when a LIMIT stops them early), FLAG_TEMP_BTREE for sorts or
+    grouping in a temp B-tree
+    """
+    flags = []
+    for _, detail in plan:
+        if not detail.startswith('SCAN ') or 'VIRTUAL TABLE' in detail or detail.startswith('SCAN CONSTANT ROW'):
+            pass
+        elif 'USING' in detail:
+            flags.append(f"{FLAG_INDEX_SCAN}: {detail[5:]}")
+        else:
+            flags.append(f"{FLAG_SCAN}: {detail[5:]}")
+        if 'TEMP B-TREE' in detail:
+            flags.append(f"{FLAG_TEMP_BTREE}: {detail.split(' FOR ', 1)[-1].lower()}")
+    return flags
+
+
+def time_query(conn, query, params, repeat=REPEAT):
+    """Median seconds over up to `repeat` runs, fetching every row; writes are rolled back"""
+    timings = []
+    deadline = time.perf_counter() + MAX_QUERY_SECONDS
+    for _ in range(repeat):
+        if query.write:
+            conn.execute('SAVEPOINT queryplan_write')
+        start = time.perf_counter()
+        conn.execute(query.sql, params).fetchall()
+        timings.append(time.perf_counter() - start)
+        if query.write:
+            conn.execute('ROLLBACK TO queryplan_write')
+            conn.execute('RELEASE queryplan_write')
+        if time.perf_counter() > deadline:
+            break
+    return statistics.median(timings)
+
+
+@dataclass
+class QueryProfile:
+    name: str
+    endpoint: str
+    seconds: float
+    plan: list
+    flags: list = field(default_factory=list)
+
+
+def runnable(conn, queries=QUERIES):
+    """The queries whose tables exist in this database"""
+    return [query for query in queries if all(has_table(conn, table) for table in ('listings',) + query.tables)]
+
+
+def profile(conn, queries, samples, repeat=REPEAT):
+    profiles = []
+    for query in queries:
+        params = [samples[name] for name in query.params]
+        plan = explain(conn, query.sql, params)
+        profiles.append(QueryProfile(query.name, query.endpoint, time_query(conn, query, params, repeat), plan,
+                                     plan_flags(plan)))
+    return profiles
+
+
+def existing_indexes(conn):
+    """{table: [column tuples]} for every index, including UNIQUE constraints"""
+    indexes = {}
+    tables = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    for table in tables:
+        for _, index, *_ in conn.execute(f'PRAGMA index_list("{table}")').fetchall():
+            columns = tuple(name for _, _, name in conn.execute(f'PRAGMA index_info("{index}")').fetchall())
+            indexes.setdefault(table, []).append((index, columns))
+    return indexes
+
+
+def served(spec, indexes):
+    """True if an existing index starts with the spec's columns and contains its covering ones"""
+    for _, columns in indexes.get(spec.table, []):
+        if columns[:len(spec.columns)] == spec.columns and set(spec.include) <= set(columns):
+            return True
+    return False
+
+
+def merge_specs(specs, indexes):
+    """Drop prefixes of other proposals and fold covering columns into an index with the same key"""
+    specs = list(dict.fromkeys(specs))
+    merged = []
+    for spec in specs:
+        if spec.include:
+            # Widen the longest proposal or existing index that starts with this key
+            bases = [other.columns for other in specs if other.table == spec.table and not other.include
+                     and other.columns[:len(spec.columns)] == spec.columns]
+            bases += [columns for _, columns in indexes.get(spec.table, [])
+                      if columns[:len(spec.columns)] == spec.columns]
+            base = max(bases, key=len, default=spec.columns)
+            spec = IndexSpec(spec.table, tuple(base), spec.include)
+        merged.append(spec)
+    return [spec for spec in dict.fromkeys(merged)
+            if not any(other != spec and other.table == spec.table
+                       and other.all_columns[:len(spec.all_columns)] == spec.all_columns for other in merged)]
+
+
+def needs(spec, result):
+    """Whether the query behind `result` would benefit from `spec`: its plan is flagged or not yet covering"""
+    return bool(result.flags) or bool(spec.include) and not any('COVERING INDEX' in detail
+                                                                 for _, detail in result.plan)
+
+
+def advise(conn, queries, profiles):
+    """Proposed IndexSpecs for flagged queries, and existing indexes the proposals make redundant"""
+    indexes = existing_indexes(conn)
+    wanted = [spec for query, result in zip(queries, profiles)
+              for spec in query.wants if needs(spec, result) and not served(spec, indexes)]
+    proposals = merge_specs(wanted, indexes)
+    redundant = sorted({name for spec in proposals for name, columns in indexes.get(spec.table, [])
+                        if not name.startswith('sqlite_autoindex')
+                        and spec.all_columns[:len(columns)] == columns})
+    return proposals, redundant
+
+
+def apply_indexes(conn, proposals):
+    """Create the proposed indexes; returns seconds taken"""
+    start = time.perf_counter()
+    for spec in proposals:
+        conn.execute(spec.sql)
+    return time.perf_counter() - start
+
+
+def run_advisor(db_path, apply=False, repeat=REPEAT):
+    """Profile, propose, re-profile with the proposals; returns the report dict"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        queries = runnable(conn)
+        samples = sample_parameters(conn)
+        before = profile(conn, queries, samples, repeat)
+        proposals, redundant = advise(conn, queries, before)
+        conn.execute('BEGIN')
+        try:
+            build_seconds = apply_indexes(conn, proposals)
+            after = profile(conn, queries, samples, repeat)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT' if apply and proposals else 'ROLLBACK')
+    finally:
+        conn.close()
+    return {
+        'db': db_path,
+        'applied': bool(apply and proposals),
+        'proposals': [spec.sql for spec in proposals],
+        'redundant': redundant,
+        'build_seconds': build_seconds,
+        'queries': [{'name': old.name, 'endpoint': old.endpoint,
+                     'before': {'seconds': old.seconds, 'flags': old.flags, 'plan': old.plan},
+                     'after': {'seconds': new.seconds, 'flags': new.flags, 'plan': new.plan}}
+                    for old, new in zip(before, after)],
+    }
+
+
+def print_report(report, show_plans=False):
+    print(f"{'query':<28} {'before ms':>11} {'after ms':>11} {'speedup':>9}  flags before -> after")
+    for query in report['queries']:
+        before, after = query['before'], query['after']
+        speedup = f"{before['seconds'] / after['seconds']:.1f}x" if after['seconds'] else '-'
+        flags = f"{'; '.join(before['flags']) or '-'} -> {'; '.join(after['flags']) or '-'}"
+        print(f"{query['name']:<28} {before['seconds'] * 1000:>11.3f} {after['seconds'] * 1000:>11.3f} "
+              f"{speedup:>9}  {flags}")
+        if show_plans:
+            for label, plan in (('before', before['plan']), ('after', after['plan'])):
+                print(f"   {label}:")
+                for depth, detail in plan:
+                    print(f"      {'  ' * depth}{detail}")
+    if not report['proposals']:
+        print("\n✅ No index proposals: every flagged query is already as indexed as it can be")
+        return
+    verb = "Created" if report['applied'] else "Proposed (rolled back; use --apply to keep)"
+    print(f"\n{verb} in {report['build_seconds']:.2f}s:")
+    for sql in report['proposals']:
+        print(f"   {sql};")
+    if report['redundant']:
+        print(f"ℹ️  Made redundant by the proposals (prefixes): {', '.join(report['redundant'])}")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Profile server.js queries on marketplace.db and propose indexes")
+    parser.add_argument('--db', default=MARKETPLACE_DB_PATH)
+    parser.add_argument('--apply', action='store_true', help="keep the proposed indexes")
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="runs per query (median is reported)")
+    parser.add_argument('--plans', action='store_true', help="print the query plans before and after")
+    parser.add_argument('--json', help="also write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    report = run_advisor(args.db, args.apply, args.repeat)
+    print_report(report, args.plans)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+Reconcile marketplace listing item names with the current catalogue.
+
+Listings keep the item name they were created with, so a wiki rename leaves
+them pointing at an item that no longer exists. Every distinct listing name
+is looked up in a NameIndex built from the freshly scraped catalogue:
+
+    1. exact name (hash lookup)
+    2. a rename recorded in the catalogue diff
+    3. normalized name (case, punctuation and spacing ignored)
+    4. fuzzy: candidates from a token index (falling back to a trigram
+       index), scored by token and trigram overlap. Numeric tokens
+       (+80, 10%, 15) must match exactly, and a match must be clearly
+       better than the runner-up.
+
+Exact, diff and normalized matches are applied with one executemany keyed on
+listing id inside a single transaction. Fuzzy matches can pick a different
+item that happens to have a similar name ('Shiny Gurnard Soup' ->
+'Shiny Gurnard'), so they are only written to item_renames.json as
+proposals. Copy the file (every scrape rewrites it), delete the wrong
+proposals from the copy and apply the rest with:
+
+    python3 -m bazaar_data.reconcile --apply-fuzzy reviewed_renames.json
+
+Offline usage against any marketplace.db and items.json:
+
+    python3 -m bazaar_data.reconcile --db marketplace.db --items items.json --dry-run
+"""
+
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import asdict, dataclass
+
+RENAMES_PATH = '/app/data/item_renames.json'
+
+TOKEN_PATTERN = re.compile(r'[+-]?\d+(?:\.\d+)?%?|[a-z]+')
+NUMERIC_TOKEN = re.compile(r'[+-]?\d')
+
+# Match methods applied without review
+AUTO_METHODS = ('diff', 'normalized')
+
+MIN_SCORE = 0.6
+# The best candidate must beat the runner-up by this much to be trusted
+MIN_MARGIN = 0.05
+# Tokens shared by more catalogue items than this are too common to pick candidates
+MAX_TOKEN_POSTINGS = 2000
+MAX_TRIGRAM_CANDIDATES = 50
+
+
+@dataclass
+class Rename:
+    old: str
+    new: str
+    method: str
+    score: float
+    listings: int = 0
+    applied: bool = False
+
+
+def normalize(name):
+    """Lowercased name with punctuation and repeated spaces removed"""
+    return ' '.join(tokens(name))
+
+
+def tokens(name):
+    return TOKEN_PATTERN.findall(str(name).casefold())
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def numeric_tokens(token_list):
+    return sorted(token for token in token_list if NUMERIC_TOKEN.match(token))
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class NameIndex:
+    """Exact, normalized, token and trigram indexes over catalogue item names"""
+
+    def __init__(self, names):
+        self.names = list(dict.fromkeys(name for name in names if name))
+        self.exact = set(self.names)
+        self.normalized = defaultdict(list)
+        self.token_sets = []
+        self.trigram_sets = []
+        self.token_postings = defaultdict(list)
+        self.trigram_postings = defaultdict(list)
+        for position, name in enumerate(self.names):
+            name_tokens = tokens(name)
+            key = ' '.join(name_tokens)
+            self.normalized[key].append(name)
+            self.token_sets.append(set(name_tokens))
+            self.trigram_sets.append(trigrams(key))
+            for token in self.token_sets[-1]:
+                self.token_postings[token].append(position)
+            for trigram in self.trigram_sets[-1]:
+                self.trigram_postings[trigram].append(position)
+
+    def candidates(self, name_tokens, name_trigrams):
+        """Catalogue positions worth scoring for a name"""
+        found = set()
+        for token in name_tokens:
+            postings = self.token_postings.get(token, ())
+            if len(postings) <= MAX_TOKEN_POSTINGS:
+                found.update(postings)
+        if found:
+            return found
+        # No usable token in common (typos, joined words): use the trigram index
+        shared = Counter()
+        for trigram in name_trigrams:
+            shared.update(self.trigram_postings.get(trigram, ()))
+        return {position for position, _ in shared.most_common(MAX_TRIGRAM_CANDIDATES)}
+
+    def fuzzy(self, name):
+        """(best name, score) or None when there is no unambiguous match"""
+        name_tokens = tokens(name)
+        token_set = set(name_tokens)
+        trigram_set = trigrams(' '.join(name_tokens))
+        numbers = numeric_tokens(name_tokens)
+
+        scored = []
+        for position in self.candidates(token_set, trigram_set):
+            if numeric_tokens(self.token_sets[position]) != numbers:
+                continue
+            score = (jaccard(token_set, self.token_sets[position]) +
+                     jaccard(trigram_set, self.trigram_sets[position])) / 2
+            scored.append((score, position))
+        if not scored:
+            return None
+        scored.sort(reverse=True)
+        best_score, best = scored[0]
+        runner_up = scored[1][0] if len(scored) > 1 else 0.0
+        if best_score < MIN_SCORE or best_score - runner_up < MIN_MARGIN:
+            return None
+        return self.names[best], round(best_score, 3)
+
+    def match(self, name, renamed=None):
+        """Rename for a listing name, or None if it is current or cannot be resolved"""
+        if name in self.exact:
+            return None
+        if renamed and renamed.get(name) in self.exact:
+            return Rename(name, renamed[name], 'diff', 1.0)
+        same = self.normalized.get(normalize(name), [])
+        if len(same) == 1:
+            return Rename(name, same[0], 'normalized', 1.0)
+        fuzzy = self.fuzzy(name)
+        if fuzzy:
+            return Rename(name, fuzzy[0], 'fuzzy', fuzzy[1])
+        return None
+
+
+def listing_names(conn):
+    """Listing ids grouped by item name, in one pass over the table"""
+    by_name = defaultdict(list)
+    for listing_id, item in conn.execute('SELECT id, item FROM listings'):
+        by_name[item].append(listing_id)
+    return by_name
+
+
+def rename_map(index, by_name, renamed=None):
+    """Renames for every listing name; returns (renames, unresolved names)"""
+    renames, unresolved = {}, []
+    for name, ids in by_name.items():
+        if name in index.exact:
+            continue
+        rename = index.match(name, renamed)
+        if rename:
+            rename.listings = len(ids)
+            renames[name] = rename
+        else:
+            unresolved.append(name)
+    return renames, unresolved
+
+
+def approved(rename, approved_fuzzy=None):
+    """True if `rename` may be applied: not fuzzy, or a fuzzy proposal approved with the same target"""
+    if rename.method in AUTO_METHODS:
+        return True
+    return bool(approved_fuzzy) and approved_fuzzy.get(rename.old) == rename.new
+
+
+def apply_renames(conn, renames, by_name):
+    """Rewrite listing names in one transaction; returns the number of rows updated"""
+    rows = [(rename.new, listing_id, rename.old)
+            for rename in renames.values() for listing_id in by_name[rename.old]]
+    if not rows:
+        return 0
+    with conn:
+        # The old name in the WHERE clause skips listings edited since they were read
+        cursor = conn.executemany('UPDATE listings SET item = ? WHERE id = ? AND item = ?', rows)
+    return cursor.rowcount
+
+
+def reconcile(db_path, item_names, renamed=None, dry_run=False, approved_fuzzy=None):
+    """
+    Reconcile a marketplace database; returns (renames, unresolved, rows updated).
+
+    Fuzzy renames are only applied when `approved_fuzzy` ({old: new}, from a
+    reviewed item_renames.json) lists them; the rest stay proposals with
+    applied=False.
+    """
+    index = NameIndex(item_names)
+    conn = sqlite3.connect(db_path)
+    try:
+        by_name = listing_names(conn)
+        renames, unresolved = rename_map(index, by_name, renamed)
+        for rename in renames.values():
+            rename.applied = not dry_run and approved(rename, approved_fuzzy)
+        applied = {name: rename for name, rename in renames.items() if rename.applied}
+        updated = apply_renames(conn, applied, by_name) if applied else 0
+    finally:
+        conn.close()
+    return renames, unresolved, updated
+
+
+def write_renames(renames, unresolved, path):
+    """Applied renames, fuzzy proposals awaiting review and unresolved names, as JSON"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'renames': [asdict(rename) for rename in renames.values() if rename.method in AUTO_METHODS],
+                   'proposals': [asdict(rename) for rename in renames.values() if rename.method not in AUTO_METHODS],
+                   'unresolved': sorted(unresolved)}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_proposals(path):
+    """{old: new} of the fuzzy proposals left in a reviewed item_renames.json"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return {proposal['old']: proposal['new'] for proposal in json.load(f).get('proposals', [])}
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rename outdated item names in marketplace listings")
+    parser.add_argument('--db', default='/app/data/marketplace.db')
+    parser.add_argument('--items', default='/app/data/items.json')
+    parser.add_argument('--diff', help="items_diff.json whose renames take priority")
+    parser.add_argument('--output', help="write the rename map to this file")
+    parser.add_argument('--dry-run', action='store_true', help="report renames without updating listings")
+    parser.add_argument('--apply-fuzzy', metavar='RENAMES_JSON',
+                        help="also apply the fuzzy proposals left in this reviewed item_renames.json")
+    args = parser.parse_args(argv)
+
+    with open(args.items, 'r', encoding='utf-8') as f:
+        names = [item.get('Items') for item in json.load(f)]
+    renamed = None
+    if args.diff:
+        from .diff import load_diff
+        renamed = {pair['from']: pair['to'] for pair in load_diff(args.diff)['renamed']}
+
+    approved_fuzzy = load_proposals(args.apply_fuzzy) if args.apply_fuzzy else None
+
+    start = time.perf_counter()
+    renames, unresolved, updated = reconcile(args.db, names, renamed, args.dry_run, approved_fuzzy)
+    elapsed = time.perf_counter() - start
+    for rename in renames.values():
+        status = '' if approved(rename, approved_fuzzy) else ', proposed'
+        print(f"   {rename.old!r} -> {rename.new!r} "
+              f"({rename.method}, {rename.score}, {rename.listings} listings{status})")
+    for name in sorted(unresolved):
+        print(f"   ⚠️  no catalogue match for {name!r}")
+    if args.output:
+        write_renames(renames, unresolved, args.output)
+    action = "would update" if args.dry_run else "updated"
+    would_update = sum(r.listings for r in renames.values() if approved(r, approved_fuzzy))
+    print(f"{len(renames)} renames, {len(unresolved)} unresolved, {action} "
+          f"{would_update if args.dry_run else updated} listings in {elapsed:.3f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
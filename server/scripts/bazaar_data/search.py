@@ -0,0 +1,154 @@
+"""
+Full-text search indexes for items.db and marketplace.db.
+
+Both are FTS5 external-content tables with prefix indexes: items_fts over item
+names, episodes, professions and "Variant of" in items.db, and listings_fts
+over listing item, seller and notes in marketplace.db. Triggers on the content
+tables keep them in sync with every insert, update and delete, including the
+ones the Node server makes, so the refresh job only has to create them once.
+
+A search term becomes one prefix query per word ("pot str" matches
+"+80 Potion Strength Cryonae"); match_query() here and ftsQuery() in
+server.js build the same expression.
+
+    python3 -m bazaar_data.search --items-db /app/data/items.db --marketplace-db /app/data/marketplace.db
+"""
+
+import re
+import sqlite3
+import sys
+import time
+
+PREFIX_LENGTHS = '2 3 4'
+TOKENIZER = 'unicode61 remove_diacritics 2'
+WORD = re.compile(r'\w+')
+
+ITEMS_SEARCH_COLUMNS = ['Items', 'Episode', 'Profession A', 'Profession B', 'Variant of']
+LISTINGS_SEARCH_COLUMNS = ['item', 'seller', 'notes']
+
+
+def _quoted(columns, prefix=''):
+    return ', '.join(f'{prefix}"{column}"' for column in columns)
+
+
+def search_schema(table, key, columns, source=None):
+    """
+    CREATE statements for `table`_fts and the triggers that keep it in sync.
+    When `table` is a view over `source` (items over catalogue_items), the
+    triggers sit on `source` and read the indexed values back through the view.
+    """
+    fts = f'{table}_fts'
+    create = f'''CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {_quoted(columns)}, content='{table}', content_rowid='{key}',
+            prefix='{PREFIX_LENGTHS}', tokenize='{TOKENIZER}')'''
+    if source:
+        insert = (f'INSERT INTO {fts} (rowid, {_quoted(columns)}) '
+                  f'SELECT {key}, {_quoted(columns)} FROM {table} WHERE {key} = new.{key};')
+        delete = (f'INSERT INTO {fts} ({fts}, rowid, {_quoted(columns)}) '
+                  f"SELECT 'delete', {key}, {_quoted(columns)} FROM {table} WHERE {key} = old.{key};")
+        return [
+            create,
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {source} BEGIN {insert} END',
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_delete BEFORE DELETE ON {source} BEGIN {delete} END',
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_update_before BEFORE UPDATE ON {source} BEGIN {delete} END',
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE ON {source} BEGIN {insert} END',
+        ]
+    return [
+        create,
+        f'''CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts} (rowid, {_quoted(columns)}) VALUES (new.{key}, {_quoted(columns, 'new.')});
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {_quoted(columns)}) VALUES ('delete', old.{key}, {_quoted(columns, 'old.')});
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {_quoted(columns)} ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {_quoted(columns)}) VALUES ('delete', old.{key}, {_quoted(columns, 'old.')});
+            INSERT INTO {fts} (rowid, {_quoted(columns)}) VALUES (new.{key}, {_quoted(columns, 'new.')});
+        END''',
+    ]
+
+
+def _table_exists(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+
+def drop_search_index(conn, table):
+    fts = f'{table}_fts'
+    for trigger in ('insert', 'delete', 'update', 'update_before'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {fts}_{trigger}')
+    conn.execute(f'DROP TABLE IF EXISTS {fts}')
+
+
+def ensure_search_index(conn, table, key, columns, rebuild=False, source=None):
+    """
+    Create `table`_fts and its triggers if missing and fill it from `table`.
+    Columns the table does not have (older marketplace.db files without
+    notes) are left out. Returns True if the index was (re)built.
+    """
+    present = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+    columns = [column for column in columns if column in present]
+    if rebuild:
+        drop_search_index(conn, table)
+    elif _table_exists(conn, f'{table}_fts'):
+        return False
+    for statement in search_schema(table, key, columns, source):
+        conn.execute(statement)
+    conn.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+    return True
+
+
+def ensure_items_search(conn, rebuild=False):
+    # items is a view over catalogue_items in normalized databases (see persist.py)
+    source = 'catalogue_items' if _table_exists(conn, 'catalogue_items') else None
+    return ensure_search_index(conn, 'items', 'id', ITEMS_SEARCH_COLUMNS, rebuild, source)
+
+
+def ensure_listings_search(conn, rebuild=False):
+    return ensure_search_index(conn, 'listings', 'id', LISTINGS_SEARCH_COLUMNS, rebuild)
+
+
+def match_query(term, column=None):
+    """FTS5 MATCH expression for a user search term (None if it has no words)"""
+    words = WORD.findall(str(term))
+    if not words:
+        return None
+    expression = ' '.join(f'"{word}"*' for word in words)
+    return f'{{{column}}} : ({expression})' if column else expression
+
+
+def search_listings(conn, term, column='item', limit=50):
+    """Newest listings whose `column` matches `term`"""
+    return conn.execute(f'''
+        SELECT * FROM listings WHERE id IN (SELECT rowid FROM listings_fts WHERE listings_fts MATCH ?)
+        ORDER BY timestamp DESC LIMIT ?
+    ''', (match_query(term, column), limit)).fetchall()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the FTS5 search indexes")
+    parser.add_argument('--items-db', help="items.db to index")
+    parser.add_argument('--marketplace-db', help="marketplace.db to index")
+    parser.add_argument('--rebuild', action='store_true', help="drop and rebuild existing indexes")
+    args = parser.parse_args(argv)
+    if not args.items_db and not args.marketplace_db:
+        parser.error("pass --items-db and/or --marketplace-db")
+
+    for path, ensure in ((args.items_db, ensure_items_search), (args.marketplace_db, ensure_listings_search)):
+        if not path:
+            continue
+        start = time.perf_counter()
+        conn = sqlite3.connect(path)
+        try:
+            with conn:
+                built = ensure(conn, args.rebuild)
+        finally:
+            conn.close()
+        state = f"built in {time.perf_counter() - start:.3f}s" if built else "already present"
+        print(f"✅ Search index for {path} {state}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
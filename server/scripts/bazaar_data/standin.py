@@ -0,0 +1,269 @@
+"""
+Local stand-in for the Brighter Shores Wiki Special:Ask CSV export.
+
+Serves catalogue rows with the same offset/limit paging as the real wiki, and
+placeholder PNGs for Special:Redirect/file, so the fetch and image stages can
+be exercised without touching brightershoreswiki.org.
+
+The catalogue is either an items.json turned back into raw rows, or a
+synthetic one of any size: SyntheticCatalogue derives each row from its
+index, so a million-item catalogue costs no memory. Every response can be
+delayed (latency plus uniform jitter) and a fraction of requests answered
+with 429/5xx instead, to exercise retries. Counts per status are kept in
+server.stats.
+
+    python3 -m bazaar_data.standin --items ../data/items.json --port 8089
+    python3 -m bazaar_data.standin --synthetic 100000 --latency 0.05 --error-rate 0.02
+    python3 -m bazaar_data.fetch --base-url http://127.0.0.1:8089
+"""
+
+import csv
+import hashlib
+import io
+import json
+import random
+import re
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+CSV_HEADER = ['', 'Image', 'Episode', 'Variant of', 'Profession A', 'Profession Level A',
+              'Profession B', 'Profession Level B', 'Tradeable']
+
+_PAGING_RE = re.compile(r'/offset%3D(\d+)/limit%3D(\d+)/')
+_REDIRECT_PREFIXES = ('/w/Special:Redirect/file/', '/wiki/Special:Redirect/file/')
+
+# Status codes a faulty response is drawn from (all retried by fetch and sync)
+FAULT_STATUS_CODES = (429, 500, 502, 503)
+
+# Vocabulary for synthetic items, shaped like the real catalogue
+EPISODES = ['Hopeport', 'Hopeforest', 'Mine of Mantuban', 'Crenopolis', 'Stonemaw Hill', 'Bleakholm Crags']
+PROFESSIONS = ['Woodcutter', 'Carpenter', 'Delver', 'Alchemist', 'Chef', 'Merchant', 'Fisher', 'Forager',
+               'Gatherer', 'Scout', 'Bonewright', 'Blacksmith', 'Stonemason', 'Minefighter', 'Watchperson']
+QUALITIES = ['Fine', 'Sturdy', 'Perfect', 'Rough', 'Polished', 'Raw', 'Cooked', 'Enchanted', 'Ancient', 'Gilded']
+MATERIALS = ['Hickory', 'Willow', 'Oak', 'Copper', 'Iron', 'Silver', 'Limestone', 'Granite', 'Mackerel',
+             'Hogberries', 'Orchid', 'Beetle', 'Cryonae', 'Arborae', 'Tempestae', 'Infernae', 'Necromae']
+THINGS = ['Branches', 'Planks', 'Ore', 'Bar', 'Block', 'Fillet', 'Pie', 'Potion', 'Shard', 'Charm', 'Dust',
+          'Hide', 'Gear', 'Ring']
+
+
+def placeholder_png(width=32, height=32, rgb=(128, 128, 128)):
+    """A valid solid-colour PNG"""
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data
+                + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    raw = b''.join(b'\x00' + bytes(rgb) * width for _ in range(height))
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw))
+            + chunk(b'IEND', b''))
+
+
+PLACEHOLDER_PNG = placeholder_png()
+
+
+def rows_from_items_json(path):
+    """Turn a cleaned items.json back into raw Special:Ask CSV rows"""
+    with open(path, 'r', encoding='utf-8') as f:
+        items = json.load(f)
+
+    def raw(value):
+        return '' if value in (None, 'None', 'unknown') else str(value)
+
+    rows = []
+    for item in items:
+        image = item.get('Image') or ''
+        if image:
+            image = 'File:' + image.rsplit('/', 1)[-1].replace('_', ' ')
+        tradeable = item.get('Tradeable')
+        rows.append([
+            item.get('Items', ''),
+            image,
+            raw(item.get('Episode')),
+            raw(item.get('Variant of')),
+            raw(item.get('Profession A')),
+            raw(item.get('Profession Level A')),
+            raw(item.get('Profession B')),
+            raw(item.get('Profession Level B')),
+            'true' if tradeable is True else raw(tradeable),
+        ])
+    return rows
+
+
+class SyntheticCatalogue:
+    """
+    `count` raw catalogue rows, each generated from its index on access.
+
+    Supports len() and slicing like the list rows_from_items_json returns;
+    names are unique and the same (count, seed) always gives the same rows.
+    """
+
+    def __init__(self, count, seed=0):
+        self.count = count
+        self.seed = seed
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.row(n) for n in range(*index.indices(self.count))]
+        if not -self.count <= index < self.count:
+            raise IndexError(index)
+        return self.row(index % self.count)
+
+    def row(self, n):
+        rng = random.Random(self.seed * 1_000_003 + n)
+        thing = rng.choice(THINGS)
+        name = f"{rng.choice(QUALITIES)} {rng.choice(MATERIALS)} {thing} {n}"
+        profession_a = rng.choice(PROFESSIONS)
+        has_b = rng.random() < 0.6
+        return [
+            name,
+            f"File:{name}.png" if rng.random() < 0.98 else '',
+            rng.choice(EPISODES),
+            f"{rng.choice(MATERIALS)} {thing}" if rng.random() < 0.2 else '',
+            profession_a,
+            str(rng.randint(1, 500)) if rng.random() < 0.95 else '',
+            rng.choice(PROFESSIONS) if has_b else '',
+            str(rng.randint(1, 500)) if has_b else '',
+            rng.choice(['true', 'true', 'true', 'false', '']),
+        ]
+
+
+def placeholder_for(filename):
+    """A small PNG whose colour depends on the file name, so images differ"""
+    digest = hashlib.sha1(filename.encode('utf-8')).digest()
+    return placeholder_png(rgb=tuple(digest[:3]))
+
+
+def render_page(rows, offset, limit):
+    """Render one page of rows as CSV bytes, header included"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(CSV_HEADER)
+    writer.writerows(rows[offset:offset + limit])
+    return buffer.getvalue().encode('utf-8')
+
+
+def wiki_files(rows):
+    """File names the rows' Image column links to, spelled the way Special:Redirect/file URLs are"""
+    return {row[1].removeprefix('File:').replace(' ', '_') for row in rows if row[1]}
+
+
+def make_handler(rows, latency=0.0, jitter=0.0, error_rate=0.0, seed=0, stats=None, strict_images=False):
+    """
+    Request handler class serving `rows`. Each response waits `latency` plus
+    up to `jitter` seconds; `error_rate` of requests get a FAULT_STATUS_CODES
+    answer instead. Statuses are counted in `stats` (a Counter). With
+    `strict_images`, only files the rows' Image column names are served and
+    any other file is a 404, as on the wiki.
+    """
+    faults = random.Random(seed)
+    files = wiki_files(rows) if strict_images else None
+    lock = threading.Lock()
+    stats = stats if stats is not None else Counter()
+
+    class StandinHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out in one write; separate small writes on a
+        # keep-alive connection stall on delayed ACKs (~40ms per response)
+        wbufsize = 1 << 16
+
+        def do_GET(self):
+            with lock:
+                delay = latency + faults.uniform(0, jitter) if latency or jitter else 0
+                fault = faults.choice(FAULT_STATUS_CODES) if faults.random() < error_rate else None
+            if delay:
+                time.sleep(delay)
+            if fault:
+                self.send_body(b'', 'text/plain', status=fault)
+                return
+            if self.path.startswith(_REDIRECT_PREFIXES):
+                filename = unquote(self.path.split('/file/', 1)[1].split('?', 1)[0])
+                if files is not None and filename.replace(' ', '_') not in files:
+                    stats[404] += 1
+                    self.send_error(404)
+                    return
+                self.send_body(placeholder_for(filename), 'image/png')
+                return
+            match = _PAGING_RE.search(self.path)
+            if not self.path.startswith('/w/Special:Ask/') or not match:
+                stats[404] += 1
+                self.send_error(404)
+                return
+            offset, limit = int(match.group(1)), int(match.group(2))
+            body = render_page(rows, offset, limit)
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            if self.headers.get('If-None-Match') == etag:
+                self.send_body(b'', None, etag, status=304)
+                return
+            self.send_body(body, 'text/csv; charset=UTF-8', etag)
+
+        def send_body(self, body, content_type, etag=None, status=200):
+            stats[status] += 1
+            self.send_response(status)
+            if content_type:
+                self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            if etag:
+                self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StandinHandler
+
+
+def start_standin(rows, host='127.0.0.1', port=0, **faults):
+    """
+    Start the stand-in on a background thread; returns (server, base_url).
+    `faults` are make_handler's latency/jitter/error_rate/seed/strict_images options.
+    """
+    stats = Counter()
+    server = ThreadingHTTPServer((host, port), make_handler(rows, stats=stats, **faults))
+    server.daemon_threads = True
+    server.stats = stats
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve canned Special:Ask CSV pages locally")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--items', help="items.json to serve as the catalogue")
+    source.add_argument('--synthetic', type=int, metavar='COUNT', help="serve COUNT generated items instead")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="up to this many extra seconds, uniformly")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with 429/5xx")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rows = rows_from_items_json(args.items) if args.items else SyntheticCatalogue(args.synthetic, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port),
+                                 make_handler(rows, args.latency, args.jitter, args.error_rate, args.seed))
+    print(f"Serving {len(rows)} items at http://{args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Persistent state for incremental scrapes.
+
+Keeps a content hash and HTTP validators (ETag/Last-Modified) per catalogue
+page, plus the per-item hash index of the last published catalogue. Page
+bodies are cached so a 304 answer can reuse the previous copy.
+"""
+
+import hashlib
+import json
+import os
+
+STATE_PATH = '/app/data/scrape_state.json'
+CACHE_DIR = '/app/data/scrape_cache'
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def empty_state():
+    return {'pages': {}, 'items': {}}
+
+
+def load_state(path=STATE_PATH):
+    """Load the scrape state, or an empty one if missing or unreadable"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return empty_state()
+    for key, value in empty_state().items():
+        state.setdefault(key, value)
+    return state
+
+
+def save_state(state, path=STATE_PATH):
+    """Write the scrape state atomically"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def _cache_path(cache_dir, offset):
+    return os.path.join(cache_dir, f"page-{offset}.csv")
+
+
+def cached_pages(state, cache_dir=CACHE_DIR):
+    """Previous pages keyed by offset, in the form fetch_pages(cache=...) expects"""
+    cache = {}
+    for offset, meta in state['pages'].items():
+        try:
+            with open(_cache_path(cache_dir, offset), 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            continue
+        if content_hash(content) != meta.get('sha256'):
+            continue
+        cache[int(offset)] = dict(meta, content=content)
+    return cache
+
+
+def record_pages(state, pages, cache_dir=CACHE_DIR):
+    """
+    Store validators and hashes for freshly fetched pages and cache their bodies.
+
+    Returns True if the catalogue content differs from the previous run.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    previous = state['pages']
+    current = {}
+    changed = set(previous) != {str(page.offset) for page in pages}
+    for page in pages:
+        key = str(page.offset)
+        digest = content_hash(page.content)
+        path = _cache_path(cache_dir, page.offset)
+        page_changed = previous.get(key, {}).get('sha256') != digest
+        changed = changed or page_changed
+        if page_changed or not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(page.content)
+        current[key] = {
+            'url': page.url,
+            'etag': page.etag,
+            'last_modified': page.last_modified,
+            'sha256': digest,
+            'rows': page.rows,
+        }
+    for key in set(previous) - set(current):
+        try:
+            os.remove(_cache_path(cache_dir, key))
+        except FileNotFoundError:
+            pass
+    state['pages'] = current
+    return changed
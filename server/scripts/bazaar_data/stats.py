@@ -0,0 +1,228 @@
+"""
+Per-item market statistics, precomputed into marketplace.db.
+
+/api/market-stats/:itemName reads one row of the item_stats table instead of
+aggregating every listing of the item on each request. A full rebuild reads
+the listings once and aggregates them with pandas. The incremental mode only
+recomputes items with listings newer than the last run, plus items whose
+listing count changed (deleted or renamed listings), using the
+(item, timestamp) index. With lean=True (the lean scrape) the same numbers
+are computed in plain Python, without importing pandas.
+
+    python3 -m bazaar_data.stats --db /app/data/marketplace.db [--incremental] [--lean]
+"""
+
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+MARKETPLACE_DB_PATH = '/app/data/marketplace.db'
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+CREATE_STATS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS item_stats (
+        item TEXT PRIMARY KEY,
+        total_listings INTEGER NOT NULL,
+        buy_listings INTEGER NOT NULL,
+        sell_listings INTEGER NOT NULL,
+        average_price INTEGER,
+        median_price INTEGER,
+        p10_price INTEGER,
+        p25_price INTEGER,
+        p75_price INTEGER,
+        p90_price INTEGER,
+        lowest_sell_price INTEGER,
+        highest_buy_price INTEGER,
+        total_quantity INTEGER NOT NULL,
+        last_listing_at INTEGER,
+        updated_at INTEGER NOT NULL
+    ) WITHOUT ROWID
+'''
+CREATE_STATE_TABLE = 'CREATE TABLE IF NOT EXISTS item_stats_state (key TEXT PRIMARY KEY, value INTEGER)'
+LISTINGS_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_listings_item_timestamp ON listings(item, timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_listings_timestamp ON listings(timestamp)',
+]
+STATS_FIELDS = ['item', 'total_listings', 'buy_listings', 'sell_listings', 'average_price', 'median_price',
+                'p10_price', 'p25_price', 'p75_price', 'p90_price', 'lowest_sell_price', 'highest_buy_price',
+                'total_quantity', 'last_listing_at', 'updated_at']
+UPSERT_STATS = (f"INSERT OR REPLACE INTO item_stats ({', '.join(STATS_FIELDS)}) "
+                f"VALUES ({', '.join('?' * len(STATS_FIELDS))})")
+
+
+def ensure_schema(conn):
+    conn.execute(CREATE_STATS_TABLE)
+    conn.execute(CREATE_STATE_TABLE)
+    for statement in LISTINGS_INDEXES:
+        conn.execute(statement)
+
+
+def compute_stats(listings, updated_at):
+    """item_stats rows for a DataFrame of item/type/price/quantity/timestamp"""
+    import pandas as pd
+
+    if listings.empty:
+        return []
+    is_buy = listings['type'] == 'buy'
+    is_sell = listings['type'] == 'sell'
+    grouped = listings.assign(
+        is_buy=is_buy, is_sell=is_sell,
+        buy_price=listings['price'].where(is_buy), sell_price=listings['price'].where(is_sell),
+    ).groupby('item')
+    stats = grouped.agg(
+        total_listings=('price', 'size'),
+        buy_listings=('is_buy', 'sum'),
+        sell_listings=('is_sell', 'sum'),
+        average_price=('price', 'mean'),
+        lowest_sell_price=('sell_price', 'min'),
+        highest_buy_price=('buy_price', 'max'),
+        total_quantity=('quantity', 'sum'),
+        last_listing_at=('timestamp', 'max'),
+    )
+    stats['average_price'] = stats['average_price'].round()
+    quantiles = grouped['price'].quantile([p / 100 for p in PERCENTILES]).unstack()
+    for p in PERCENTILES:
+        stats['median_price' if p == 50 else f'p{p}_price'] = quantiles[p / 100].round()
+    stats['updated_at'] = updated_at
+    stats = stats.reset_index()[STATS_FIELDS]
+
+    # Plain Python ints and None for sqlite3
+    return [tuple(None if pd.isna(value) else (value if isinstance(value, str) else int(value)) for value in row)
+            for row in stats.itertuples(index=False, name=None)]
+
+
+def quantile(values, q):
+    """Linear-interpolated quantile of sorted values, computed as pandas' groupby quantile does"""
+    position = q * (len(values) - 1)
+    index = int(position)
+    fraction = position % 1
+    if fraction == 0.0:
+        return values[index]
+    return values[index] + (values[index + 1] - values[index]) * fraction
+
+
+def compute_stats_rows(listings, updated_at):
+    """compute_stats for (item, type, price, quantity, timestamp) tuples, without pandas"""
+    groups = {}
+    for listing in listings:
+        if listing[0] is not None:
+            groups.setdefault(listing[0], []).append(listing)
+    rows = []
+    for item in sorted(groups):
+        listings = groups[item]
+        prices = sorted(float(price) for _, _, price, _, _ in listings if price is not None)
+        sell_prices = [price for _, kind, price, _, _ in listings if kind == 'sell' and price is not None]
+        buy_prices = [price for _, kind, price, _, _ in listings if kind == 'buy' and price is not None]
+        timestamps = [timestamp for *_, timestamp in listings if timestamp is not None]
+        percentiles = {p: round(quantile(prices, p / 100)) if prices else None for p in PERCENTILES}
+        rows.append((
+            item, len(listings),
+            sum(kind == 'buy' for _, kind, _, _, _ in listings),
+            sum(kind == 'sell' for _, kind, _, _, _ in listings),
+            round(sum(prices) / len(prices)) if prices else None,
+            percentiles[50], percentiles[10], percentiles[25], percentiles[75], percentiles[90],
+            int(min(sell_prices)) if sell_prices else None,
+            int(max(buy_prices)) if buy_prices else None,
+            int(sum(quantity for _, _, _, quantity, _ in listings if quantity is not None)),
+            int(max(timestamps)) if timestamps else None,
+            updated_at,
+        ))
+    return rows
+
+
+def read_listing_rows(conn, items=None):
+    """read_listings as a list of tuples"""
+    query = 'SELECT item, type, price, quantity, timestamp FROM listings'
+    if items is None:
+        return conn.execute(query).fetchall()
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS stale_items (item TEXT PRIMARY KEY)')
+    conn.execute('DELETE FROM stale_items')
+    conn.executemany('INSERT OR IGNORE INTO stale_items VALUES (?)', ((item,) for item in items))
+    return conn.execute(f'{query} WHERE item IN (SELECT item FROM stale_items)').fetchall()
+
+
+def read_listings(conn, items=None):
+    """Listing columns the statistics need, for all items or the given ones"""
+    import pandas as pd
+
+    query = 'SELECT item, type, price, quantity, timestamp FROM listings'
+    if items is None:
+        return pd.read_sql_query(query, conn)
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS stale_items (item TEXT PRIMARY KEY)')
+    conn.execute('DELETE FROM stale_items')
+    conn.executemany('INSERT OR IGNORE INTO stale_items VALUES (?)', ((item,) for item in items))
+    return pd.read_sql_query(f'{query} WHERE item IN (SELECT item FROM stale_items)', conn)
+
+
+def stale_items(conn, since):
+    """Items with listings changed since `since`, or whose listing count no longer matches"""
+    changed = {item for (item,) in conn.execute(
+        'SELECT DISTINCT item FROM listings WHERE timestamp > ?', (since,))}
+    counts = dict(conn.execute('SELECT item, COUNT(*) FROM listings GROUP BY item'))
+    stored = dict(conn.execute('SELECT item, total_listings FROM item_stats'))
+    changed.update(item for item, count in counts.items() if stored.get(item) != count)
+    removed = set(stored) - set(counts)
+    return changed, removed
+
+
+def refresh_stats(db_path=MARKETPLACE_DB_PATH, incremental=False, lean=False):
+    """Rebuild (or incrementally refresh) item_stats; returns (items written, items removed)"""
+    now = int(time.time() * 1000)
+    compute, read = (compute_stats_rows, read_listing_rows) if lean else (compute_stats, read_listings)
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            ensure_schema(conn)
+        # One read transaction so the watermark matches the listings we aggregate
+        conn.execute('BEGIN')
+        watermark = conn.execute('SELECT COALESCE(MAX(timestamp), 0) FROM listings').fetchone()[0]
+        last_run = conn.execute("SELECT value FROM item_stats_state WHERE key = 'watermark'").fetchone()
+        if incremental and last_run is not None:
+            items, removed = stale_items(conn, last_run[0])
+            rows = compute(read(conn, items), now) if items else []
+        else:
+            items, removed = None, set()
+            rows = compute(read(conn), now)
+        conn.commit()
+        if items is not None and not items and not removed and last_run[0] == watermark:
+            # Nothing to write: leave the file untouched so backups can tell it has not changed
+            return 0, 0
+
+        with conn:
+            if items is None:
+                conn.execute('DELETE FROM item_stats')
+            conn.executemany('DELETE FROM item_stats WHERE item = ?', ((item,) for item in removed))
+            conn.executemany(UPSERT_STATS, rows)
+            conn.execute("INSERT OR REPLACE INTO item_stats_state (key, value) VALUES ('watermark', ?)",
+                         (watermark,))
+    finally:
+        conn.close()
+    return len(rows), len(removed)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Refresh the item_stats table in marketplace.db")
+    parser.add_argument('--db', default=MARKETPLACE_DB_PATH)
+    parser.add_argument('--incremental', action='store_true',
+                        help="only recompute items whose listings changed since the last run")
+    parser.add_argument('--lean', action='store_true', help="aggregate in plain Python instead of pandas")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        written, removed = refresh_stats(args.db, args.incremental, args.lean)
+    except sqlite3.Error as e:
+        print(f"[{datetime.now()}] ❌ Error refreshing item stats: {e}")
+        return 1
+    mode = "incremental" if args.incremental else "full"
+    print(f"[{datetime.now()}] ✅ item_stats {mode} refresh: {written} items written, {removed} removed "
+          f"in {time.perf_counter() - start:.3f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Content-addressed store for item images.
+
+Each distinct image is kept once under its SHA-256 (<root>/ab/abcd....png) and
+the public, build and nginx asset paths are hardlinks to that blob. Variants
+that share art take the space of one file, and renaming an item is a link
+operation instead of a read-and-write copy. Where a hardlink is not possible
+(different filesystem) the blob is copied instead.
+
+The store sits next to the other data files, outside the web root, so its
+blobs are never served under their hash names.
+
+Deduplicate existing image directories into a store:
+
+    python3 -m bazaar_data.store --store /tmp/store dir1 dir2
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import threading
+
+STORE_DIR = os.environ.get('IMAGE_STORE', '/app/data/image_store')
+
+
+class ImageStore:
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+
+    def blob_path(self, sha256, suffix='.png'):
+        return os.path.join(self.root, sha256[:2], sha256 + suffix)
+
+    def _suffix(self, path):
+        return os.path.splitext(path)[1] or '.png'
+
+    def put_bytes(self, content, suffix='.png'):
+        """Store `content` once; returns its SHA-256"""
+        sha256 = hashlib.sha256(content).hexdigest()
+        blob = self.blob_path(sha256, suffix)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            tmp_path = _tmp_path(blob)
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, blob)
+        return sha256
+
+    def put_file(self, path, sha256=None):
+        """
+        Adopt an existing file into the store without copying it when possible.
+
+        `sha256` may be passed from the image manifest to skip rehashing.
+        Returns the SHA-256.
+        """
+        if sha256 is None:
+            from .manifest import file_hash
+            sha256 = file_hash(path)
+        blob = self.blob_path(sha256, self._suffix(path))
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            _link_or_copy(path, blob)
+        return sha256
+
+    def materialize(self, sha256, path):
+        """Atomically point `path` at the blob; returns True if a hardlink was used"""
+        blob = self.blob_path(sha256, self._suffix(path))
+        if _same_file(blob, path):
+            return True
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return _link_or_copy(blob, path)
+
+    def link(self, source, path, sha256=None):
+        """Make `path` the same image as `source` (e.g. after an item rename)"""
+        return self.materialize(self.put_file(source, sha256), path)
+
+    def dedupe(self, files, directory):
+        """
+        Replace every file in `directory` with a link to its blob.
+
+        `files` is the image manifest mapping for the directory; entries are
+        updated in place so the next scan does not rehash relinked files.
+        Returns the number of files relinked.
+        """
+        relinked = 0
+        for name, entry in files.items():
+            path = os.path.join(directory, name)
+            sha256 = self.put_file(path, entry['sha256'])
+            blob = self.blob_path(sha256, self._suffix(path))
+            if _same_file(blob, path):
+                continue
+            self.materialize(sha256, path)
+            entry['mtime_ns'] = os.stat(path).st_mtime_ns
+            relinked += 1
+        return relinked
+
+    def blobs(self):
+        """Yield (path, stat) for every stored blob"""
+        if not os.path.isdir(self.root):
+            return
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.is_file() and not entry.name.endswith('.part'):
+                    yield entry.path, entry.stat()
+
+    def prune(self):
+        """Remove blobs no asset path links to any more; returns the number removed"""
+        removed = 0
+        for path, stat in self.blobs():
+            if stat.st_nlink == 1:
+                os.remove(path)
+                removed += 1
+        return removed
+
+
+def _same_file(a, b):
+    try:
+        return os.path.samefile(a, b)
+    except FileNotFoundError:
+        return False
+
+
+def _tmp_path(path):
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+
+
+def _link_or_copy(source, target):
+    """
+    Atomically make `target` a hardlink of `source`, falling back to a copy
+    across filesystems. Returns True if a hardlink was used.
+    """
+    tmp_path = _tmp_path(target)
+    try:
+        os.link(source, tmp_path)
+        linked = True
+    except OSError:
+        shutil.copy2(source, tmp_path)
+        linked = False
+    os.replace(tmp_path, target)
+    return linked
+
+
+def main(argv=None):
+    import argparse
+
+    from .manifest import MANIFEST_PATH, load_manifest, save_manifest, scan
+
+    parser = argparse.ArgumentParser(description="Deduplicate image directories into a content-addressed store")
+    parser.add_argument('directories', nargs='+', help="image directories to link into the store")
+    parser.add_argument('--store', default=STORE_DIR)
+    parser.add_argument('--manifest', default=MANIFEST_PATH)
+    parser.add_argument('--prune', action='store_true', help="remove blobs nothing links to")
+    args = parser.parse_args(argv)
+
+    store = ImageStore(args.store)
+    manifest = load_manifest(args.manifest)
+    for directory in args.directories:
+        files = scan(manifest, directory)
+        relinked = store.dedupe(files, directory)
+        print(f"🔗 {directory}: {relinked} of {len(files)} images relinked")
+    save_manifest(manifest, args.manifest)
+
+    if args.prune:
+        print(f"🧹 Pruned {store.prune()} unreferenced blobs")
+    blobs = list(store.blobs())
+    total = sum(stat.st_size for _, stat in blobs)
+    print(f"📦 Store {args.store}: {len(blobs)} unique images, {total / 1024 / 1024:.1f} MiB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
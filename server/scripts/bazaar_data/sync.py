@@ -0,0 +1,217 @@
+"""
+Image sync engine for item images on the Brighter Shores Wiki.
+
+Downloads Special:Redirect/file images through a bounded worker pool sharing
+one keep-alive session. A token bucket caps the request rate so we stay polite
+to the wiki, and transient failures are retried with jittered backoff.
+
+Offline check against placeholder PNGs served by the local stand-in:
+
+    python3 -m bazaar_data.sync --offline --dest /tmp/items Fire_Beetle.png Copper_Ore.png
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from urllib.parse import quote
+
+import requests
+
+from .fetch import RETRY_STATUS_CODES, WIKI_BASE_URL, backoff_delay, make_session
+
+MAX_WORKERS = 4
+# Requests each worker may make per second; the shared bucket allows MAX_WORKERS times that
+WORKER_REQUESTS_PER_SECOND = 5.0
+REQUESTS_PER_SECOND = float(os.environ.get('IMAGE_SYNC_RATE', MAX_WORKERS * WORKER_REQUESTS_PER_SECOND))
+MAX_RETRIES = 3
+BACKOFF_SECONDS = 0.5
+REQUEST_TIMEOUT = 10
+
+
+@dataclass
+class ImageJob:
+    name: str
+    filename: str
+    destinations: list = field(default_factory=list)
+
+
+@dataclass
+class ImageResult:
+    job: ImageJob
+    ok: bool
+    status: int = None
+    size: int = 0
+    attempts: int = 0
+    error: str = None
+    sha256: str = None
+    # Status code (or exception name) of every attempt, retries included
+    statuses: list = field(default_factory=list)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_for = (1 - self._tokens) / self.rate
+            time.sleep(wait_for)
+
+
+def redirect_url(filename, base_url=WIKI_BASE_URL):
+    """Special:Redirect/file URL for a wiki image file name"""
+    return f"{base_url.rstrip('/')}/w/Special:Redirect/file/{quote(filename)}"
+
+
+def write_atomic(path, content):
+    """Write bytes so that readers (nginx) never see a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.part"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def download_job(session, job, bucket, base_url=WIKI_BASE_URL, retries=MAX_RETRIES,
+                 backoff=BACKOFF_SECONDS, timeout=REQUEST_TIMEOUT, store=None):
+    """
+    Download one image and write it to every destination.
+
+    With an ImageStore the bytes are stored once and each destination becomes
+    a hardlink to the stored blob.
+    """
+    url = redirect_url(job.filename, base_url)
+    result = ImageResult(job=job, ok=False)
+    for attempt in range(1, retries + 2):
+        result.attempts = attempt
+        bucket.acquire()
+        try:
+            response = session.get(url, timeout=timeout)
+            result.status = response.status_code
+            result.statuses.append(response.status_code)
+            if response.status_code == 200:
+                if store is not None:
+                    result.sha256 = store.put_bytes(response.content)
+                    for path in job.destinations:
+                        store.materialize(result.sha256, path)
+                else:
+                    for path in job.destinations:
+                        write_atomic(path, response.content)
+                result.ok = True
+                result.size = len(response.content)
+                result.error = None
+                return result
+            result.error = f"HTTP {response.status_code}"
+            if response.status_code not in RETRY_STATUS_CODES:
+                return result
+        except (requests.RequestException, OSError) as e:
+            result.statuses.append(type(e).__name__)
+            result.error = str(e)
+        if attempt <= retries:
+            time.sleep(backoff_delay(attempt, backoff))
+    return result
+
+
+def sync_images(jobs, base_url=WIKI_BASE_URL, workers=MAX_WORKERS, rate=REQUESTS_PER_SECOND,
+                progress_every=25, session=None, on_result=None, **download_options):
+    """
+    Download all jobs concurrently; returns (results, elapsed seconds).
+    `on_result` is called with each ImageResult as soon as it finishes.
+    """
+    own_session = session is None
+    if own_session:
+        session = make_session(workers)
+    bucket = TokenBucket(rate)
+    results = []
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(download_job, session, job, bucket, base_url, **download_options)
+                       for job in jobs]
+            for done, future in enumerate(as_completed(futures), start=1):
+                results.append(future.result())
+                if on_result is not None:
+                    on_result(results[-1])
+                if progress_every and done % progress_every == 0:
+                    rate_so_far = done / (time.perf_counter() - start)
+                    print(f"   Progress: {done}/{len(jobs)} ({rate_so_far:.1f} images/s)")
+    finally:
+        if own_session:
+            session.close()
+    return results, time.perf_counter() - start
+
+
+def report_results(results, elapsed):
+    """Print a download/throughput summary and return the number downloaded"""
+    downloaded = [r for r in results if r.ok]
+    failed = [r for r in results if not r.ok]
+    total_bytes = sum(r.size for r in downloaded)
+    retries = sum(r.attempts - 1 for r in results)
+    print(f"✅ Downloaded {len(downloaded)}/{len(results)} images "
+          f"({total_bytes / 1024:.0f} KiB) in {elapsed:.1f}s")
+    if elapsed > 0 and results:
+        print(f"   Throughput: {len(results) / elapsed:.1f} images/s, "
+              f"{total_bytes / 1024 / elapsed:.0f} KiB/s, {retries} retries")
+    for r in failed[:10]:
+        print(f"   ❌ {r.job.name} ({r.job.filename}): {r.error}")
+    if len(failed) > 10:
+        print(f"   ... and {len(failed) - 10} more failures")
+    return len(downloaded)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Download wiki images for the given file names")
+    parser.add_argument('filenames', nargs='+', help="wiki file names, e.g. Fire_Beetle.png")
+    parser.add_argument('--dest', required=True, help="directory to write images to")
+    parser.add_argument('--base-url', default=WIKI_BASE_URL)
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--rate', type=float, default=REQUESTS_PER_SECOND,
+                        help="max requests per second (0 for unlimited, default: IMAGE_SYNC_RATE "
+                             "or 5 per worker)")
+    parser.add_argument('--store', help="content-addressed image store to link destinations to")
+    parser.add_argument('--offline', action='store_true',
+                        help="serve placeholder PNGs from a local stand-in instead of the wiki")
+    args = parser.parse_args(argv)
+
+    server = None
+    results = []
+    base_url = args.base_url
+    if args.offline:
+        from .standin import start_standin
+        server, base_url = start_standin([])
+    try:
+        jobs = [ImageJob(name, name, [os.path.join(args.dest, name)]) for name in args.filenames]
+        store = None
+        if args.store:
+            from .store import ImageStore
+            store = ImageStore(args.store)
+        results, elapsed = sync_images(jobs, base_url, args.workers, args.rate, store=store)
+        report_results(results, elapsed)
+    finally:
+        if server:
+            server.shutdown()
+    return 0 if results and all(r.ok for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Compare the compact catalogue artifact against items.json.
+
+Reports file size (plain and gzipped), parse time, and the cost of finding
+one item: scanning the parsed items.json list versus probing the artifact's
+hash table. When node is on the PATH it also times what GET
+/api/items/:itemName costs per request before (read + parse items.json + find)
+and after (server/catalogue.js: version check + hash lookup).
+
+    cd server/scripts && python3 -m benchmarks.catalogue --items ../data/items.json
+"""
+
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from bazaar_data.catalogue import decode, load_catalogue, lookup, write_catalogue
+
+ITEMS_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'items.json')
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+NODE_SCRIPT = r'''
+const fs = require('fs');
+const path = require('path');
+const [serverDir, itemsPath, dataDir, repeat] = [process.argv[1], process.argv[2], process.argv[3], Number(process.argv[4])];
+function best(fn, loops = 1) {
+  let best = Infinity;
+  for (let i = 0; i < repeat; i++) {
+    const start = process.hrtime.bigint();
+    for (let j = 0; j < loops; j++) fn(j);
+    best = Math.min(best, Number(process.hrtime.bigint() - start) / 1e6 / loops);
+  }
+  return best;
+}
+const { loadCatalogue } = require(path.join(serverDir, 'catalogue.js'));
+const cataloguePath = path.join(dataDir, 'items.catalogue.json');
+const names = JSON.parse(fs.readFileSync(itemsPath, 'utf8')).map(item => item.Items);
+console.log(JSON.stringify({
+  parse_items_json_ms: best(() => JSON.parse(fs.readFileSync(itemsPath, 'utf8'))),
+  parse_catalogue_ms: best(() => JSON.parse(fs.readFileSync(cataloguePath, 'utf8'))),
+  // What GET /api/items/:itemName did per request, and what it does now
+  request_items_json_ms: best(i => JSON.parse(fs.readFileSync(itemsPath, 'utf8')).find(item => item.Items === names[i % names.length])),
+  request_catalogue_ms: best(i => loadCatalogue(cataloguePath).get(names[i % names.length]), 1000),
+}));
+'''
+
+
+def gzipped_size(path):
+    with open(path, 'rb') as f:
+        return len(gzip.compress(f.read(), 6, mtime=0))
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def python_times(items_path, catalogue_path, repeat):
+    """Parse times, and the cost of finding one item in each once parsed"""
+    def load_json(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    items, catalogue = load_json(items_path), load_catalogue(catalogue_path)
+    names = [item['Items'] for item in items]
+    return {
+        'parse_items_json_ms': best_of(lambda: load_json(items_path), repeat) * 1000,
+        'parse_catalogue_ms': best_of(lambda: load_json(catalogue_path), repeat) * 1000,
+        'scan_items_us': best_of(lambda: [next(item for item in items if item['Items'] == name)
+                                          for name in names[::50]], repeat) * 1e6 / len(names[::50]),
+        'lookup_catalogue_us': best_of(lambda: [lookup(catalogue, name) for name in names], repeat) * 1e6 / len(names),
+    }
+
+
+def node_times(items_path, catalogue_path, repeat):
+    if not shutil.which('node'):
+        return None
+    result = subprocess.run(['node', '-e', NODE_SCRIPT, os.path.abspath(SERVER_DIR), items_path,
+                             os.path.dirname(catalogue_path), str(repeat)], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare items.json with the compact catalogue artifact")
+    parser.add_argument('--items', default=ITEMS_JSON)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with open(args.items, 'r', encoding='utf-8') as f:
+        items = json.load(f)
+    with tempfile.TemporaryDirectory() as tmp:
+        catalogue_path = os.path.join(tmp, 'items.catalogue.json')
+        start = time.perf_counter()
+        write_catalogue(items, catalogue_path)
+        build_time = time.perf_counter() - start
+        identical = decode(load_catalogue(catalogue_path)) == items
+
+        items_size, catalogue_size = os.path.getsize(args.items), os.path.getsize(catalogue_path)
+        print(f"{len(items)} items, artifact built in {build_time * 1000:.1f} ms, "
+              f"round trip {'identical' if identical else 'DIFFERENT'}")
+        print(f"   {'':<28} {'items.json':>12} {'catalogue':>12}")
+        print(f"   {'size (KiB)':<28} {items_size / 1024:>12.1f} {catalogue_size / 1024:>12.1f}")
+        print(f"   {'gzipped (KiB)':<28} {gzipped_size(args.items) / 1024:>12.1f} "
+              f"{gzipped_size(catalogue_path) / 1024:>12.1f}")
+        py = python_times(args.items, catalogue_path, args.repeat)
+        print(f"   {'Python parse':<28} {py['parse_items_json_ms']:>10.2f}ms {py['parse_catalogue_ms']:>10.2f}ms")
+        print(f"   {'Python find one item':<28} {py['scan_items_us']:>10.2f}us {py['lookup_catalogue_us']:>10.2f}us"
+              f"  (list scan vs hash table)")
+        node = node_times(args.items, catalogue_path, args.repeat)
+        if node:
+            print(f"   {'Node parse':<28} {node['parse_items_json_ms']:>10.2f}ms {node['parse_catalogue_ms']:>10.2f}ms")
+            print(f"   {'Node GET /api/items/:name':<28} {node['request_items_json_ms']:>10.3f}ms "
+                  f"{node['request_catalogue_ms']:>10.3f}ms  (read+parse+find vs cached artifact)")
+        else:
+            print("   (node not found, skipping Node timings)")
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Benchmark the vectorized cleaning stage against the original row-wise one.
+
+Builds a synthetic raw catalogue (parsed through read_csv so the dtypes match
+real Special:Ask pages), runs both implementations, checks that they produce
+byte-identical JSON and reports the timings.
+
+    cd server/scripts && python3 -m benchmarks.cleaning --rows 100000
+"""
+
+import io
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from bazaar_data.clean import RAW_COLUMNS, clean_items
+
+EPISODES = ['Hopeport', 'Hopeforest', 'Mine of Mantuban', 'Crenopolis', 'Stonemaw Hill', None]
+PROFESSIONS = ['Woodcutter', 'Carpenter', 'Delver', 'Alchemist', 'Hammermage', 'Cryoknight',
+               'Guardian', 'Chef', 'Merchant', None]
+
+
+def synthetic_raw_catalogue(rows, seed=0):
+    """Raw Special:Ask-shaped DataFrame with `rows` items"""
+    rng = np.random.default_rng(seed)
+
+    def pick(values, p_missing=0.0):
+        chosen = rng.choice(np.array(values, dtype=object), size=rows)
+        if p_missing:
+            chosen[rng.random(rows) < p_missing] = None
+        return chosen
+
+    def levels(p_missing):
+        values = rng.integers(0, 600, size=rows).astype(float)
+        values[rng.random(rows) < p_missing] = np.nan
+        return values
+
+    names = np.array([f"Item {i}" for i in range(rows)], dtype=object)
+    legacy = rng.random(rows) < 0.01
+    names[legacy] = names[legacy] + ' (Legacy)'
+    images = np.array([f"File:Item {i}.png" for i in range(rows)], dtype=object)
+    images[rng.random(rows) < 0.02] = None
+    tradeable = pick(['true', 'false', None], 0.0)
+
+    raw = pd.DataFrame({
+        '': names,
+        'Image': images,
+        'Episode': pick(EPISODES),
+        'Variant of': pick([f"Base {i}" for i in range(300)], 0.1),
+        'Profession A': pick(PROFESSIONS),
+        'Profession Level A': levels(0.05),
+        'Profession B': pick(PROFESSIONS, 0.3),
+        'Profession Level B': levels(0.3),
+        'Tradeable': tradeable,
+    })
+    return pd.read_csv(io.StringIO(raw.to_csv(index=False)), encoding='utf-8')
+
+
+def legacy_clean_items(raw):
+    """The original row-wise cleaning from scrape.py, kept as the reference"""
+    df = raw[RAW_COLUMNS].copy()
+    df.rename(columns={'Unnamed: 0': 'Items'}, inplace=True)
+
+    def clean_image_url(image_name):
+        if pd.isna(image_name):
+            return image_name
+        clean_name = str(image_name).replace('File:', '')
+        clean_name = clean_name.replace(' ', '_')
+        return f'/assets/items/{clean_name}'
+
+    df['Image'] = df['Image'].apply(clean_image_url)
+
+    df['Episode'] = df['Episode'].fillna('None')
+    df['Variant of'] = df['Variant of'].fillna('None')
+    df['Profession A'] = df['Profession A'].fillna('None')
+    df['Profession Level A'] = df['Profession Level A'].fillna('None')
+    df['Profession B'] = df['Profession B'].fillna('None')
+    df['Profession Level B'] = df['Profession Level B'].fillna('None')
+    df['Tradeable'] = df['Tradeable'].fillna('unknown')
+
+    df = df[~((df['Tradeable'] == False) | (df['Tradeable'] == 'False'))]  # noqa: E712
+
+    def contains_legacy(row):
+        for val in row.values:
+            if isinstance(val, str) and '(Legacy)' in val:
+                return True
+        return False
+
+    df = df[~df.apply(contains_legacy, axis=1)]
+
+    for col in ['Profession Level A', 'Profession Level B']:
+        def strip_decimal(val):
+            try:
+                if pd.isna(val) or val == 'None':
+                    return 'None'
+                return str(int(float(val)))
+            except Exception:
+                return str(val)
+        df[col] = df[col].apply(strip_decimal)
+
+    combat_aliases = {"Hammermage", "Cryoknight", "Guardian"}
+    for col in ["Profession A", "Profession B"]:
+        df[col] = df[col].apply(lambda x: "Combat" if str(x) in combat_aliases else x)
+
+    return df
+
+
+def timed(func, *args, repeat=3):
+    """Best-of-`repeat` wall time and the last result"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark row-wise vs vectorized cleaning")
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    raw = synthetic_raw_catalogue(args.rows)
+    print(f"Synthetic catalogue: {len(raw)} rows")
+
+    legacy_time, legacy = timed(legacy_clean_items, raw, repeat=args.repeat)
+    vector_time, vector = timed(clean_items, raw, repeat=args.repeat)
+
+    legacy_json = legacy.to_json(orient='records', indent=2)
+    vector_json = vector.to_json(orient='records', indent=2)
+    identical = legacy_json == vector_json
+
+    print(f"   row-wise:   {legacy_time:.3f}s ({len(legacy)} rows out)")
+    print(f"   vectorized: {vector_time:.3f}s ({len(vector)} rows out)")
+    print(f"   speedup:    {legacy_time / vector_time:.1f}x")
+    print(f"   output:     {'byte-identical' if identical else 'DIFFERENT'}")
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,46 @@
+"""Result files shared by the benchmarks that keep a history in benchmarks/results/"""
+
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'commit': commit,
+    }
+
+
+def previous_result(results_dir, current_settings, prefix=''):
+    """The newest earlier `prefix`*.json result file recorded with the same settings"""
+    if not os.path.isdir(results_dir):
+        return None
+    for name in sorted(os.listdir(results_dir), reverse=True):
+        if not name.startswith(prefix) or not name.endswith('.json'):
+            continue
+        with open(os.path.join(results_dir, name), 'r', encoding='utf-8') as f:
+            result = json.load(f)
+        if result.get('settings') == current_settings:
+            return result
+    return None
+
+
+def save_result(result, results_dir, prefix):
+    """Write `result` as results_dir/<prefix>-<timestamp>.json; returns the path"""
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"{prefix}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    return path
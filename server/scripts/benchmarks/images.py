@@ -0,0 +1,66 @@
+"""
+Benchmark the image optimization stage on a sample of real item images.
+
+Copies a sample of PNGs to a temporary directory, encodes every variant,
+and reports bytes saved per variant and time per image. A second pass shows
+the cost of a run where nothing changed.
+
+    cd server/scripts && python3 -m benchmarks.images --sample 200
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from bazaar_data.manifest import load_manifest, scan
+from bazaar_data.optimize import (MAX_WORKERS, available, default_variants, load_variants, optimize_images,
+                                  report_optimization)
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..',
+                          'bazaar-client', 'public', 'assets', 'items')
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark WebP/AVIF/thumbnail generation")
+    parser.add_argument('--images', default=IMAGES_DIR, help="directory of source PNGs")
+    parser.add_argument('--sample', type=int, default=200, help="number of images (0 for all)")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if not available():
+        print("❌ Pillow is not installed (pip install Pillow)")
+        return 1
+
+    names = sorted(name for name in os.listdir(args.images) if name.endswith('.png'))
+    if args.sample and args.sample < len(names):
+        names = random.Random(args.seed).sample(names, args.sample)
+    print(f"Sample: {len(names)} images from {os.path.abspath(args.images)}, "
+          f"variants {','.join(default_variants())}, {args.workers} workers")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source_dir = os.path.join(tmp, 'items')
+        os.makedirs(source_dir)
+        for name in names:
+            shutil.copy2(os.path.join(args.images, name), source_dir)
+        manifest = load_manifest(os.path.join(tmp, 'manifest.json'))
+        files = scan(manifest, source_dir)
+        index = load_variants(os.path.join(tmp, 'variants.json'))
+
+        start = time.perf_counter()
+        encoded = optimize_images(files, source_dir, index, workers=args.workers)
+        report_optimization(encoded, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        again = optimize_images(files, source_dir, index, workers=args.workers)
+        print(f"   unchanged re-run: {len(again)} re-encoded in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
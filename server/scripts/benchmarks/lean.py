@@ -0,0 +1,143 @@
+"""
+Compare the lean (stdlib csv, no pandas) scrape with the pandas one.
+
+Three measurements, each in fresh interpreters so nothing is shared:
+
+    import   seconds and resident memory after importing what the clean
+             stage needs (bazaar_data.clean plus pandas for the pandas mode)
+    scrape   `python3 -m bazaar_data scrape --no-images` against the wiki
+             stand-in serving `--items` synthetic items, with a synthetic
+             marketplace.db of `--listings` listings so the stats stage runs;
+             wall time of the process, and the per-stage wall time and peak
+             RSS the run records in metrics.jsonl
+    output   both modes must write byte-identical items.json files
+
+    cd server/scripts && python3 -m benchmarks.lean --items 2000 --repeat 5
+    cd server/scripts && python3 -m benchmarks.lean --items 20000 --listings 1000000
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bazaar_data.metrics import JSONL_NAME, load_runs
+from bazaar_data.standin import SyntheticCatalogue, start_standin
+
+from .marketplace import catalogue_names, create_marketplace_db
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ('pandas', 'lean')
+IMPORTS = {
+    'pandas': 'import pandas, bazaar_data.clean',
+    'lean': 'import bazaar_data.clean',
+}
+# Prints import seconds and the peak RSS (bytes) of the importing interpreter
+IMPORT_PROBE = '''
+import time
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+from bazaar_data.metrics import peak_rss
+print(elapsed, peak_rss())
+'''
+
+
+def measure_import(mode):
+    output = subprocess.run([sys.executable, '-c', IMPORT_PROBE.format(imports=IMPORTS[mode])], cwd=SCRIPTS_DIR,
+                            capture_output=True, text=True, check=True).stdout.split()
+    return float(output[0]), int(output[1])
+
+
+def measure_scrape(mode, base_url, data_dir):
+    """Process wall seconds and the run's metrics records for one full scrape"""
+    metrics_dir = os.path.join(data_dir, 'metrics')
+    command = [sys.executable, '-m', 'bazaar_data', 'scrape', '--no-images', '--base-url', base_url,
+               '--data-dir', data_dir, '--images-dir', os.path.join(data_dir, 'images'),
+               '--metrics-dir', metrics_dir]
+    if mode == 'lean':
+        command.append('--lean')
+    start = time.perf_counter()
+    subprocess.run(command, cwd=SCRIPTS_DIR, check=True, stdout=subprocess.DEVNULL)
+    elapsed = time.perf_counter() - start
+    runs = load_runs(os.path.join(metrics_dir, JSONL_NAME))
+    return elapsed, list(runs.values())[-1]
+
+
+def reset_data_dir(data_dir, marketplace_template):
+    """A data dir with only a copy of the synthetic marketplace.db, so every run is a full scrape"""
+    for name in os.listdir(data_dir):
+        path = os.path.join(data_dir, name)
+        if os.path.isfile(path):
+            os.remove(path)
+    if marketplace_template:
+        with open(marketplace_template, 'rb') as source, open(os.path.join(data_dir, 'marketplace.db'), 'wb') as f:
+            f.write(source.read())
+
+
+def median(values):
+    return statistics.median(values) if values else None
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare import time, peak RSS and runtime of the two scrape modes")
+    parser.add_argument('--items', type=int, default=2000, help="synthetic catalogue size (up to 50000)")
+    parser.add_argument('--listings', type=int, default=100_000, help="synthetic marketplace listings (0 for none)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per mode; medians are reported")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    imports = {mode: [measure_import(mode) for _ in range(args.repeat)] for mode in MODES}
+    print(f"{'import':<28}" + ''.join(f"{mode:>14}" for mode in MODES))
+    print(f"{'   seconds':<28}" + ''.join(f"{median([s for s, _ in imports[mode]]):>14.3f}" for mode in MODES))
+    print(f"{'   peak RSS after import (MB)':<28}"
+          + ''.join(f"{median([rss for _, rss in imports[mode]]) / 1e6:>14.1f}" for mode in MODES))
+
+    server, base_url = start_standin(SyntheticCatalogue(args.items, args.seed), seed=args.seed)
+    scrapes = {mode: [] for mode in MODES}
+    outputs = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            template = None
+            if args.listings:
+                template = os.path.join(tmp, 'marketplace-template.db')
+                create_marketplace_db(template, args.listings, seed=args.seed, names=catalogue_names())
+            for mode in MODES:
+                os.makedirs(os.path.join(tmp, mode))
+            # Alternate the modes so drift (caches, thermal) hits both alike
+            for _ in range(args.repeat):
+                for mode in MODES:
+                    data_dir = os.path.join(tmp, mode)
+                    reset_data_dir(data_dir, template)
+                    scrapes[mode].append(measure_scrape(mode, base_url, data_dir))
+                    with open(os.path.join(data_dir, 'items.json'), 'rb') as f:
+                        outputs[mode] = f.read()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    stages = list(dict.fromkeys(stage for mode in MODES for _, run in scrapes[mode] for stage in run
+                                if stage != '_run' and run[stage]['status'] != 'skipped'))
+    print(f"\nscrape, {args.items} items, {args.listings} listings")
+    print(f"{'   process wall seconds':<28}"
+          + ''.join(f"{median([elapsed for elapsed, _ in scrapes[mode]]):>14.3f}" for mode in MODES))
+    print(f"{'   peak RSS (MB)':<28}"
+          + ''.join(f"{median([run['_run']['peak_rss_bytes'] for _, run in scrapes[mode]]) / 1e6:>14.1f}"
+                    for mode in MODES))
+    for stage in stages:
+        cells = []
+        for mode in MODES:
+            seconds = [run[stage]['wall_seconds'] for _, run in scrapes[mode] if stage in run]
+            cells.append(f"{median(seconds):>14.3f}" if seconds else f"{'-':>14}")
+        print(f"{'   ' + stage + ' seconds':<28}" + ''.join(cells))
+    identical = len(set(outputs.values())) == 1
+    print(f"\nitems.json identical in both modes: {'yes' if identical else 'NO'}")
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
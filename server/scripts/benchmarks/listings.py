@@ -0,0 +1,116 @@
+"""
+Throughput of the bulk listings importer/exporter.
+
+Writes `--listings` synthetic listings (with ids, in the listings.json
+layout) to an NDJSON and a JSON array file, then measures rows/sec for:
+importing into an empty marketplace.db, re-running the same file as an
+upsert (everything unchanged), an upsert where 10% of the listings changed,
+and exporting the table as NDJSON and CSV. For comparison it also times the
+import-listings.js pattern, one autocommitted INSERT per listing, on the
+first `--naive` rows.
+
+    cd server/scripts && python3 -m benchmarks.listings --listings 1000000
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from bazaar_data.listings import (CREATE_LISTINGS_TABLE, export_listings, import_listings, listing_columns,
+                                  read_records)
+
+from .marketplace import catalogue_names, synthetic_listings
+
+
+def write_sources(directory, count, names):
+    """listings.ndjson and listings.json with `count` listings; returns both paths"""
+    ndjson_path = os.path.join(directory, 'listings.ndjson')
+    json_path = os.path.join(directory, 'listings.json')
+    with open(ndjson_path, 'w', encoding='utf-8') as ndjson, open(json_path, 'w', encoding='utf-8') as array:
+        array.write('[')
+        for n, listing in enumerate(synthetic_listings(count, names)):
+            # listings.json keeps the seller's in-game name in contactInfo
+            record = {'id': n + 1, **listing, 'contactInfo': listing.pop('IGN')}
+            ndjson.write(json.dumps(record) + '\n')
+            array.write((',\n  ' if n else '\n  ') + json.dumps(record))
+        array.write('\n]\n')
+    return ndjson_path, json_path
+
+
+def changed_records(path, every=10):
+    """The records of `path` with the price of every `every`th listing raised"""
+    for n, record in enumerate(read_records(path)):
+        if n % every == 0:
+            record['price'] += 1
+            record.pop('totalPrice', None)
+        yield record
+
+
+def naive_import(db_path, path, limit):
+    """import-listings.js: one autocommitted INSERT per listing"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute(CREATE_LISTINGS_TABLE)
+        columns = [name for name in listing_columns(conn) if name != 'id']
+        insert = f"INSERT INTO listings ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        start = time.perf_counter()
+        for n, record in enumerate(read_records(path)):
+            if n >= limit:
+                break
+            record['IGN'] = record.get('contactInfo') or ''
+            conn.execute(insert, [record.get(name) for name in columns])
+        return time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def report(label, rows, elapsed):
+    print(f"   {label:<44} {rows:>10} rows {elapsed:>8.2f}s {rows / elapsed:>12,.0f} rows/s")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the bulk listings importer/exporter")
+    parser.add_argument('--listings', type=int, default=1_000_000)
+    parser.add_argument('--naive', type=int, default=2000, help="rows for the one-INSERT-per-listing baseline")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        ndjson_path, json_path = write_sources(tmp, args.listings, catalogue_names())
+        print(f"{args.listings} synthetic listings written in {time.perf_counter() - start:.1f}s "
+              f"(NDJSON {os.path.getsize(ndjson_path) / 1e6:.0f} MB, JSON {os.path.getsize(json_path) / 1e6:.0f} MB)")
+
+        db_path = os.path.join(tmp, 'marketplace.db')
+        runs = [
+            ('import NDJSON (insert)', lambda: import_listings(db_path, read_records(ndjson_path))),
+            ('upsert JSON array, all unchanged', lambda: import_listings(db_path, read_records(json_path), 'upsert')),
+        ]
+        # The insert run gave fresh ids 1..n, matching the ids in the files
+        for label, run in runs:
+            start = time.perf_counter()
+            result = run()
+            report(label, result.read, time.perf_counter() - start)
+        start = time.perf_counter()
+        result = import_listings(db_path, changed_records(ndjson_path), 'upsert', dry_run=True)
+        report(f"upsert dry run ({result.updated} changed)", result.read, time.perf_counter() - start)
+        start = time.perf_counter()
+        result = import_listings(db_path, changed_records(ndjson_path), 'upsert')
+        report(f"upsert ({result.updated} changed)", result.read, time.perf_counter() - start)
+
+        for fmt in ('ndjson', 'csv'):
+            start = time.perf_counter()
+            count = export_listings(db_path, os.path.join(tmp, f'export.{fmt}'), fmt)
+            report(f"export {fmt}", count, time.perf_counter() - start)
+
+        naive_time = naive_import(os.path.join(tmp, 'naive.db'), ndjson_path, args.naive)
+        report("one INSERT per listing (import-listings.js)", args.naive, naive_time)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
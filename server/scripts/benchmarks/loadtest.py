@@ -0,0 +1,554 @@
+"""
+Load generator for the marketplace HTTP API.
+
+Seeds a marketplace.db with synthetic users, listings and offers
+(benchmarks.marketplace), starts server.js on it from a scratch copy of the
+server directory, and lets `--clients` concurrent clients replay a read/write
+mix for `--duration` seconds after a `--warmup`. Each client keeps one
+keep-alive connection, acts as one seeded user (a JWT signed with the scratch
+server's secret) and draws every request from MIX by weight: listing pages,
+type filters and searches on /api/listings-with-items, market stats, single
+listings and offers, the unpaginated /listings and /api/listings, and
+creating, editing and deleting listings and offers. `--think` adds an
+exponential pause between a client's requests; without it every client sends
+its next request as soon as the last one is answered.
+
+Per endpoint the report has requests, throughput, p50/p95/p99/max latency,
+mean response size, status counts and connection errors. Results are written
+as JSON to benchmarks/results/ and compared with the newest earlier loadtest
+result that used the same settings.
+
+The scratch server needs server/node_modules (npm install). `--url` points
+the clients at a server that is already running instead; it needs the
+server's JWT secret and a copy of its marketplace.db to draw items and ids
+from. The generator shares the machine with the server, so for high rates run
+it from another host.
+
+    cd server/scripts && python3 -m benchmarks.loadtest --listings 100000 --clients 16 --duration 30
+    cd server/scripts && python3 -m benchmarks.loadtest --listings 1000000 --fts --stats --indexes
+    cd server/scripts && python3 -m benchmarks.loadtest --weight listings=0 --weight api_listings=0
+    cd server/scripts && python3 -m benchmarks.loadtest --url http://10.0.0.5:3001 --db marketplace.db \\
+        --jwt-secret "$JWT_SECRET"
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, namedtuple
+from datetime import datetime
+from itertools import accumulate
+from urllib.parse import quote, urlsplit
+
+from bazaar_data.stats import quantile
+
+from .common import RESULTS_DIR, environment, previous_result, save_result
+from .marketplace import add_users_and_offers, catalogue_names, create_marketplace_db
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SERVER_FILES = ('server.js', 'catalogue.js', 'package.json')
+DATA_FILES = ('items.json', 'items.catalogue.json', 'items.db')
+STARTUP_TIMEOUT = 300
+REQUEST_TIMEOUT = 60
+PAGE = 50
+# Listing pages are drawn from the first MAX_PAGES (offset up to PAGE * MAX_PAGES)
+MAX_PAGES = 20
+PERCENTILES = (50, 95, 99)
+# Relative p95 slowdown reported as a regression
+REGRESSION_THRESHOLD = 0.10
+
+# Endpoint -> relative weight: mostly browsing, some trading, the occasional
+# full listings dump
+MIX = {
+    'listings_page': 30,
+    'listings_type': 10,
+    'search': 15,
+    'market_stats': 20,
+    'listing': 10,
+    'offers_for_listing': 5,
+    'my_offers': 3,
+    'offers_received': 3,
+    'create_listing': 4,
+    'update_listing': 2,
+    'delete_listing': 1,
+    'create_offer': 3,
+    'listings': 1,
+    'api_listings': 1,
+}
+
+Request = namedtuple('Request', 'endpoint method target body')
+
+
+def b64url(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def make_token(secret, user_id, username, ttl=24 * 60 * 60):
+    """HS256 JWT as jsonwebtoken.sign() makes them for email logins"""
+    now = int(time.time())
+    header = b64url(json.dumps({'alg': 'HS256', 'typ': 'JWT'}, separators=(',', ':')).encode())
+    # The id is a string so it compares equal to the TEXT sellerId/userId columns server.js checks ownership with
+    payload = b64url(json.dumps({'id': str(user_id), 'username': username, 'email': f"{username}@example.com",
+                                 'avatar': None, 'auth_type': 'email', 'iat': now, 'exp': now + ttl},
+                                separators=(',', ':')).encode())
+    signature = hmac.new(secret.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+    return f"{header}.{payload}.{b64url(signature)}"
+
+
+class Sample:
+    """What requests are drawn from: items weighted by listings, search words, seeded ids"""
+
+    def __init__(self, db_path):
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            counts = conn.execute('SELECT item, COUNT(*) FROM listings GROUP BY item').fetchall()
+            self.max_listing_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM listings').fetchone()[0]
+            self.users = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+        finally:
+            conn.close()
+        if not counts or not self.users:
+            raise SystemExit(f"{db_path} needs listings and users to draw requests from")
+        self.items = [item for item, _ in counts]
+        self.item_cum_weights = list(accumulate(count for _, count in counts))
+        self.terms = sorted({word for item in self.items for word in item.split() if len(word) >= 3})
+
+
+class Client:
+    """One simulated user: its connection, token, RNG and the listings it created"""
+
+    def __init__(self, number, sample, host, port, secret, weights, seed=0):
+        self.rng = random.Random(seed * 100_003 + number)
+        self.sample = sample
+        self.connection = Connection(host, port)
+        user = self.rng.randrange(sample.users)
+        self.user_id = user + 1
+        self.token = make_token(secret, self.user_id, f"trader{user:05d}")
+        self.names = list(weights)
+        self.cum_weights = list(accumulate(weights.values()))
+        self.own = []
+
+    def item(self):
+        return self.rng.choices(self.sample.items, cum_weights=self.sample.item_cum_weights)[0]
+
+    def listing_id(self):
+        return self.rng.randint(1, self.sample.max_listing_id)
+
+    def next_request(self):
+        name = self.rng.choices(self.names, cum_weights=self.cum_weights)[0]
+        return ENDPOINTS[name](self)
+
+    def handle(self, request, status, content):
+        if request.endpoint == 'create_listing' and status == 201:
+            self.own.append(json.loads(content)['listing']['id'])
+
+
+def listings_page(client):
+    offset = client.rng.randrange(MAX_PAGES) * PAGE
+    return Request('listings_page', 'GET', f"/api/listings-with-items?limit={PAGE}&offset={offset}", None)
+
+
+def listings_type(client):
+    kind = client.rng.choice(('buy', 'sell'))
+    return Request('listings_type', 'GET', f"/api/listings-with-items?type={kind}&limit={PAGE}&offset=0", None)
+
+
+def search(client):
+    term = quote(client.rng.choice(client.sample.terms))
+    return Request('search', 'GET', f"/api/listings-with-items?item_name={term}&limit={PAGE}&offset=0", None)
+
+
+def market_stats(client):
+    return Request('market_stats', 'GET', f"/api/market-stats/{quote(client.item(), safe='')}", None)
+
+
+def listing(client):
+    return Request('listing', 'GET', f"/api/listings/{client.listing_id()}", None)
+
+
+def offers_for_listing(client):
+    return Request('offers_for_listing', 'GET', f"/api/offers/listing/{client.listing_id()}", None)
+
+
+def my_offers(client):
+    return Request('my_offers', 'GET', '/api/offers/user', None)
+
+
+def offers_received(client):
+    return Request('offers_received', 'GET', '/api/offers/received', None)
+
+
+def listing_body(client):
+    price = client.rng.randint(1, 200_000)
+    return {'item': client.item(), 'price': price, 'quantity': client.rng.choice([1, 1, 5, 10, 100]),
+            'type': 'buy' if client.rng.random() < 0.4 else 'sell', 'category': '',
+            'priceMode': 'Each', 'notes': 'load test'}
+
+
+def create_listing(client):
+    return Request('create_listing', 'POST', '/api/listings', listing_body(client))
+
+
+def update_listing(client):
+    """Edits one of the client's own listings; creates one first if it has none"""
+    if not client.own:
+        return create_listing(client)
+    return Request('update_listing', 'PUT', f"/api/listings/{client.rng.choice(client.own)}", listing_body(client))
+
+
+def delete_listing(client):
+    if not client.own:
+        return create_listing(client)
+    return Request('delete_listing', 'DELETE', f"/api/listings/{client.own.pop()}", None)
+
+
+def create_offer(client):
+    body = {'listing_id': client.listing_id(), 'offer_amount': client.rng.randint(1, 200_000), 'message': ''}
+    return Request('create_offer', 'POST', '/api/offers', body)
+
+
+def listings(client):
+    return Request('listings', 'GET', '/listings', None)
+
+
+def api_listings(client):
+    return Request('api_listings', 'GET', '/api/listings', None)
+
+
+ENDPOINTS = {function.__name__: function for function in (
+    listings_page, listings_type, search, market_stats, listing, offers_for_listing, my_offers, offers_received,
+    create_listing, update_listing, delete_listing, create_offer, listings, api_listings)}
+
+
+class Connection:
+    """A keep-alive HTTP/1.1 connection over asyncio streams; reconnects after errors"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def request(self, method, target, body=None, token=None):
+        """(status, body bytes) of one request"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        payload = json.dumps(body).encode() if body is not None else b''
+        head = [f"{method} {target} HTTP/1.1", f"Host: {self.host}:{self.port}", 'Connection: keep-alive',
+                f"Content-Length: {len(payload)}"]
+        if body is not None:
+            head.append('Content-Type: application/json')
+        if token:
+            head.append(f"Authorization: Bearer {token}")
+        self.writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + payload)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError('connection closed before the response')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if 'content-length' in headers:
+            content = await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                if not size:
+                    # Trailer section up to the blank line
+                    while (await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            content = b''.join(chunks)
+        else:
+            content = await self.reader.read()
+            headers['connection'] = 'close'
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, content
+
+
+class Recorder:
+    """Latencies, statuses and errors of one endpoint"""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = Counter()
+        self.bytes = 0
+
+    def record(self, seconds, status, size):
+        self.latencies.append(seconds)
+        self.statuses[str(status)] += 1
+        self.bytes += size
+
+    def summary(self, duration):
+        latencies = sorted(self.latencies)
+        result = {
+            'requests': len(latencies),
+            'throughput': len(latencies) / duration,
+            'mean_bytes': self.bytes / len(latencies) if latencies else None,
+            'statuses': dict(self.statuses),
+            'errors': dict(self.errors),
+        }
+        for p in PERCENTILES:
+            result[f"p{p}_ms"] = quantile(latencies, p / 100) * 1000 if latencies else None
+        result['max_ms'] = latencies[-1] * 1000 if latencies else None
+        return result
+
+
+async def run_client(client, recorders, record_from, deadline, think=0.0, timeout=REQUEST_TIMEOUT):
+    while time.perf_counter() < deadline:
+        if think:
+            await asyncio.sleep(client.rng.expovariate(1 / think))
+        request = client.next_request()
+        started = time.perf_counter()
+        try:
+            status, content = await asyncio.wait_for(
+                client.connection.request(request.method, request.target, request.body, client.token), timeout)
+        except (OSError, ValueError, IndexError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            await client.connection.close()
+            if started >= record_from:
+                recorders[request.endpoint].errors[type(e).__name__] += 1
+            continue
+        elapsed = time.perf_counter() - started
+        client.handle(request, status, content)
+        if started >= record_from:
+            recorders[request.endpoint].record(elapsed, status, len(content))
+    await client.connection.close()
+
+
+async def generate_load(clients, warmup, duration, think=0.0):
+    """Run every client until warmup + duration; returns {endpoint: Recorder} for the measured part"""
+    recorders = {name: Recorder() for name in ENDPOINTS}
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(client, recorders, start + warmup, start + warmup + duration, think)
+                           for client in clients))
+    return recorders
+
+
+def seed_db(path, listings, offers, fts=False, stats=False, indexes=False, seed=0):
+    """Synthetic marketplace.db, optionally with what the scrape adds and the advisor's indexes"""
+    elapsed = create_marketplace_db(path, listings, seed=seed, names=catalogue_names())
+    add_users_and_offers(path, offers, seed=seed)
+    print(f"Seeded {listings} listings and {offers} offers in {elapsed:.1f}s")
+    if fts:
+        from bazaar_data.search import ensure_listings_search
+
+        conn = sqlite3.connect(path)
+        try:
+            with conn:
+                ensure_listings_search(conn)
+        finally:
+            conn.close()
+    if stats:
+        from bazaar_data.stats import refresh_stats
+
+        refresh_stats(path, lean=True)
+    if indexes:
+        from bazaar_data.queryplan import run_advisor
+
+        report = run_advisor(path, apply=True, repeat=1)
+        print(f"Created {len(report['proposals'])} indexes proposed by the query-plan advisor")
+
+
+def stage_server(workdir, db_path):
+    """A scratch copy of server/ whose data/ holds the seeded database; node_modules is linked, not copied"""
+    node_modules = os.path.join(SERVER_DIR, 'node_modules')
+    if not os.path.isdir(node_modules):
+        raise SystemExit(f"{node_modules} is missing: run `npm install` in {SERVER_DIR} first")
+    stage = os.path.join(workdir, 'server')
+    os.makedirs(os.path.join(stage, 'data'))
+    for name in SERVER_FILES:
+        shutil.copy(os.path.join(SERVER_DIR, name), stage)
+    os.symlink(node_modules, os.path.join(stage, 'node_modules'))
+    for name in DATA_FILES:
+        source = os.path.join(SERVER_DIR, 'data', name)
+        if os.path.exists(source):
+            shutil.copy(source, os.path.join(stage, 'data'))
+    shutil.move(db_path, os.path.join(stage, 'data', 'marketplace.db'))
+    return stage
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(stage, port, secret, log_path, timeout=STARTUP_TIMEOUT):
+    """Start server.js in `stage` and wait for /api/health; its console output goes to log_path"""
+    env = dict(os.environ, PORT=str(port), JWT_SECRET=secret, NODE_ENV='production',
+               SESSION_SECRET=secret, DISCORD_CLIENT_ID='loadtest', DISCORD_CLIENT_SECRET='loadtest',
+               DISCORD_CALLBACK_URL=f"http://127.0.0.1:{port}/api/auth/discord/callback")
+    for name in ('EMAIL_HOST', 'EMAIL_USER', 'EMAIL_PASS'):
+        env.pop(name, None)
+    with open(log_path, 'wb') as log:
+        process = subprocess.Popen(['node', 'server.js'], cwd=stage, env=env, stdout=log,
+                                   stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"server.js exited with {process.returncode}; see {log_path}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=2) as response:
+                if response.status == 200:
+                    return process
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.25)
+    stop_server(process)
+    raise SystemExit(f"server.js did not answer /api/health within {timeout}s; see {log_path}")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def parse_weights(overrides):
+    weights = dict(MIX)
+    for override in overrides or ():
+        name, _, weight = override.partition('=')
+        if name not in ENDPOINTS or not weight:
+            raise SystemExit(f"--weight takes ENDPOINT=WEIGHT with ENDPOINT one of {', '.join(ENDPOINTS)}")
+        weights[name] = float(weight)
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+def settings(args, weights):
+    result = {name: getattr(args, name) for name in ('listings', 'offers', 'clients', 'duration', 'warmup',
+                                                     'think', 'fts', 'stats', 'indexes', 'seed')}
+    result['target'] = args.url or 'local'
+    result['mix'] = weights
+    return result
+
+
+def report(summary, previous):
+    print(f"   {'endpoint':<20} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'max ms':>9} {'KB':>9}  statuses   p95 vs previous")
+
+    def ms(value):
+        return f"{value:>9.1f}" if value is not None else f"{'-':>9}"
+
+    for name, endpoint in summary.items():
+        change = ''
+        before = (previous or {}).get(name)
+        if before and before.get('p95_ms') and endpoint['p95_ms'] is not None:
+            delta = endpoint['p95_ms'] / before['p95_ms'] - 1
+            change = f"{delta:+.0%}" + ('  ⚠️' if delta > REGRESSION_THRESHOLD else '')
+        statuses = ' '.join(f"{code}:{count}" for code, count in sorted(endpoint['statuses'].items()))
+        statuses += ''.join(f" {error}:{count}" for error, count in endpoint['errors'].items())
+        size = f"{endpoint['mean_bytes'] / 1024:>9.1f}" if endpoint['mean_bytes'] is not None else f"{'-':>9}"
+        print(f"   {name:<20} {endpoint['requests']:>9} {endpoint['throughput']:>9.1f} {ms(endpoint['p50_ms'])} "
+              f"{ms(endpoint['p95_ms'])} {ms(endpoint['p99_ms'])} {ms(endpoint['max_ms'])} {size}  "
+              f"{statuses:<10} {change}")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay a read/write mix against server.js and report latencies")
+    parser.add_argument('--listings', type=int, default=100_000)
+    parser.add_argument('--offers', type=int, default=10_000)
+    parser.add_argument('--clients', type=int, default=16, help="concurrent clients (one connection each)")
+    parser.add_argument('--duration', type=float, default=30, help="measured seconds")
+    parser.add_argument('--warmup', type=float, default=5, help="seconds of load before measuring")
+    parser.add_argument('--think', type=float, default=0.0, help="mean pause between a client's requests, seconds")
+    parser.add_argument('--weight', action='append', metavar='ENDPOINT=WEIGHT',
+                        help=f"override a weight of the mix (0 drops the endpoint); endpoints: {', '.join(MIX)}")
+    parser.add_argument('--fts', action='store_true', help="add listings_fts, as the scrape does")
+    parser.add_argument('--stats', action='store_true', help="precompute item_stats, as the scrape does")
+    parser.add_argument('--indexes', action='store_true', help="create the indexes the query-plan advisor proposes")
+    parser.add_argument('--url', help="load an already running server instead of a scratch one")
+    parser.add_argument('--db', help="with --url: a copy of that server's marketplace.db to draw requests from")
+    parser.add_argument('--jwt-secret', help="with --url: that server's JWT_SECRET")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--results-dir', default=RESULTS_DIR)
+    parser.add_argument('--no-save', action='store_true', help="do not write a result file")
+    args = parser.parse_args(argv)
+    if args.url and not (args.db and args.jwt_secret):
+        parser.error("--url needs --db and --jwt-secret")
+
+    weights = parse_weights(args.weight)
+    current_settings = settings(args, weights)
+    previous = previous_result(args.results_dir, current_settings, prefix='loadtest-')
+    if previous:
+        print(f"Comparing with {previous['timestamp']} (commit {previous['environment'].get('commit')})")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        process = None
+        if args.url:
+            target = urlsplit(args.url)
+            host, port, secret = target.hostname, target.port or 80, args.jwt_secret
+            sample = Sample(args.db)
+        else:
+            db_path = os.path.join(workdir, 'marketplace.db')
+            seed_db(db_path, args.listings, args.offers, args.fts, args.stats, args.indexes, args.seed)
+            sample = Sample(db_path)
+            stage = stage_server(workdir, db_path)
+            host, port, secret = '127.0.0.1', free_port(), base64.b64encode(os.urandom(24)).decode()
+            log_path = os.path.join(workdir, 'server.log')
+            print(f"[{datetime.now()}] Starting server.js on port {port}...")
+            process = start_server(stage, port, secret, log_path)
+        try:
+            clients = [Client(n, sample, host, port, secret, weights, args.seed) for n in range(args.clients)]
+            print(f"[{datetime.now()}] {args.clients} clients, {args.warmup:g}s warmup + {args.duration:g}s measured")
+            recorders = asyncio.run(generate_load(clients, args.warmup, args.duration, args.think))
+        finally:
+            if process is not None:
+                stop_server(process)
+                print(f"Server log: {os.path.getsize(log_path) / 1e6:.1f} MB of console output")
+
+    summary = {name: recorder.summary(args.duration) for name, recorder in recorders.items() if name in weights}
+    total = Recorder()
+    for recorder in recorders.values():
+        total.latencies += recorder.latencies
+        total.statuses.update(recorder.statuses)
+        total.errors.update(recorder.errors)
+        total.bytes += recorder.bytes
+    summary['total'] = total.summary(args.duration)
+    print()
+    report(summary, (previous or {}).get('endpoints'))
+
+    if not args.no_save:
+        result = {'timestamp': datetime.now().isoformat(timespec='seconds'), 'environment': environment(),
+                  'settings': current_settings, 'endpoints': summary}
+        print(f"\nResults written to {save_result(result, args.results_dir, 'loadtest')}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+Synthetic marketplace.db files for benchmarks.
+
+Listings use the schema server.js ends up with after its column migrations,
+item names from the real catalogue and a skewed item popularity, so query
+plans and index sizes look like production at any size. add_users_and_offers
+adds the users and offers tables with the indexes server.js creates, one user
+per seller (listings.userId points at it) and offers on random listings.
+
+    cd server/scripts && python3 -m benchmarks.marketplace /tmp/marketplace.db --listings 1000000 --offers 100000
+"""
+
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from itertools import accumulate
+
+from bazaar_data.listings import CREATE_LISTINGS_TABLE
+
+ITEMS_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'items.json')
+
+LISTING_FIELDS = ['item', 'price', 'quantity', 'totalPrice', 'type', 'category', 'seller', 'userId', 'sellerId',
+                  'timestamp', 'IGN', 'priceMode', 'notes', 'rarity']
+NOTES = ['', '', '', 'Fast trade', 'Bulk discount', 'DM me in game', 'Price negotiable', 'Selling in stacks',
+         'Looking for a quick sale', 'Will trade for potions']
+START_MS = 1_750_000_000_000
+SELLERS = 5000
+
+# users and offers as server.js creates them, with its initDatabase indexes
+CREATE_USERS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL UNIQUE,
+        email TEXT UNIQUE,
+        password_hash TEXT,
+        discord_id TEXT UNIQUE,
+        discord_username TEXT,
+        avatar TEXT,
+        email_verified INTEGER DEFAULT 0,
+        email_verification_token TEXT,
+        password_reset_token TEXT,
+        password_reset_expires INTEGER,
+        auth_type TEXT DEFAULT 'email',
+        user_flags TEXT DEFAULT NULL,
+        created_at INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL
+    )
+'''
+CREATE_OFFERS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS offers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        listing_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        username TEXT NOT NULL,
+        offer_amount INTEGER NOT NULL,
+        message TEXT,
+        status TEXT DEFAULT 'pending',
+        created_at INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL,
+        FOREIGN KEY (listing_id) REFERENCES listings(id) ON DELETE CASCADE,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+'''
+SERVER_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)',
+    'CREATE INDEX IF NOT EXISTS idx_users_discord_id ON users(discord_id)',
+    'CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)',
+    'CREATE INDEX IF NOT EXISTS idx_offers_listing ON offers(listing_id)',
+    'CREATE INDEX IF NOT EXISTS idx_offers_user ON offers(user_id)',
+    'CREATE INDEX IF NOT EXISTS idx_offers_status ON offers(status)',
+]
+OFFER_STATUSES = ['pending', 'pending', 'accepted', 'rejected']
+
+
+def catalogue_names(path=ITEMS_JSON):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [item['Items'] for item in json.load(f) if item.get('Items')]
+
+
+def synthetic_listings(count, names=None, sellers=SELLERS, seed=0):
+    """Yield listing dicts; a few hundred items get most of the listings"""
+    rng = random.Random(seed)
+    names = names or catalogue_names()
+    cumulative = list(accumulate(1 / (rank + 1) for rank in range(len(names))))
+    shuffled = names[:]
+    rng.shuffle(shuffled)
+    seller_names = [f"trader{n:05d}" for n in range(sellers)]
+    for n in range(count):
+        item = rng.choices(shuffled, cum_weights=cumulative)[0] if n % 64 else rng.choice(names)
+        quantity = rng.choice([1, 1, 1, 5, 10, 50, 100, 500, 1000])
+        price = rng.randint(1, 200_000)
+        seller_number = rng.randrange(sellers)
+        seller = seller_names[seller_number]
+        yield {
+            'item': item,
+            'price': price,
+            'quantity': quantity,
+            'totalPrice': price * quantity,
+            'type': 'buy' if rng.random() < 0.4 else 'sell',
+            'category': None,
+            'seller': seller,
+            'userId': str(seller_number + 1),
+            'sellerId': seller,
+            'timestamp': START_MS + n * 1000 + rng.randint(0, 999),
+            'IGN': seller.capitalize(),
+            'priceMode': 'Total' if rng.random() < 0.1 else 'Each',
+            'notes': rng.choice(NOTES),
+            'rarity': '',
+        }
+
+
+def create_marketplace_db(path, count, seed=0, names=None, batch=50_000):
+    """Write a marketplace.db with `count` synthetic listings; returns seconds taken"""
+    if os.path.exists(path):
+        os.remove(path)
+    start = time.perf_counter()
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(CREATE_LISTINGS_TABLE)
+        insert = (f"INSERT INTO listings ({', '.join(LISTING_FIELDS)}) "
+                  f"VALUES ({', '.join('?' * len(LISTING_FIELDS))})")
+        rows = []
+        for listing in synthetic_listings(count, names, seed=seed):
+            rows.append(tuple(listing[field] for field in LISTING_FIELDS))
+            if len(rows) >= batch:
+                with conn:
+                    conn.executemany(insert, rows)
+                rows = []
+        with conn:
+            conn.executemany(insert, rows)
+    finally:
+        conn.close()
+    return time.perf_counter() - start
+
+
+def add_users_and_offers(path, offers, sellers=SELLERS, seed=0):
+    """Add users (one per synthetic seller, id = userId) and `offers` offers to a marketplace.db"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.execute(CREATE_USERS_TABLE)
+            conn.execute(CREATE_OFFERS_TABLE)
+            for statement in SERVER_INDEXES:
+                conn.execute(statement)
+            conn.executemany(
+                'INSERT INTO users (id, username, email, discord_id, email_verification_token, auth_type, '
+                'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                ((n + 1, f"trader{n:05d}", f"trader{n:05d}@example.com",
+                  str(100_000_000_000_000_000 + n) if n % 3 == 0 else None, f"token{n:08x}",
+                  'discord' if n % 3 == 0 else 'email', START_MS, START_MS) for n in range(sellers)))
+            listings = conn.execute('SELECT COALESCE(MAX(id), 0) FROM listings').fetchone()[0]
+            if not listings:
+                return
+            rows = []
+            for n in range(offers):
+                user = rng.randrange(sellers)
+                rows.append((rng.randint(1, listings), user + 1, f"trader{user:05d}", rng.randint(1, 200_000),
+                             '', rng.choice(OFFER_STATUSES), START_MS + n * 5000, START_MS + n * 5000))
+            conn.executemany('INSERT INTO offers (listing_id, user_id, username, offer_amount, message, status, '
+                             'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write a synthetic marketplace.db")
+    parser.add_argument('path')
+    parser.add_argument('--listings', type=int, default=100_000)
+    parser.add_argument('--offers', type=int, default=0, help="also add users and this many offers")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    elapsed = create_marketplace_db(args.path, args.listings, args.seed)
+    print(f"Wrote {args.listings} listings to {args.path} in {elapsed:.1f}s")
+    if args.offers:
+        add_users_and_offers(args.path, args.offers, seed=args.seed)
+        print(f"Added {SELLERS} users and {args.offers} offers")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
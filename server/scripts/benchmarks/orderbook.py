@@ -0,0 +1,187 @@
+"""
+Benchmark the order-book engine (bazaar_data.orderbook).
+
+Loads `--listings` synthetic listings (benchmarks.marketplace, spread over
+the catalogue's items) into OrderBooks and measures:
+
+    load         seconds to build every book, and peak RSS afterwards
+    full pass    summary + matches of every item, as a rebuild writes them
+    updates      `--updates` single-listing changes (new listings, edits that
+                 move a listing, quantity-only edits, deletes), each followed
+                 by summary + matches of the books it touched: p50/p95/p99/max
+                 microseconds per update
+    sync         with `--db-listings`, the same through marketplace.db: rebuild,
+                 then batches of `--batch` writes made the way server.js makes
+                 them and one sync() per batch (triggers, reads, table writes)
+
+Synthetic prices are uniform on both sides, so nearly every book crosses and
+matching always runs to MATCH_LIMIT pairs: a worst case for the pairing walk.
+
+    cd server/scripts && python3 -m benchmarks.orderbook --listings 1000000 --updates 100000
+    cd server/scripts && python3 -m benchmarks.orderbook --listings 100000 --db-listings 1000000 --batch 10
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from bazaar_data.metrics import peak_rss
+from bazaar_data.orderbook import MATCH_LIMIT, OrderBooks, rebuild, sync
+from bazaar_data.stats import quantile
+
+from .marketplace import catalogue_names, create_marketplace_db, synthetic_listings
+
+# Update kind -> share of the updates
+UPDATE_MIX = {'insert': 0.35, 'move': 0.3, 'quantity': 0.15, 'delete': 0.2}
+
+
+def listing_row(listing_id, listing):
+    return (listing_id, listing['item'], listing['type'], listing['price'], listing['quantity'],
+            listing['priceMode'], listing['timestamp'], listing['userId'])
+
+
+def percentiles(seconds):
+    values = sorted(seconds)
+    return {f"p{p}": quantile(values, p / 100) * 1e6 for p in (50, 95, 99)} | {'max': values[-1] * 1e6}
+
+
+def update_rows(rows, count, names, seed=0):
+    """Yield (kind, listing id, row or None) changes against `rows` ({id: row}), updating it as it goes"""
+    rng = random.Random(seed)
+    ids = list(rows)
+    next_id = max(ids, default=0) + 1
+    now = max((row[6] for row in rows.values()), default=0)
+    fresh = synthetic_listings(count, names, seed=seed + 1)
+    kinds, weights = list(UPDATE_MIX), list(UPDATE_MIX.values())
+    for _ in range(count):
+        now += 1000
+        kind = rng.choices(kinds, weights)[0] if ids else 'insert'
+        if kind == 'insert':
+            listing = next(fresh)
+            row = listing_row(next_id, listing)[:6] + (now,) + (listing['userId'],)
+            rows[next_id] = row
+            ids.append(next_id)
+            yield kind, next_id, row
+            next_id += 1
+            continue
+        position = rng.randrange(len(ids))
+        listing_id = ids[position]
+        if kind == 'delete':
+            ids[position] = ids[-1]
+            ids.pop()
+            del rows[listing_id]
+            yield kind, listing_id, None
+            continue
+        row = list(rows[listing_id])
+        if kind == 'move':
+            # An edit through PUT /api/listings/:id: new price, new timestamp
+            row[3] = rng.randint(1, 200_000)
+            row[6] = now
+        else:
+            row[4] = rng.choice([1, 5, 10, 50, 100])
+        rows[listing_id] = tuple(row)
+        yield kind, listing_id, rows[listing_id]
+
+
+def bench_engine(args, names):
+    rows = {n + 1: listing_row(n + 1, listing)
+            for n, listing in enumerate(synthetic_listings(args.listings, names, seed=args.seed))}
+    books = OrderBooks(args.match_limit)
+    start = time.perf_counter()
+    books.load(rows.values())
+    load_seconds = time.perf_counter() - start
+    print(f"{len(books)} listings in {len(books.books)} books: loaded in {load_seconds:.2f}s "
+          f"({len(books) / load_seconds:,.0f} listings/s), peak RSS {peak_rss() / 1e6:.0f} MB")
+
+    start = time.perf_counter()
+    pairs = sum(len(books.matches(item)) for item in list(books.books) if books.summary(item))
+    elapsed = time.perf_counter() - start
+    print(f"full pass: summary + matches of {len(books.books)} items in {elapsed * 1000:.0f} ms "
+          f"({elapsed / len(books.books) * 1e6:.0f} µs per item, {pairs} pairs)")
+
+    timings = {kind: [] for kind in UPDATE_MIX}
+    for kind, listing_id, row in update_rows(rows, args.updates, names, args.seed):
+        start = time.perf_counter()
+        items = books.upsert(row) if row is not None else {books.remove(listing_id)}
+        for item in items:
+            if books.summary(item) is not None:
+                books.matches(item)
+        timings[kind].append(time.perf_counter() - start)
+    every = [seconds for values in timings.values() for seconds in values]
+    print(f"\n{args.updates} updates, each with summary + matches of the touched books "
+          f"({len(every) / sum(every):,.0f} updates/s)")
+    print(f"   {'update':<10} {'count':>8} {'p50 µs':>9} {'p95 µs':>9} {'p99 µs':>9} {'max µs':>9}")
+    for kind, values in list(timings.items()) + [('all', every)]:
+        if values:
+            result = percentiles(values)
+            print(f"   {kind:<10} {len(values):>8} {result['p50']:>9.1f} {result['p95']:>9.1f} "
+                  f"{result['p99']:>9.1f} {result['max']:>9.1f}")
+    return percentiles(every)
+
+
+def bench_sync(args, names):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'marketplace.db')
+        create_marketplace_db(path, args.db_listings, seed=args.seed, names=names)
+        conn = sqlite3.connect(path)
+        try:
+            start = time.perf_counter()
+            books = rebuild(conn, args.match_limit)
+            print(f"\nmarketplace.db with {args.db_listings} listings: rebuild in {time.perf_counter() - start:.2f}s")
+            rng = random.Random(args.seed)
+            max_id = args.db_listings
+            fresh = synthetic_listings(args.batches * args.batch, names, seed=args.seed + 1)
+            timings = []
+            for _ in range(args.batches):
+                with conn:
+                    for _ in range(args.batch):
+                        kind = rng.random()
+                        if kind < 0.4:
+                            listing = next(fresh)
+                            conn.execute('INSERT INTO listings (item, price, quantity, type, seller, userId, '
+                                         'timestamp, priceMode) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                         (listing['item'], listing['price'], listing['quantity'], listing['type'],
+                                          listing['seller'], listing['userId'], int(time.time() * 1000),
+                                          listing['priceMode']))
+                        elif kind < 0.8:
+                            conn.execute('UPDATE listings SET price = ?, timestamp = ? WHERE id = ?',
+                                         (rng.randint(1, 200_000), int(time.time() * 1000), rng.randint(1, max_id)))
+                        else:
+                            conn.execute('DELETE FROM listings WHERE id = ?', (rng.randint(1, max_id),))
+                start = time.perf_counter()
+                sync(conn, books)
+                timings.append(time.perf_counter() - start)
+        finally:
+            conn.close()
+    result = percentiles(timings)
+    print(f"sync of {args.batch} server writes, {args.batches} times: p50 {result['p50'] / 1000:.2f} ms, "
+          f"p95 {result['p95'] / 1000:.2f} ms, p99 {result['p99'] / 1000:.2f} ms, max {result['max'] / 1000:.2f} ms")
+    return result
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark loading and incrementally updating the order books")
+    parser.add_argument('--listings', type=int, default=1_000_000)
+    parser.add_argument('--updates', type=int, default=100_000)
+    parser.add_argument('--match-limit', type=int, default=MATCH_LIMIT)
+    parser.add_argument('--db-listings', type=int, default=100_000, help="listings for the sync benchmark (0 skips)")
+    parser.add_argument('--batch', type=int, default=10, help="server writes per sync")
+    parser.add_argument('--batches', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    names = catalogue_names()
+    update = bench_engine(args, names)
+    if args.db_listings:
+        bench_sync(args, names)
+    print(f"\n{'✅' if update['p99'] < 1000 else '⚠️ '} p99 update {update['p99']:.1f} µs (target < 1000 µs)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
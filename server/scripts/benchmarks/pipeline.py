@@ -0,0 +1,163 @@
+"""
+End-to-end benchmark of the catalogue refresh against the local wiki stand-in.
+
+For each catalogue size a stand-in (bazaar_data.standin) serves a synthetic
+Special:Ask export with the given latency and error rate, and the stages are
+timed separately:
+
+    fetch    fetch_pages over the stand-in, paging until the short page
+    clean    read_csv of every page + clean_items
+    persist  items.json + items.db (rebuild_items_db) in a temporary directory
+    images   sync_images for the first --images items into an ImageStore
+
+Results (timings, rows/s, HTTP status counts, retries, environment) are
+written as JSON to benchmarks/results/ and compared with the newest earlier
+result that used the same settings, so regressions show up as a trend.
+
+    cd server/scripts && python3 -m benchmarks.pipeline --sizes 1000 10000 100000
+    cd server/scripts && python3 -m benchmarks.pipeline --sizes 1000000 --latency 0.02 --error-rate 0.01
+"""
+
+import io
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from bazaar_data.clean import clean_items
+from bazaar_data.fetch import PAGE_LIMIT, fetch_pages
+from bazaar_data.naming import safe_filename
+from bazaar_data.persist import rebuild_items_db
+from bazaar_data.pipeline import write_items_json
+from bazaar_data.standin import SyntheticCatalogue, start_standin
+from bazaar_data.store import ImageStore
+from bazaar_data.sync import ImageJob, sync_images
+
+from .common import RESULTS_DIR, environment, previous_result, save_result
+
+STAGES = ('fetch', 'clean', 'persist', 'images')
+# Relative slowdown reported as a regression
+REGRESSION_THRESHOLD = 0.10
+
+
+def timed(func):
+    start = time.perf_counter()
+    value = func()
+    return value, time.perf_counter() - start
+
+
+def clean_pages(pages):
+    frames = [pd.read_csv(io.BytesIO(page.content), encoding='utf-8') for page in pages if page.rows]
+    return clean_items(pd.concat(frames, ignore_index=True)).to_dict(orient='records')
+
+
+def run_size(size, args, workdir):
+    """Stage timings for one synthetic catalogue size"""
+    server, base_url = start_standin(SyntheticCatalogue(size, args.seed), latency=args.latency,
+                                     jitter=args.jitter, error_rate=args.error_rate, seed=args.seed)
+    stages = {}
+    try:
+        pages, elapsed = timed(lambda: fetch_pages(base_url, max_pages=size // PAGE_LIMIT + 2,
+                                                   backoff=args.backoff))
+        fetch_statuses = dict(server.stats)
+        stages['fetch'] = {
+            'seconds': elapsed, 'rows': sum(page.rows for page in pages), 'requests': sum(fetch_statuses.values()),
+            'retries': sum(page.attempts - 1 for page in pages), 'bytes': sum(len(page.content) for page in pages),
+            'statuses': fetch_statuses,
+        }
+
+        items, elapsed = timed(lambda: clean_pages(pages))
+        stages['clean'] = {'seconds': elapsed, 'rows_in': stages['fetch']['rows'], 'rows': len(items)}
+        del pages
+
+        data_dir = os.path.join(workdir, f'data-{size}')
+        os.makedirs(data_dir)
+        _, json_time = timed(lambda: write_items_json(items, os.path.join(data_dir, 'items.json')))
+        _, db_time = timed(lambda: rebuild_items_db(items, os.path.join(data_dir, 'items.db')))
+        stages['persist'] = {'seconds': json_time + db_time, 'items_json_seconds': json_time,
+                             'items_db_seconds': db_time, 'rows': len(items),
+                             'bytes': os.path.getsize(os.path.join(data_dir, 'items.db'))}
+
+        images_dir = os.path.join(workdir, f'images-{size}')
+        jobs = [ImageJob(item['Items'], safe_filename(item['Items']),
+                         [os.path.join(images_dir, safe_filename(item['Items']))])
+                for item in items[:args.images]]
+        server.stats.clear()
+        store = ImageStore(os.path.join(workdir, f'store-{size}'))
+        (results, _), elapsed = timed(lambda: sync_images(jobs, base_url, rate=args.rate, progress_every=0,
+                                                          store=store, backoff=args.backoff))
+        stages['images'] = {
+            'seconds': elapsed, 'rows': sum(result.ok for result in results),
+            'failed': sum(not result.ok for result in results),
+            'retries': sum(result.attempts - 1 for result in results),
+            'bytes': sum(result.size for result in results), 'statuses': dict(server.stats),
+        }
+    finally:
+        server.shutdown()
+        server.server_close()
+    for stage in stages.values():
+        stage['rows_per_second'] = stage['rows'] / stage['seconds'] if stage['seconds'] else None
+    return stages
+
+
+def settings(args):
+    return {name: getattr(args, name) for name in ('latency', 'jitter', 'error_rate', 'backoff', 'images',
+                                                   'rate', 'seed')}
+
+
+def report(size, stages, previous):
+    print(f"\n{size} items")
+    print(f"   {'stage':<10} {'seconds':>9} {'rows':>9} {'rows/s':>12} {'retries':>8} {'vs previous':>12}")
+    for name in STAGES:
+        stage = stages[name]
+        change = ''
+        before = (previous or {}).get(name)
+        if before and before['seconds']:
+            delta = stage['seconds'] / before['seconds'] - 1
+            flag = '  ⚠️' if delta > REGRESSION_THRESHOLD else ''
+            change = f"{delta:+.0%}{flag}"
+        rate = f"{stage['rows_per_second']:,.0f}" if stage['rows_per_second'] else '-'
+        print(f"   {name:<10} {stage['seconds']:>9.3f} {stage['rows']:>9} {rate:>12} "
+              f"{stage.get('retries', 0):>8} {change:>12}")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Time fetch/clean/persist/images against the wiki stand-in")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10_000, 100_000],
+                        help="synthetic catalogue sizes (1000 to 1000000)")
+    parser.add_argument('--latency', type=float, default=0.0, help="stand-in seconds per response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="extra uniform stand-in delay, seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of 429/5xx responses")
+    parser.add_argument('--backoff', type=float, default=0.05, help="retry backoff base for fetch and images")
+    parser.add_argument('--images', type=int, default=500, help="images to download per size")
+    parser.add_argument('--rate', type=float, default=0, help="image requests/second (0 for unlimited)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--results-dir', default=RESULTS_DIR)
+    parser.add_argument('--no-save', action='store_true', help="do not write a result file")
+    args = parser.parse_args(argv)
+
+    current_settings = settings(args)
+    previous = previous_result(args.results_dir, current_settings, prefix='pipeline-')
+    result = {'timestamp': datetime.now().isoformat(timespec='seconds'), 'environment': environment(),
+              'settings': current_settings, 'sizes': {}}
+    if previous:
+        print(f"Comparing with {previous['timestamp']} (commit {previous['environment'].get('commit')})")
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            stages = run_size(size, args, workdir)
+            result['sizes'][str(size)] = stages
+            report(size, stages, ((previous or {}).get('sizes') or {}).get(str(size)))
+
+    if not args.no_save:
+        path = save_result(result, args.results_dir, 'pipeline')
+        print(f"\nResults written to {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Run the query-plan advisor against synthetic marketplace.db files.
+
+For each size, builds a marketplace.db with that many listings plus users and
+offers (server.js schema and indexes), optionally adds what the scrape adds
+(the stats indexes, listings_fts), then profiles the server.js query set,
+creates the proposed indexes and profiles it again. The before/after report
+of every size is printed, and with --json saved as one file per size.
+
+    cd server/scripts && python3 -m benchmarks.queryplan --sizes 10000 100000 1000000
+    cd server/scripts && python3 -m benchmarks.queryplan --sizes 200000 --pipeline-indexes --fts --plans
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+from bazaar_data.queryplan import REPEAT, print_report, run_advisor
+
+from .marketplace import add_users_and_offers, catalogue_names, create_marketplace_db
+
+
+def build_db(path, size, offers, fts, pipeline_indexes, names, seed=0):
+    """Synthetic marketplace.db as server.js (and optionally the scrape) leaves it; returns build seconds"""
+    elapsed = create_marketplace_db(path, size, seed=seed, names=names)
+    add_users_and_offers(path, offers, seed=seed)
+    if fts or pipeline_indexes:
+        from bazaar_data.search import ensure_listings_search
+        from bazaar_data.stats import ensure_schema
+
+        conn = sqlite3.connect(path)
+        try:
+            with conn:
+                if pipeline_indexes:
+                    ensure_schema(conn)
+                if fts:
+                    ensure_listings_search(conn)
+        finally:
+            conn.close()
+    return elapsed
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Profile the server.js queries and proposed indexes at several sizes")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--offers-per-listing', type=float, default=0.1)
+    parser.add_argument('--fts', action='store_true', help="add listings_fts, as the scrape does")
+    parser.add_argument('--pipeline-indexes', action='store_true',
+                        help="add the indexes the stats stage creates, as on a scraped database")
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--plans', action='store_true', help="print the query plans before and after")
+    parser.add_argument('--json', help="directory to save one report per size in")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    names = catalogue_names()
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            path = os.path.join(tmp, f"marketplace-{size}.db")
+            offers = int(size * args.offers_per_listing)
+            elapsed = build_db(path, size, offers, args.fts, args.pipeline_indexes, names, args.seed)
+            print(f"\n{size} listings, {offers} offers (generated in {elapsed:.1f}s, "
+                  f"database {os.path.getsize(path) / 1e6:.0f} MB)")
+            report = run_advisor(path, apply=False, repeat=args.repeat)
+            print_report(report, args.plans)
+            if args.json:
+                os.makedirs(args.json, exist_ok=True)
+                report['db'] = {'listings': size, 'offers': offers, 'fts': args.fts,
+                                'pipeline_indexes': args.pipeline_indexes}
+                with open(os.path.join(args.json, f"queryplan-{size}.json"), 'w', encoding='utf-8') as f:
+                    json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
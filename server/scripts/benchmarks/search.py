@@ -0,0 +1,93 @@
+"""
+Benchmark LIKE scans against the FTS5 listings index.
+
+For each size, builds a synthetic marketplace.db, adds listings_fts, and
+times the queries /api/listings-with-items runs: a page of the newest
+matches plus the total count, once with '%term%' LIKE and once through
+listings_fts. Rare and common item terms and a seller term are all timed.
+
+    cd server/scripts && python3 -m benchmarks.search --sizes 10000 100000 1000000
+"""
+
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from bazaar_data.search import ensure_listings_search, match_query
+
+from .marketplace import catalogue_names, create_marketplace_db
+
+# (column, term) pairs, from very common to rare
+TERMS = [('item', 'Potion'), ('item', 'Strength Cryonae'), ('item', 'Mixed Veg'), ('item', 'Quarterstaff'),
+         ('item', 'Anemone'), ('seller', 'trader0042')]
+PAGE = 50
+
+
+def like_queries(column):
+    return (f'SELECT * FROM listings WHERE {column} LIKE ? ORDER BY timestamp DESC LIMIT {PAGE}',
+            f'SELECT COUNT(*) FROM listings WHERE {column} LIKE ?')
+
+
+FTS_QUERIES = (
+    f'SELECT * FROM listings WHERE id IN (SELECT rowid FROM listings_fts WHERE listings_fts MATCH ?) '
+    f'ORDER BY timestamp DESC LIMIT {PAGE}',
+    'SELECT COUNT(*) FROM listings WHERE id IN (SELECT rowid FROM listings_fts WHERE listings_fts MATCH ?)',
+)
+
+
+def time_queries(conn, queries, parameter, repeat):
+    """Best-of-`repeat` seconds for the page + count queries, and the count"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(queries[0], (parameter,)).fetchall()
+        count = conn.execute(queries[1], (parameter,)).fetchone()[0]
+        best = min(best, time.perf_counter() - start)
+    return best, count
+
+
+def run_size(path, size, names, repeat):
+    build_time = create_marketplace_db(path, size, names=names)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute('CREATE INDEX idx_listings_timestamp ON listings(timestamp)')
+        start = time.perf_counter()
+        with conn:
+            ensure_listings_search(conn)
+        index_time = time.perf_counter() - start
+        print(f"\n{size} listings (generated in {build_time:.1f}s, FTS index built in {index_time:.2f}s, "
+              f"database {os.path.getsize(path) / 1e6:.0f} MB)")
+        print(f"   {'term':<28} {'matches':>9} {'LIKE ms':>10} {'FTS ms':>10} {'speedup':>8}")
+        speedups = []
+        for column, term in TERMS:
+            like_time, like_count = time_queries(conn, like_queries(column), f'%{term}%', repeat)
+            fts_time, fts_count = time_queries(conn, FTS_QUERIES, match_query(term, column), repeat)
+            speedups.append(like_time / fts_time)
+            label = f"{column}: {term}"
+            print(f"   {label:<28} {fts_count:>9} {like_time * 1000:>10.2f} {fts_time * 1000:>10.2f} "
+                  f"{like_time / fts_time:>7.1f}x" + ('' if like_count == fts_count else f"  (LIKE: {like_count})"))
+        print(f"   median speedup {statistics.median(speedups):.1f}x")
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark LIKE vs FTS5 listing search")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    names = catalogue_names()
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            run_size(os.path.join(tmp, f'marketplace-{size}.db'), size, names, args.repeat)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,41 @@
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# The tests import bazaar_data the way the scripts do, from server/scripts
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+@pytest.fixture
+def fixture_path():
+    """Path of a file in tests/fixtures"""
+    return lambda name: os.path.join(FIXTURES_DIR, name)
+
+
+@pytest.fixture
+def snapshots(fixture_path):
+    """The two items.json catalogue snapshots, before and after"""
+    loaded = []
+    for name in ('items_before.json', 'items_after.json'):
+        with open(fixture_path(name), 'r', encoding='utf-8') as f:
+            loaded.append(json.load(f))
+    return tuple(loaded)
+
+
+@pytest.fixture
+def marketplace_db(fixture_path, tmp_path):
+    """A marketplace.db built from fixtures/marketplace.sql"""
+    path = str(tmp_path / 'marketplace.db')
+    with open(fixture_path('marketplace.sql'), 'r', encoding='utf-8') as f:
+        script = f.read()
+    conn = sqlite3.connect(path)
+    conn.executescript(script)
+    conn.close()
+    return path
@@ -0,0 +1,42 @@
+-- listings as server.js creates them, with names from before and after catalogue changes
+CREATE TABLE listings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item TEXT NOT NULL,
+    price INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    category TEXT,
+    seller TEXT NOT NULL,
+    userId TEXT,
+    sellerAvatar TEXT,
+    timestamp INTEGER NOT NULL,
+    IGN TEXT,
+    priceMode TEXT DEFAULT 'Each',
+    combatCategory TEXT,
+    combatLevel TEXT,
+    combatStrength TEXT,
+    combatDmgType TEXT,
+    notes TEXT
+);
+
+INSERT INTO listings (id, item, price, quantity, type, seller, userId, timestamp) VALUES
+    -- current names
+    (1, 'Bronze Sword', 1200, 1, 'sell', 'Ada', 'u1', 1700000000000),
+    (2, 'Copper Ore', 15, 100, 'buy', 'Ben', 'u2', 1700000001000),
+    -- renamed on the wiki (Ruby Ring -> Crimson Ring in the catalogue diff)
+    (3, 'Ruby Ring', 50000, 1, 'sell', 'Cal', 'u3', 1700000002000),
+    (4, 'Ruby Ring', 48000, 2, 'buy', 'Dee', 'u4', 1700000003000),
+    -- case and spacing
+    (5, 'copper  ore', 14, 50, 'sell', 'Eve', 'u5', 1700000004000),
+    -- typos
+    (6, 'Fire Beetle Pies', 300, 10, 'sell', 'Fay', 'u6', 1700000005000),
+    (7, '+80 Potion Strenght Cryonae', 9000, 3, 'sell', 'Gus', 'u7', 1700000006000),
+    -- a number no catalogue item has
+    (8, '+60 Potion Strength Cryonae', 7000, 1, 'buy', 'Hal', 'u8', 1700000007000),
+    -- two catalogue items normalize to the same name
+    (9, 'bone dagger', 800, 1, 'sell', 'Ivy', 'u9', 1700000008000),
+    -- best candidate barely ahead of the runner-up
+    (10, 'Steel Shield', 2500, 1, 'sell', 'Jon', 'u10', 1700000009000),
+    -- best candidate below MIN_SCORE
+    (11, 'Oak Plank', 40, 200, 'buy', 'Kim', 'u11', 1700000010000),
+    (12, 'Mysterious Thing', 1, 1, 'sell', 'Lou', 'u12', 1700000011000);
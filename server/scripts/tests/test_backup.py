@@ -0,0 +1,63 @@
+import sqlite3
+import sys
+
+import pytest
+
+from bazaar_data.backup import BackupError, backup, copy_database
+
+# bazaar_data re-exports backup() under the module's name
+backup_module = sys.modules['bazaar_data.backup']
+
+
+@pytest.fixture
+def large_db(tmp_path):
+    path = str(tmp_path / 'marketplace.db')
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute('CREATE TABLE listings (id INTEGER PRIMARY KEY, notes TEXT)')
+        conn.executemany('INSERT INTO listings (notes) VALUES (?)', (('x' * 500,) for _ in range(2000)))
+    conn.close()
+    return path
+
+
+def write_between_steps(monkeypatch, path):
+    """Make every pause between backup steps commit a write to the source, as a busy server would"""
+    def sleep(seconds):
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.execute("INSERT INTO listings (notes) VALUES ('new')")
+        conn.close()
+    monkeypatch.setattr(backup_module.time, 'sleep', sleep)
+
+
+def test_unchanged_database_keeps_the_previous_snapshot(large_db, tmp_path):
+    backups = str(tmp_path / 'backups')
+    first, created = backup(large_db, backups, latest_path='', compression='gzip', pages=16)
+    assert created and first.restarts == 0 and first.steps > 1
+    second, created = backup(large_db, backups, latest_path='', compression='gzip', pages=16)
+    assert not created and second.name == first.name
+
+
+def test_copy_under_constant_writes_gives_up(large_db, tmp_path, monkeypatch):
+    write_between_steps(monkeypatch, large_db)
+    with pytest.raises(BackupError):
+        copy_database(large_db, str(tmp_path / 'copy.db'), pages=4)
+
+
+def test_copy_survives_occasional_writes(large_db, tmp_path, monkeypatch):
+    writes = []
+
+    def sleep(seconds):
+        # One write during the first attempt only
+        if not writes:
+            conn = sqlite3.connect(large_db)
+            with conn:
+                conn.execute("INSERT INTO listings (notes) VALUES ('new')")
+            conn.close()
+            writes.append(seconds)
+    monkeypatch.setattr(backup_module.time, 'sleep', sleep)
+    timings = copy_database(large_db, str(tmp_path / 'copy.db'), pages=4)
+    assert timings['restarts'] == 1
+    conn = sqlite3.connect(str(tmp_path / 'copy.db'))
+    assert conn.execute('SELECT COUNT(*) FROM listings').fetchone()[0] == 2001
+    conn.close()
@@ -0,0 +1,56 @@
+import json
+
+from bazaar_data.diff import attribute_hash, catalogue_index, diff_catalogues, is_empty, item_hash, main
+
+
+def diff_snapshots(snapshots):
+    before, after = snapshots
+    return diff_catalogues(catalogue_index(before), catalogue_index(after))
+
+
+def test_added_removed_and_updated(snapshots):
+    diff = diff_snapshots(snapshots)
+    assert 'Moon Shield' in diff['added']
+    assert diff['removed'] == ['Old Lantern', 'Plain Cloak', 'Twin Dagger A', 'Twin Dagger B']
+    assert diff['updated'] == ['Iron Helm']
+    assert diff['unchanged'] == 1
+
+
+def test_unique_attributes_pair_as_a_rename(snapshots):
+    diff = diff_snapshots(snapshots)
+    assert diff['renamed'] == [{'from': 'Ruby Ring', 'to': 'Crimson Ring'}]
+    assert 'Ruby Ring' not in diff['removed'] and 'Crimson Ring' not in diff['added']
+
+
+def test_ambiguous_renames_are_not_paired(snapshots):
+    diff = diff_snapshots(snapshots)
+    # Two removed and two added daggers share one attribute hash, as do one
+    # removed and two added cloaks: neither is a rename
+    renamed = {name for pair in diff['renamed'] for name in (pair['from'], pair['to'])}
+    assert not renamed & {'Twin Dagger A', 'Twin Dagger B', 'Twin Dagger Left', 'Twin Dagger Right',
+                          'Plain Cloak', 'Plain Cloak (Red)', 'Plain Cloak (Blue)'}
+    assert diff['added'] == ['Moon Shield', 'Plain Cloak (Blue)', 'Plain Cloak (Red)', 'Twin Dagger Left',
+                             'Twin Dagger Right']
+
+
+def test_hashes_ignore_name_and_derived_fields(snapshots):
+    before, _ = snapshots
+    item = before[0]
+    renamed = dict(item, Items='Other', Image='/assets/items/Other.png')
+    assert attribute_hash(renamed) == attribute_hash(item)
+    assert item_hash(renamed) != item_hash(item)
+    with_variants = dict(item, Variants={'webp': '/assets/items/webp/Bronze_Sword.webp'})
+    assert item_hash(with_variants) == item_hash(item)
+
+
+def test_identical_snapshots_are_empty(snapshots):
+    before, _ = snapshots
+    diff = diff_catalogues(catalogue_index(before), catalogue_index(before))
+    assert is_empty(diff) and diff['unchanged'] == len(before)
+
+
+def test_main_writes_the_diff(fixture_path, tmp_path):
+    output = tmp_path / 'items_diff.json'
+    assert main([fixture_path('items_before.json'), fixture_path('items_after.json'), '--output', str(output)]) == 0
+    written = json.loads(output.read_text(encoding='utf-8'))
+    assert written['updated'] == ['Iron Helm'] and 'generated_at' in written
@@ -0,0 +1,33 @@
+import json
+import os
+
+from bazaar_data.history import DAY_MS, connect, main, prune, record_points, rollup
+
+
+def test_prune_counts_points_and_buckets_separately(tmp_path):
+    conn = connect(str(tmp_path / 'history.db'))
+    now = 400 * DAY_MS
+    with conn:
+        # Two raw points past the 30-day retention, one inside it
+        record_points(conn, [('Cake', now - days * DAY_MS, bid, 20, 1, 1, 2)
+                             for days, bid in ((100, 10), (95, 11), (1, 12))])
+    rollup(conn, 0)
+    hours = conn.execute("SELECT COUNT(*) FROM price_rollups WHERE interval = 'hour'").fetchone()[0]
+    assert prune(conn, now) == (2, hours - 1)
+    assert conn.execute('SELECT COUNT(*) FROM price_points').fetchone()[0] == 1
+    conn.close()
+
+
+def test_backfill_keeps_everything_it_replayed(tmp_path, capsys):
+    listings = [{'id': 1, 'item': 'Cake', 'type': 'sell', 'price': 50, 'quantity': 1, 'priceMode': 'Each',
+                 'timestamp': 1_000_000}]
+    source = tmp_path / 'listings.json'
+    source.write_text(json.dumps(listings))
+    # Dumped long ago, so every replayed point is past the raw retention
+    os.utime(source, (10 * DAY_MS / 1000, 10 * DAY_MS / 1000))
+    history_db = str(tmp_path / 'history.db')
+    assert main(['--history-db', history_db, 'backfill', str(source)]) == 0
+    assert 'Backfilled 2 price points' in capsys.readouterr().out
+    conn = connect(history_db)
+    assert conn.execute('SELECT COUNT(*) FROM price_points').fetchone()[0] == 2
+    conn.close()
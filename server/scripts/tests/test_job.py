@@ -0,0 +1,115 @@
+import json
+import os
+import time
+
+import pytest
+
+from bazaar_data import job as job_module
+from bazaar_data import pipeline as pipeline_module
+from bazaar_data.job import (CHECKPOINT_NAME, CHECKPOINT_VERSION, LOCK_NAME, MAX_CHECKPOINT_AGE, Checkpoint, JobLocked,
+                             exclusive_lock, read_last_run, run_job)
+from bazaar_data.pipeline import Pipeline, PipelineError
+from bazaar_data.standin import SyntheticCatalogue, start_standin
+
+STAGES = ['fetch', 'record', 'clean', 'diff', 'persist']
+
+
+@pytest.fixture
+def standin():
+    server, base_url = start_standin(SyntheticCatalogue(40, seed=2))
+    yield base_url
+    server.shutdown()
+    server.server_close()
+
+
+def make_pipeline(tmp_path, base_url):
+    return Pipeline(data_dir=str(tmp_path / 'data'), images_dir=str(tmp_path / 'assets' / 'items'),
+                    base_url=base_url, lean=True, metrics_dir=str(tmp_path / 'metrics'))
+
+
+def statuses(pipeline):
+    return {stage.stage: stage.status for stage in pipeline.metrics.stages}
+
+
+def test_lock_is_exclusive(tmp_path):
+    path = str(tmp_path / LOCK_NAME)
+    with exclusive_lock(path):
+        with pytest.raises(JobLocked, match=f"pid {os.getpid()}"):
+            with exclusive_lock(path):
+                pass
+    # Released again once the holder is done
+    with exclusive_lock(path):
+        pass
+
+
+def test_locked_job_skips(tmp_path, capsys):
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    with exclusive_lock(str(data_dir / LOCK_NAME)):
+        assert run_job(make_pipeline(tmp_path, 'http://127.0.0.1:9'), force=True) == 0
+    assert 'Skipping: another run holds' in capsys.readouterr().out
+    assert read_last_run(str(data_dir)) is None
+
+
+@pytest.mark.parametrize('interrupted', STAGES[1:])
+def test_resumes_after_each_checkpointed_stage(standin, tmp_path, monkeypatch, interrupted):
+    def fail(pipeline):
+        raise PipelineError("interrupted")
+
+    fail.__name__ = f'{interrupted}_stage'
+    monkeypatch.setattr(pipeline_module, fail.__name__, fail)
+    assert run_job(make_pipeline(tmp_path, standin)) == 1
+    completed = STAGES[:STAGES.index(interrupted)]
+    saved = json.loads((tmp_path / 'data' / CHECKPOINT_NAME).read_text())
+    assert list(saved['stages']) == completed
+    assert read_last_run(str(tmp_path / 'data')) is None
+
+    monkeypatch.undo()
+    resumed = make_pipeline(tmp_path, standin)
+    assert run_job(resumed) == 0
+    assert resumed.checkpoint.resumed
+    assert [stage for stage, status in statuses(resumed).items() if status == 'skipped'] == completed
+    assert not (tmp_path / 'data' / CHECKPOINT_NAME).exists()
+    assert read_last_run(str(tmp_path / 'data')) is not None
+
+    # The resumed run publishes what an uninterrupted one does
+    reference = tmp_path / 'reference'
+    reference.mkdir()
+    assert run_job(make_pipeline(reference, standin)) == 0
+    assert (tmp_path / 'data' / 'items.json').read_bytes() == (reference / 'data' / 'items.json').read_bytes()
+
+
+def test_stale_checkpoint_is_discarded(tmp_path):
+    data_dir = tmp_path / 'data'
+    (data_dir / 'scrape_job').mkdir(parents=True)
+    (data_dir / 'scrape_job' / 'items.json').write_text('[]')
+    state = {'version': CHECKPOINT_VERSION, 'started_at': int(time.time() - MAX_CHECKPOINT_AGE - 60),
+             'incremental': True, 'stages': {'fetch': {}, 'clean': {}}, 'images': {}}
+    (data_dir / CHECKPOINT_NAME).write_text(json.dumps(state))
+
+    assert not Checkpoint.pending(str(data_dir))
+    checkpoint = Checkpoint(str(data_dir), incremental=False)
+    assert not checkpoint.resumed
+    assert checkpoint.state['stages'] == {} and not checkpoint.incremental
+    assert not (data_dir / CHECKPOINT_NAME).exists() and not (data_dir / 'scrape_job').exists()
+
+
+def test_recent_checkpoint_is_pending(tmp_path):
+    data_dir = str(tmp_path)
+    checkpoint = Checkpoint(data_dir)
+    checkpoint.save()
+    assert Checkpoint.pending(data_dir)
+    assert Checkpoint(data_dir).resumed
+
+
+def test_failed_images_are_retried_on_resume(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_module, 'IMAGE_CHECKPOINT_EVERY', 1)
+    checkpoint = Checkpoint(str(tmp_path))
+    checkpoint.record_image('Fire_Beetle.png', True)
+    checkpoint.record_image('Copper_Ore.png', False)
+
+    resumed = Checkpoint(str(tmp_path))
+    assert resumed.resumed
+    assert resumed.image_done('Fire_Beetle.png')
+    assert not resumed.image_done('Copper_Ore.png')
+    assert not resumed.image_done('Never_Tried.png')
@@ -0,0 +1,117 @@
+import gzip
+import io
+import json
+import sqlite3
+
+import pytest
+
+from bazaar_data.listings import (ListingError, coerce_listing, export_listings, import_listings, iter_json_array,
+                                  listing_columns, read_records)
+
+LISTING = {'item': 'Copper Ore', 'price': 15, 'quantity': 100, 'type': 'sell', 'seller': 'Ada', 'userId': 'u1',
+           'timestamp': 1700000000000}
+
+
+@pytest.fixture
+def columns():
+    return listing_columns(sqlite3.connect(':memory:'))
+
+
+def listings(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return [dict(row) for row in conn.execute('SELECT * FROM listings ORDER BY id')]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('value, expected', [('1,000', 1000), (' 42 ', 42), (5000.0, 5000), ('5000.0', 5000), (7, 7)])
+def test_integers_are_coerced(columns, value, expected):
+    row = coerce_listing(dict(LISTING, price=value, timestamp=str(LISTING['timestamp'])), columns)
+    assert row['price'] == expected and type(row['price']) is int
+    assert row['timestamp'] == LISTING['timestamp']
+
+
+@pytest.mark.parametrize('value, reason', [('12.5', 'not a whole number'), ('cheap', 'not a number'),
+                                           (True, 'not a number'), ([15], 'not a number'), (-1, 'out of range')])
+def test_bad_prices_are_rejected(columns, value, reason):
+    with pytest.raises(ListingError, match=reason):
+        coerce_listing(dict(LISTING, price=value), columns)
+
+
+@pytest.mark.parametrize('field', ['item', 'price', 'quantity', 'type', 'seller', 'timestamp'])
+def test_required_fields(columns, field):
+    with pytest.raises(ListingError, match=f'missing {field}'):
+        coerce_listing(dict(LISTING, **{field: ''}), columns)
+
+
+def test_derived_and_normalized_fields(columns):
+    row = coerce_listing(dict(LISTING, type='SELL', contactInfo='AdaInGame', combatLevel=45, unknownField='x'),
+                         columns)
+    assert row['type'] == 'sell'
+    assert row['IGN'] == 'AdaInGame'
+    assert row['totalPrice'] == 1500
+    assert row['priceMode'] == 'Each'
+    assert row['combatLevel'] == '45'
+    assert 'unknownField' not in row and set(row) == set(columns)
+
+
+def test_missing_text_fields_are_empty_like_the_old_importer(columns):
+    row = coerce_listing(dict(LISTING, combatStrength=None), columns)
+    assert row['category'] == row['IGN'] == row['combatStrength'] == row['sellerAvatar'] == ''
+    # Columns import-listings.js never wrote stay NULL
+    assert row['notes'] is None and row['rarity'] is None
+
+
+@pytest.mark.parametrize('change, reason', [({'type': 'trade'}, 'unknown type'), ({'priceMode': 'Bulk'}, 'priceMode'),
+                                            ({'quantity': 0}, 'out of range'), ({}, 'not a listing')])
+def test_invalid_listings(columns, change, reason):
+    record = dict(LISTING, **change) if change else {}
+    with pytest.raises(ListingError, match=reason):
+        coerce_listing(record, columns)
+
+
+def test_json_array_split_across_chunks():
+    records = [dict(LISTING, price=4444.5 + n) for n in range(20)]
+    text = json.dumps(records)
+    assert list(iter_json_array(io.StringIO(text), chunk_size=7)) == records
+
+
+def test_import_rejects_bad_records_and_inserts_the_rest(tmp_path):
+    source = tmp_path / 'listings.ndjson.gz'
+    with gzip.open(source, 'wt', encoding='utf-8') as f:
+        for record in (dict(LISTING, id=50, price='1,200'), dict(LISTING, price='free'), dict(LISTING, type='Buy')):
+            f.write(json.dumps(record) + '\n')
+    db_path = str(tmp_path / 'marketplace.db')
+    report = import_listings(db_path, read_records(str(source)))
+    assert (report.read, report.inserted, report.rejected) == (3, 2, [(1, "price is not a number: 'free'")])
+    rows = listings(db_path)
+    # Insert mode ignores ids from the file
+    assert [(row['id'], row['price'], row['type']) for row in rows] == [(1, 1200, 'sell'), (2, 15, 'buy')]
+
+
+def test_upsert_only_writes_changes(tmp_path):
+    db_path = str(tmp_path / 'marketplace.db')
+    import_listings(db_path, [dict(LISTING, id=1), dict(LISTING, id=2, item='Iron Ore')], mode='upsert')
+    records = [dict(LISTING, id=1), dict(LISTING, id=2, item='Iron Ore', price='20'), dict(LISTING, id=3)]
+
+    dry = import_listings(db_path, records, mode='upsert', dry_run=True)
+    assert (dry.inserted, dry.updated, dry.unchanged) == (1, 1, 1)
+    assert dry.changes == [(2, {'price': (15, 20), 'totalPrice': (1500, 2000)})]
+    assert len(listings(db_path)) == 2
+
+    report = import_listings(db_path, records, mode='upsert')
+    assert (report.inserted, report.updated, report.unchanged) == (1, 1, 1)
+    assert [(row['id'], row['price']) for row in listings(db_path)] == [(1, 15), (2, 20), (3, 15)]
+
+
+def test_export_round_trips(tmp_path):
+    db_path = str(tmp_path / 'marketplace.db')
+    import_listings(db_path, [dict(LISTING, id=n, price=n * 10) for n in range(1, 6)], mode='upsert')
+    for name in ('listings.json', 'listings.ndjson.gz'):
+        output = str(tmp_path / name)
+        assert export_listings(db_path, output, 'json' if name.endswith('.json') else 'ndjson', batch_size=2) == 5
+        copy = str(tmp_path / f'copy-{name}.db')
+        import_listings(copy, read_records(output), mode='upsert')
+        assert listings(copy) == listings(db_path)
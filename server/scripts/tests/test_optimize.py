@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+pytest.importorskip('PIL')
+
+from PIL import Image  # noqa: E402
+
+from bazaar_data.manifest import load_manifest, scan  # noqa: E402
+from bazaar_data.optimize import load_variants, optimize_images, variant_filename  # noqa: E402
+
+
+@pytest.fixture
+def images(tmp_path):
+    directory = tmp_path / 'items'
+    directory.mkdir()
+    # Lossy WebP of 1-bit noise is several times the size of the 1-bit PNG; of RGB noise it is far smaller
+    noise = Image.effect_noise((256, 256), 200)
+    noise.point(lambda value: 255 if value > 128 else 0).convert('1').save(directory / 'Dither.png')
+    noise.convert('RGB').save(directory / 'Big.png')
+    return str(directory), scan(load_manifest(str(tmp_path / 'manifest.json')), str(directory))
+
+
+def test_drops_variants_not_smaller_than_the_source(images, tmp_path):
+    directory, files = images
+    index = load_variants(str(tmp_path / 'variants.json'))
+    optimize_images(files, directory, index, variants=['webp', 'thumb32'], workers=1)
+
+    for filename, entry in index['images'].items():
+        assert all(meta['size'] < entry['size'] for meta in entry['variants'].values())
+        for variant in entry['dropped']:
+            assert not os.path.exists(os.path.join(directory, variant_filename(filename, variant)))
+    assert list(index['images']['Dither.png']['variants']) == ['thumb32']
+    assert index['images']['Dither.png']['dropped'] == ['webp']
+    assert sorted(index['images']['Big.png']['variants']) == ['thumb32', 'webp']
+
+
+def test_dropped_variants_are_not_re_encoded(images, tmp_path):
+    directory, files = images
+    index = load_variants(str(tmp_path / 'variants.json'))
+    assert len(optimize_images(files, directory, index, variants=['webp'], workers=1)) == 2
+    assert optimize_images(files, directory, index, variants=['webp'], workers=1) == []
@@ -0,0 +1,34 @@
+import sqlite3
+
+from bazaar_data.orderbook import MAX_PENDING_CHANGES, REBUILD_CHANGES, OrderBooks, rebuild, sync
+
+
+def test_sync_applies_logged_changes(marketplace_db):
+    conn = sqlite3.connect(marketplace_db)
+    books = rebuild(conn)
+    with conn:
+        conn.execute("INSERT INTO listings (item, price, quantity, type, seller, userId, timestamp) "
+                     "VALUES ('Bronze Sword', 1300, 1, 'buy', 'Fay', 'u9', 1800000000000)")
+    assert sync(conn, books) == (1, 1)
+    spread = conn.execute("SELECT best_bid, best_ask FROM order_book_spreads WHERE item = 'Bronze Sword'").fetchone()
+    assert spread == (1300, 1200)
+    assert conn.execute('SELECT COUNT(*) FROM listing_changes').fetchone()[0] == 0
+    conn.close()
+
+
+def test_undrained_change_log_is_capped_and_rebuilt_from(marketplace_db):
+    conn = sqlite3.connect(marketplace_db)
+    rebuild(conn)
+    # Nothing drains the log between these writes, as when no watcher runs
+    with conn:
+        conn.executemany("INSERT INTO listings (item, price, quantity, type, seller, timestamp) "
+                         "VALUES ('Copper Ore', ?, 1, 'sell', 'Gus', 1800000000000)",
+                         ((price,) for price in range(1, MAX_PENDING_CHANGES + 500)))
+    assert conn.execute('SELECT COUNT(*) FROM listing_changes').fetchone()[0] == MAX_PENDING_CHANGES
+
+    books = OrderBooks()
+    changes, _ = sync(conn, books)
+    assert changes == -1 and MAX_PENDING_CHANGES > REBUILD_CHANGES
+    assert conn.execute("SELECT best_ask FROM order_book_spreads WHERE item = 'Copper Ore'").fetchone() == (1,)
+    assert conn.execute('SELECT COUNT(*) FROM listing_changes').fetchone()[0] == 0
+    conn.close()
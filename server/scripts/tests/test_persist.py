@@ -0,0 +1,68 @@
+import sqlite3
+
+from bazaar_data.diff import catalogue_index, diff_catalogues
+from bazaar_data.persist import ITEM_FIELDS, apply_item_diff, rebuild_items_db
+
+ITEMS = [
+    {'Items': 'Bronze Sword', 'Image': '/assets/items/Bronze_Sword.png', 'Episode': 'Hopeport', 'Variant of': 'None',
+     'Profession A': 'Combat', 'Profession Level A': '10', 'Profession B': 'None', 'Profession Level B': 'None',
+     'Tradeable': True},
+    {'Items': 'Grand Anvil', 'Image': '/assets/items/Grand_Anvil.png', 'Episode': 'Hopeforest',
+     'Variant of': 'Anvil', 'Profession A': 'Blacksmithing', 'Profession Level A': '1000',
+     'Profession B': 'Combat', 'Profession Level B': '12500', 'Tradeable': 'unknown'},
+    {'Items': 'Old Boot', 'Image': None, 'Episode': 'None', 'Variant of': 'None', 'Profession A': 'None',
+     'Profession Level A': 'None', 'Profession B': 'None', 'Profession Level B': 'None', 'Tradeable': True},
+]
+
+# items.db as the scrape wrote it before the normalized schema
+LEGACY_TABLE = '''CREATE TABLE items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, Items TEXT, Image TEXT, Episode TEXT, [Variant of] TEXT,
+    [Profession A] TEXT, [Profession Level A] TEXT, [Profession B] TEXT, [Profession Level B] TEXT, Tradeable TEXT)'''
+COLUMNS = ', '.join(f'[{field}]' for field in ITEM_FIELDS)
+
+
+def legacy_rows(items):
+    conn = sqlite3.connect(':memory:')
+    conn.execute(LEGACY_TABLE)
+    conn.executemany(f'INSERT INTO items ({COLUMNS}) VALUES ({", ".join("?" * len(ITEM_FIELDS))})',
+                     [tuple(item.get(field) for field in ITEM_FIELDS) for item in items])
+    return conn.execute(f'SELECT {COLUMNS} FROM items ORDER BY Items').fetchall()
+
+
+def view_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(f'SELECT {COLUMNS} FROM items ORDER BY Items').fetchall()
+    finally:
+        conn.close()
+
+
+def test_view_matches_legacy_table(tmp_path):
+    db_path = str(tmp_path / 'items.db')
+    assert rebuild_items_db(ITEMS, db_path) == len(ITEMS)
+    assert view_rows(db_path) == legacy_rows(ITEMS)
+
+
+def test_levels_have_no_digit_separators(tmp_path):
+    db_path = str(tmp_path / 'items.db')
+    rebuild_items_db(ITEMS, db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT [Profession Level A], [Profession Level B] FROM items WHERE Items = 'Grand Anvil'")
+        assert rows.fetchone() == ('1000', '12500')
+        # Level filters compare the text the way server.js does
+        assert conn.execute("SELECT COUNT(*) FROM items WHERE CAST([Profession Level A] AS INTEGER) >= 1000") \
+            .fetchone()[0] == 1
+    finally:
+        conn.close()
+
+
+def test_incremental_apply_keeps_the_view_compatible(tmp_path):
+    db_path = str(tmp_path / 'items.db')
+    rebuild_items_db(ITEMS, db_path)
+    items = ITEMS + [dict(ITEMS[0], Items='Silver Sword', Image='/assets/items/Silver_Sword.png',
+                          **{'Profession Level A': '2500'})]
+    diff = diff_catalogues(catalogue_index(ITEMS), catalogue_index(items))
+    assert diff['added'] == ['Silver Sword']
+    apply_item_diff(db_path, diff, items)
+    assert view_rows(db_path) == legacy_rows(items)
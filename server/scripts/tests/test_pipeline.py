@@ -0,0 +1,78 @@
+import json
+import os
+
+import pytest
+
+from bazaar_data.naming import safe_filename
+from bazaar_data.pipeline import Pipeline, run
+from bazaar_data.standin import SyntheticCatalogue, start_standin
+
+
+@pytest.fixture
+def standin():
+    server, base_url = start_standin(SyntheticCatalogue(40, seed=1), strict_images=True)
+    yield base_url
+    server.shutdown()
+    server.server_close()
+
+
+def make_pipeline(tmp_path, base_url, incremental):
+    return Pipeline(data_dir=str(tmp_path / 'data'), images_dir=str(tmp_path / 'assets' / 'items'),
+                    base_url=base_url, incremental=incremental, lean=True, metrics_dir=str(tmp_path / 'metrics'))
+
+
+def item_images(tmp_path):
+    with open(tmp_path / 'data' / 'items.json', 'r', encoding='utf-8') as f:
+        items = json.load(f)
+    return [tmp_path / 'assets' / 'items' / safe_filename(item['Items']) for item in items if item['Image']]
+
+
+def test_unchanged_pages_still_fetch_missing_images(standin, tmp_path):
+    os.makedirs(tmp_path / 'data')
+    assert run(make_pipeline(tmp_path, standin, incremental=False)) == 0
+    images = item_images(tmp_path)
+    assert images and all(path.exists() for path in images)
+
+    # A download that failed (or a file lost since) is picked up by the next run,
+    # even though no catalogue page changed
+    images[0].unlink()
+    images[-1].unlink()
+    pipeline = make_pipeline(tmp_path, standin, incremental=True)
+    assert run(pipeline) == 0
+    assert not pipeline.pages_changed
+    assert all(path.exists() for path in images)
+    statuses = {stage.stage: stage.status for stage in pipeline.metrics.stages}
+    assert statuses['persist'] == 'skipped' and statuses['images'] != 'skipped'
+
+
+def test_unchanged_pages_leave_items_json_alone(standin, tmp_path):
+    os.makedirs(tmp_path / 'data')
+    assert run(make_pipeline(tmp_path, standin, incremental=False)) == 0
+    items_json = tmp_path / 'data' / 'items.json'
+    before = items_json.read_bytes()
+    assert run(make_pipeline(tmp_path, standin, incremental=True)) == 0
+    assert items_json.read_bytes() == before
+    assert b'Variants' not in before
+
+
+def test_images_are_fetched_by_wiki_name_and_saved_under_safe_filename(tmp_path):
+    # The wiki file name keeps characters safe_filename() replaces
+    rows = [['+80 Potion Strength Cryonae', 'File:+80 Potion Strength Cryonae.png', 'Hopeport',
+             '', 'Alchemist', '80', '', '', 'true'],
+            ['Bone Boots (fine)', 'File:Bone Boots (fine).png', 'Hopeforest', '', 'Bonewright', '12', '', '', 'true'],
+            ['Mystery Shard', '', 'Hopeport', '', '', '', '', '', 'true']]
+    server, base_url = start_standin(rows, strict_images=True)
+    try:
+        os.makedirs(tmp_path / 'data')
+        assert run(make_pipeline(tmp_path, base_url, incremental=False)) == 0
+        assert server.stats[404] == 0
+    finally:
+        server.shutdown()
+        server.server_close()
+    images = tmp_path / 'assets' / 'items'
+    assert (images / '_80_Potion_Strength_Cryonae.png').exists()
+    assert (images / 'Bone_Boots__fine_.png').exists()
+    assert not (images / 'Mystery_Shard.png').exists()
+    # The content store stays with the data, outside the served assets
+    assert (tmp_path / 'data' / 'image_store').is_dir()
+    assert not any(path.name.startswith('.') for path in (tmp_path / 'assets').rglob('*'))
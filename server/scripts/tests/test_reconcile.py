@@ -0,0 +1,141 @@
+import json
+import sqlite3
+
+import pytest
+
+from bazaar_data.reconcile import MIN_SCORE, NameIndex, apply_renames, listing_names, main, reconcile
+
+RENAMED = {'Ruby Ring': 'Crimson Ring'}
+UNRESOLVED = ['+60 Potion Strength Cryonae', 'Mysterious Thing', 'Oak Plank', 'Steel Shield', 'bone dagger']
+
+
+@pytest.fixture
+def item_names(fixture_path):
+    with open(fixture_path('reconcile_items.json'), 'r', encoding='utf-8') as f:
+        return [item['Items'] for item in json.load(f)]
+
+
+def items_by_id(path):
+    conn = sqlite3.connect(path)
+    try:
+        return dict(conn.execute('SELECT id, item FROM listings'))
+    finally:
+        conn.close()
+
+
+def test_match_methods(item_names):
+    index = NameIndex(item_names)
+    assert index.match('Bronze Sword') is None
+    diff, normalized = index.match('Ruby Ring', RENAMED), index.match('copper  ore')
+    assert (diff.new, diff.method) == ('Crimson Ring', 'diff')
+    assert (normalized.new, normalized.method) == ('Copper Ore', 'normalized')
+    fuzzy = index.match('Fire Beetle Pies')
+    assert (fuzzy.new, fuzzy.method) == ('Fire Beetle Pie', 'fuzzy') and MIN_SCORE <= fuzzy.score < 1
+
+
+def test_diff_rename_must_point_at_a_catalogue_item(item_names):
+    assert NameIndex(item_names).match('Ruby Ring', {'Ruby Ring': 'Garnet Ring'}) is None
+
+
+def test_numbers_must_match_exactly(item_names):
+    index = NameIndex(item_names)
+    assert index.match('+80 Potion Strenght Cryonae').new == '+80 Potion Strength Cryonae'
+    assert index.match('+60 Potion Strength Cryonae') is None
+
+
+def test_ambiguous_and_weak_candidates_are_rejected(item_names):
+    index = NameIndex(item_names)
+    # 'Bone Dagger' and 'Bone-Dagger' normalize alike and score alike
+    assert index.match('bone dagger') is None
+    # 'Steel Shield Red' leads 'Steel Shield Blue' by less than MIN_MARGIN
+    assert index.fuzzy('Steel Shield') is None
+    # 'Oak Planks' is the only candidate but scores below MIN_SCORE
+    assert index.fuzzy('Oak Plank') is None
+
+
+def test_reconcile_only_applies_reviewed_methods(marketplace_db, item_names):
+    renames, unresolved, updated = reconcile(marketplace_db, item_names, RENAMED)
+    assert {old: (rename.new, rename.method, rename.listings, rename.applied) for old, rename in renames.items()} == {
+        'Ruby Ring': ('Crimson Ring', 'diff', 2, True),
+        'copper  ore': ('Copper Ore', 'normalized', 1, True),
+        'Fire Beetle Pies': ('Fire Beetle Pie', 'fuzzy', 1, False),
+        '+80 Potion Strenght Cryonae': ('+80 Potion Strength Cryonae', 'fuzzy', 1, False),
+    }
+    assert sorted(unresolved) == UNRESOLVED
+    assert updated == 3
+    items = items_by_id(marketplace_db)
+    assert [items[listing_id] for listing_id in (3, 4, 5)] == ['Crimson Ring', 'Crimson Ring', 'Copper Ore']
+    # Fuzzy matches stay proposals: listings keep the name the seller gave them
+    assert [items[listing_id] for listing_id in (6, 7)] == ['Fire Beetle Pies', '+80 Potion Strenght Cryonae']
+    assert [items[listing_id] for listing_id in (8, 9, 10, 11, 12)] == UNRESOLVED[:1] + [
+        'bone dagger', 'Steel Shield', 'Oak Plank', 'Mysterious Thing']
+
+
+def test_fuzzy_match_to_a_different_item_is_only_proposed(marketplace_db):
+    # The soup left the catalogue; the fish with a similar name did not
+    conn = sqlite3.connect(marketplace_db)
+    with conn:
+        conn.execute("UPDATE listings SET item = 'Shiny Gurnard Soup' WHERE id = 1")
+    conn.close()
+    renames, _, updated = reconcile(marketplace_db, ['Shiny Gurnard', 'Copper Ore'])
+    assert (renames['Shiny Gurnard Soup'].new, renames['Shiny Gurnard Soup'].applied) == ('Shiny Gurnard', False)
+    assert items_by_id(marketplace_db)[1] == 'Shiny Gurnard Soup'
+    assert updated == 1
+
+
+def test_approved_fuzzy_proposals_are_applied(marketplace_db, item_names):
+    # Approving a different target than the matcher found applies nothing for that name
+    approved = {'Fire Beetle Pies': 'Fire Beetle Pie', '+80 Potion Strenght Cryonae': '+40 Potion Strength Cryonae'}
+    renames, _, updated = reconcile(marketplace_db, item_names, RENAMED, approved_fuzzy=approved)
+    assert renames['Fire Beetle Pies'].applied and not renames['+80 Potion Strenght Cryonae'].applied
+    assert updated == 4
+    items = items_by_id(marketplace_db)
+    assert (items[6], items[7]) == ('Fire Beetle Pie', '+80 Potion Strenght Cryonae')
+
+
+def test_dry_run_leaves_listings_alone(marketplace_db, item_names):
+    before = items_by_id(marketplace_db)
+    renames, _, updated = reconcile(marketplace_db, item_names, RENAMED, dry_run=True)
+    assert renames and updated == 0
+    assert items_by_id(marketplace_db) == before
+
+
+def test_concurrent_edits_are_not_overwritten(marketplace_db, item_names):
+    conn = sqlite3.connect(marketplace_db)
+    index = NameIndex(item_names)
+    by_name = listing_names(conn)
+    renames = {name: index.match(name, RENAMED) for name in ('Ruby Ring', 'Fire Beetle Pies')}
+
+    # Between reading the names and applying the renames, a seller edits
+    # listing 3 and another deletes listing 6
+    other = sqlite3.connect(marketplace_db)
+    with other:
+        other.execute("UPDATE listings SET item = 'Bronze Sword' WHERE id = 3")
+        other.execute('DELETE FROM listings WHERE id = 6')
+    other.close()
+
+    assert apply_renames(conn, renames, by_name) == 1
+    conn.close()
+    items = items_by_id(marketplace_db)
+    assert (items[3], items[4]) == ('Bronze Sword', 'Crimson Ring')
+    assert 6 not in items
+
+
+def test_main_writes_proposals_and_applies_reviewed_ones(marketplace_db, fixture_path, tmp_path, capsys):
+    items = fixture_path('reconcile_items.json')
+    output = tmp_path / 'item_renames.json'
+    assert main(['--db', marketplace_db, '--items', items, '--output', str(output)]) == 0
+    written = json.loads(output.read_text(encoding='utf-8'))
+    assert [rename['old'] for rename in written['renames']] == ['copper  ore']
+    assert {proposal['old'] for proposal in written['proposals']} == {'Fire Beetle Pies', '+80 Potion Strenght Cryonae'}
+    assert 'Ruby Ring' in written['unresolved']
+    assert 'updated 1 listings' in capsys.readouterr().out
+
+    # Review: reject the potion, keep the pie
+    written['proposals'] = [proposal for proposal in written['proposals'] if proposal['old'] == 'Fire Beetle Pies']
+    reviewed = tmp_path / 'reviewed_renames.json'
+    reviewed.write_text(json.dumps(written), encoding='utf-8')
+    assert main(['--db', marketplace_db, '--items', items, '--apply-fuzzy', str(reviewed)]) == 0
+    assert 'updated 1 listings' in capsys.readouterr().out
+    assert (items_by_id(marketplace_db)[6], items_by_id(marketplace_db)[7]) == ('Fire Beetle Pie',
+                                                                                '+80 Potion Strenght Cryonae')
@@ -0,0 +1,36 @@
+import hashlib
+import sqlite3
+
+from bazaar_data.stats import refresh_stats
+
+
+def digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def test_incremental_refresh_without_changes_leaves_the_file_alone(marketplace_db):
+    written, removed = refresh_stats(marketplace_db, lean=True)
+    assert written > 0 and removed == 0
+    before = digest(marketplace_db)
+
+    # Unchanged files are what lets backups skip a snapshot
+    assert refresh_stats(marketplace_db, incremental=True, lean=True) == (0, 0)
+    assert digest(marketplace_db) == before
+
+
+def test_incremental_refresh_picks_up_new_listings(marketplace_db):
+    refresh_stats(marketplace_db, lean=True)
+    conn = sqlite3.connect(marketplace_db)
+    with conn:
+        conn.execute("INSERT INTO listings (item, price, quantity, type, seller, timestamp) "
+                     "VALUES ('Bronze Sword', 1100, 1, 'sell', 'Fay', 1800000000000)")
+    conn.close()
+
+    assert refresh_stats(marketplace_db, incremental=True, lean=True) == (1, 0)
+    conn = sqlite3.connect(marketplace_db)
+    total, watermark = conn.execute(
+        "SELECT total_listings, (SELECT value FROM item_stats_state WHERE key = 'watermark') "
+        "FROM item_stats WHERE item = 'Bronze Sword'").fetchone()
+    conn.close()
+    assert total == 2 and watermark == 1800000000000
@@ -0,0 +1,93 @@
+import os
+import time
+
+import pytest
+
+from bazaar_data.standin import FAULT_STATUS_CODES, placeholder_for, start_standin
+from bazaar_data.store import ImageStore
+from bazaar_data.sync import MAX_WORKERS, REQUESTS_PER_SECOND, ImageJob, TokenBucket, main, sync_images
+
+
+@pytest.fixture
+def standin(request):
+    faults = getattr(request, 'param', {})
+    server, base_url = start_standin([], **faults)
+    yield server, base_url
+    server.shutdown()
+    server.server_close()
+
+
+def jobs_for(directory, count):
+    return [ImageJob(f"Item {n}", f"Item_{n}.png", [os.path.join(directory, f"Item_{n}.png")]) for n in range(count)]
+
+
+def test_default_rate_scales_with_workers():
+    assert REQUESTS_PER_SECOND >= MAX_WORKERS
+
+
+def test_downloads_every_job(standin, tmp_path):
+    _, base_url = standin
+    jobs = jobs_for(str(tmp_path), 12)
+    results, _ = sync_images(jobs, base_url, rate=0, progress_every=0)
+    assert len(results) == 12 and all(result.ok and result.attempts == 1 for result in results)
+    for job in jobs:
+        with open(job.destinations[0], 'rb') as f:
+            assert f.read() == placeholder_for(job.filename)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.part')]
+
+
+@pytest.mark.parametrize('standin', [{'error_rate': 0.5, 'seed': 3}], indirect=True)
+def test_retries_transient_failures(standin, tmp_path):
+    server, base_url = standin
+    results, _ = sync_images(jobs_for(str(tmp_path), 20), base_url, rate=0, progress_every=0, retries=20, backoff=0)
+    assert all(result.ok for result in results)
+    retried = [result for result in results if result.attempts > 1]
+    assert retried
+    assert all(set(result.statuses[:-1]) <= set(FAULT_STATUS_CODES) for result in retried)
+    assert sum(server.stats[status] for status in FAULT_STATUS_CODES) == sum(r.attempts - 1 for r in results)
+
+
+def test_client_errors_are_not_retried(standin, tmp_path):
+    _, base_url = standin
+    # Nothing is served under this prefix, so every request is a 404
+    results, _ = sync_images(jobs_for(str(tmp_path), 3), base_url + '/missing', rate=0, progress_every=0, backoff=0)
+    assert [(result.ok, result.status, result.attempts) for result in results] == [(False, 404, 1)] * 3
+    assert os.listdir(tmp_path) == []
+
+
+def test_store_links_every_destination(standin, tmp_path):
+    _, base_url = standin
+    store = ImageStore(str(tmp_path / 'store'))
+    paths = [str(tmp_path / 'items' / 'Copper_Ore.png'), str(tmp_path / 'legacy' / 'Copper Ore.png')]
+    results, _ = sync_images([ImageJob('Copper Ore', 'Copper_Ore.png', paths)], base_url, rate=0,
+                             progress_every=0, store=store)
+    blob = store.blob_path(results[0].sha256)
+    assert all(os.path.samefile(path, blob) for path in paths)
+
+
+def test_on_result_sees_each_result(standin, tmp_path):
+    _, base_url = standin
+    seen = []
+    results, _ = sync_images(jobs_for(str(tmp_path), 5), base_url, rate=0, progress_every=0, on_result=seen.append)
+    assert seen == results
+
+
+def test_token_bucket_caps_the_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(11):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.18
+
+
+def test_main_offline(tmp_path, capsys):
+    assert main(['--offline', '--dest', str(tmp_path), 'Fire_Beetle.png', 'Copper_Ore.png']) == 0
+    assert sorted(os.listdir(tmp_path)) == ['Copper_Ore.png', 'Fire_Beetle.png']
+    assert 'Downloaded 2/2 images' in capsys.readouterr().out
+
+
+def test_main_fails_when_writes_fail(tmp_path, monkeypatch):
+    monkeypatch.setattr('bazaar_data.sync.backoff_delay', lambda attempt, base: 0)
+    blocker = tmp_path / 'store'
+    blocker.write_text('not a directory')
+    assert main(['--offline', '--dest', str(tmp_path / 'items'), '--store', str(blocker), 'Fire_Beetle.png']) == 1
@@ -23,6 +23,7 @@ const http = require('http');
 const { Server } = require('socket.io');
 const fs = require('fs');
 const path = require('path');
+const { loadCatalogue } = require('./catalogue');
 
 app.set('trust proxy', 1);
 
@@ -1448,6 +1449,45 @@ function getImageFilename(itemName) {
   return name + '.png';
 }
 
+// Build an FTS5 prefix query for a search term, same as match_query() in
+// scripts/bazaar_data/search.py: "pot str" -> "pot"* "str"*
+function ftsQuery(term, column) {
+  const words = String(term).match(/[\p{L}\p{N}_]+/gu);
+  if (!words) return null;
+  const expression = words.map(word => `"${word}"*`).join(' ');
+  return column ? `{${column}} : (${expression})` : expression;
+}
+
+// Whether a database has a table (the FTS indexes are built by the Python refresh job)
+async function hasTable(database, name) {
+  return !!(await database.get('SELECT 1 FROM sqlite_master WHERE name = ?', [name]));
+}
+
+// items.json parsed once and reused until the file changes (used until the
+// scrape has written the compact catalogue)
+let itemsMapCache = { mtimeMs: null, map: {} };
+function loadItemsMap() {
+  const itemsPath = path.join(__dirname, 'data', 'items.json');
+  if (!fs.existsSync(itemsPath)) return {};
+  const { mtimeMs } = fs.statSync(itemsPath);
+  if (itemsMapCache.mtimeMs !== mtimeMs) {
+    const map = {};
+    JSON.parse(fs.readFileSync(itemsPath, 'utf8')).forEach(item => {
+      if (item.Items) {
+        map[item.Items] = item;
+      }
+    });
+    itemsMapCache = { mtimeMs, map };
+  }
+  return itemsMapCache.map;
+}
+
+// Look up one catalogue item by exact name
+function findItem(name) {
+  const catalogue = loadCatalogue();
+  return catalogue ? catalogue.get(name) : (loadItemsMap()[name] || null);
+}
+
 // Get only item names and images for dropdown
 app.get('/api/items/meta/names', async (req, res) => {
   try {
@@ -1514,9 +1554,15 @@ app.get('/api/items/search', async (req, res) => {
       profession, 
       episode, 
       tradeable, 
+      minLevel,
+      maxLevel,
       limit = 50,
       offset = 0 
     } = req.query;
+    const isLevel = (value) => value === undefined || /^\d+$/.test(value);
+    if (!isLevel(minLevel) || !isLevel(maxLevel)) {
+      return res.status(400).json({ error: 'minLevel and maxLevel must be whole numbers' });
+    }
     const db = await open({
       filename: path.join(__dirname, 'data', 'items.db'),
       driver: sqlite3.Database
@@ -1524,12 +1570,32 @@ app.get('/api/items/search', async (req, res) => {
     let query = 'SELECT * FROM items WHERE 1=1';
     let params = [];
     if (searchQuery) {
-      query += ' AND Items LIKE ?';
-      params.push(`%${searchQuery}%`);
+      const match = ftsQuery(searchQuery);
+      if (match && await hasTable(db, 'items_fts')) {
+        query += ' AND id IN (SELECT rowid FROM items_fts WHERE items_fts MATCH ?)';
+        params.push(match);
+      } else {
+        query += ' AND Items LIKE ?';
+        params.push(`%${searchQuery}%`);
+      }
     }
-    if (profession) {
-      query += ' AND ([Profession A] = ? OR [Profession B] = ?)';
-      params.push(profession, profession);
+    // Level bounds apply to the slot the profession is in
+    const levels = [];
+    const levelParams = [];
+    if (minLevel !== undefined) { levels.push('level >= ?'); levelParams.push(parseInt(minLevel)); }
+    if (maxLevel !== undefined) { levels.push('level <= ?'); levelParams.push(parseInt(maxLevel)); }
+    if (profession && await hasTable(db, 'catalogue_items')) {
+      // Typed schema (scripts/bazaar_data/persist.py): integer levels, covering index per profession slot
+      const slot = (column) => `SELECT id FROM catalogue_items WHERE ${column}_id = (SELECT id FROM professions WHERE name = ?)` +
+        levels.map(condition => ' AND ' + condition.replace('level', `${column}_level`)).join('');
+      query += ` AND id IN (${slot('profession_a')} UNION ALL ${slot('profession_b')})`;
+      params.push(profession, ...levelParams, profession, ...levelParams);
+    } else if (profession) {
+      // Legacy items table: levels are text ('None' when unset)
+      const slot = (column) => `([Profession ${column}] = ?` +
+        levels.map(condition => ' AND ' + condition.replace('level', `CAST([Profession Level ${column}] AS INTEGER)`)).join('') + ')';
+      query += ` AND (${slot('A')} OR ${slot('B')})`;
+      params.push(profession, ...levelParams, profession, ...levelParams);
     }
     if (episode) {
       query += ' AND Episode = ?';
@@ -1556,6 +1622,33 @@ app.get('/api/items/search', async (req, res) => {
   }
 });
 
+// Redirect to the smallest image variant the client accepts (written by scripts/bazaar_data/optimize.py)
+// ?size=thumb32|thumb64 asks for a thumbnail; falls back to the original PNG
+const VARIANT_MIME_TYPES = { webp: 'image/webp', avif: 'image/avif', thumb32: 'image/webp', thumb64: 'image/webp' };
+app.get('/api/items/image/:itemName', async (req, res) => {
+  const fallback = "/assets/items/" + getImageFilename(req.params.itemName);
+  try {
+    const db = await open({
+      filename: path.join(__dirname, 'data', 'items.db'),
+      driver: sqlite3.Database
+    });
+    let variants = [];
+    try {
+      variants = await db.all('SELECT variant, path, size FROM item_image_variants WHERE Items = ? ORDER BY size', [req.params.itemName]);
+    } finally {
+      await db.close();
+    }
+    const accept = req.get('Accept') || '';
+    const wanted = req.query.size ? [req.query.size] : ['avif', 'webp'];
+    const best = variants.find(v => wanted.includes(v.variant) && accept.includes(VARIANT_MIME_TYPES[v.variant]));
+    res.set('Vary', 'Accept');
+    res.redirect(302, best ? best.path : fallback);
+  } catch (err) {
+    // No variants table yet: serve the original image
+    res.redirect(302, fallback);
+  }
+});
+
 // Get a specific item by name
 app.get('/api/items/:itemName', async (req, res) => {
   try {
@@ -1566,16 +1659,11 @@ app.get('/api/items/:itemName', async (req, res) => {
       return res.status(404).json({ error: 'Item name is required' });
     }
     
-    const itemsPath = path.join(__dirname, 'data', 'items.json');
-    
-    if (!fs.existsSync(itemsPath)) {
+    if (!loadCatalogue() && !fs.existsSync(path.join(__dirname, 'data', 'items.json'))) {
       return res.status(404).json({ error: 'Items data not found' });
     }
     
-    const itemsData = fs.readFileSync(itemsPath, 'utf8');
-    const items = JSON.parse(itemsData);
-    
-    let item = items.find(i => i.Items === itemName);
+    let item = findItem(itemName);
     
     if (!item) {
       return res.status(404).json({ error: 'Item not found' });
@@ -1593,14 +1681,18 @@ app.get('/api/items/:itemName', async (req, res) => {
 // Get unique professions from items data
 app.get('/api/items/meta/professions', async (req, res) => {
   try {
+    const catalogue = loadCatalogue();
+    if (catalogue) {
+      return res.json(catalogue.values('professions'));
+    }
+    
     const itemsPath = path.join(__dirname, 'data', 'items.json');
     
     if (!fs.existsSync(itemsPath)) {
       return res.status(404).json({ error: 'Items data not found' });
     }
     
-    const itemsData = fs.readFileSync(itemsPath, 'utf8');
-    const items = JSON.parse(itemsData);
+    const items = Object.values(loadItemsMap());
     
     const professions = new Set();
     items.forEach(item => {
@@ -1622,14 +1714,18 @@ app.get('/api/items/meta/professions', async (req, res) => {
 // Get unique episodes from items data
 app.get('/api/items/meta/episodes', async (req, res) => {
   try {
+    const catalogue = loadCatalogue();
+    if (catalogue) {
+      return res.json(catalogue.values('episodes'));
+    }
+    
     const itemsPath = path.join(__dirname, 'data', 'items.json');
     
     if (!fs.existsSync(itemsPath)) {
       return res.status(404).json({ error: 'Items data not found' });
     }
     
-    const itemsData = fs.readFileSync(itemsPath, 'utf8');
-    const items = JSON.parse(itemsData);
+    const items = Object.values(loadItemsMap());
     
     const episodes = new Set();
     items.forEach(item => {
@@ -1665,9 +1761,21 @@ app.get('/api/listings-with-items', async (req, res) => {
     let params = [];
     let conditions = [];
     
+    // Word-prefix matches through the listings_fts index when it exists
+    const useFts = (item_name || seller) && await hasTable(db, 'listings_fts');
+    const addTextFilter = (column, term) => {
+      const match = useFts && ftsQuery(term, column);
+      if (match) {
+        conditions.push('id IN (SELECT rowid FROM listings_fts WHERE listings_fts MATCH ?)');
+        params.push(match);
+      } else {
+        conditions.push(`${column} LIKE ?`);
+        params.push(`%${term}%`);
+      }
+    };
+    
     if (item_name) {
-      conditions.push('item LIKE ?');
-      params.push(`%${item_name}%`);
+      addTextFilter('item', item_name);
     }
     
     if (type) {
@@ -1676,8 +1784,7 @@ app.get('/api/listings-with-items', async (req, res) => {
     }
     
     if (seller) {
-      conditions.push('seller LIKE ?');
-      params.push(`%${seller}%`);
+      addTextFilter('seller', seller);
     }
     
     if (conditions.length > 0) {
@@ -1689,26 +1796,10 @@ app.get('/api/listings-with-items', async (req, res) => {
     
     const listings = await db.all(query, params);
     
-    // Get items data
-    const itemsPath = path.join(__dirname, 'data', 'items.json');
-    let itemsMap = {};
-    
-    if (fs.existsSync(itemsPath)) {
-      const itemsData = fs.readFileSync(itemsPath, 'utf8');
-      const items = JSON.parse(itemsData);
-      
-      // Create a map for quick lookup
-      items.forEach(item => {
-        if (item.Items) {
-          itemsMap[item.Items] = item;
-        }
-      });
-    }
-    
     // Combine listings with item details
     let enrichedListings = listings.map(listing => ({
       ...listing,
-      itemDetails: itemsMap[listing.item] || null
+      itemDetails: findItem(listing.item)
     }));
     
     // Apply additional filters based on item details
@@ -1751,13 +1842,28 @@ app.get('/api/market-stats/:itemName', async (req, res) => {
   try {
     const { itemName } = req.params;
     
-    // Get all listings for this item
-    const listings = await db.all(
-      'SELECT * FROM listings WHERE item = ? ORDER BY timestamp DESC',
-      [itemName]
-    );
+    // Statistics are precomputed into item_stats by scripts/bazaar_data/stats.py
+    let stats = null;
+    try {
+      stats = await db.get('SELECT * FROM item_stats WHERE item = ?', [itemName]);
+    } catch (err) {
+      // item_stats has not been built yet; aggregate in SQL below
+    }
+    if (!stats) {
+      stats = await db.get(`
+        SELECT COUNT(*) AS total_listings,
+          SUM(type = 'buy') AS buy_listings,
+          SUM(type = 'sell') AS sell_listings,
+          ROUND(AVG(price)) AS average_price,
+          MIN(CASE WHEN type = 'sell' THEN price END) AS lowest_sell_price,
+          MAX(CASE WHEN type = 'buy' THEN price END) AS highest_buy_price,
+          COALESCE(SUM(quantity), 0) AS total_quantity
+        FROM listings WHERE item = ?`,
+        [itemName]
+      );
+    }
     
-    if (listings.length === 0) {
+    if (!stats.total_listings) {
       return res.json({
         item: itemName,
         totalListings: 0,
@@ -1770,28 +1876,30 @@ app.get('/api/market-stats/:itemName', async (req, res) => {
       });
     }
     
-    const buyListings = listings.filter(l => l.type === 'buy');
-    const sellListings = listings.filter(l => l.type === 'sell');
-    
-    const allPrices = listings.map(l => l.price);
-    const sellPrices = sellListings.map(l => l.price);
-    const buyPrices = buyListings.map(l => l.price);
-    
-    const totalQuantity = listings.reduce((sum, l) => sum + l.quantity, 0);
-    const averagePrice = allPrices.length > 0 
-      ? allPrices.reduce((sum, price) => sum + price, 0) / allPrices.length 
-      : null;
+    const recentListings = await db.all(
+      'SELECT * FROM listings WHERE item = ? ORDER BY timestamp DESC LIMIT 10',
+      [itemName]
+    );
     
     res.json({
       item: itemName,
-      totalListings: listings.length,
-      buyListings: buyListings.length,
-      sellListings: sellListings.length,
-      averagePrice: averagePrice ? Math.round(averagePrice) : null,
-      lowestSellPrice: sellPrices.length > 0 ? Math.min(...sellPrices) : null,
-      highestBuyPrice: buyPrices.length > 0 ? Math.max(...buyPrices) : null,
-      totalQuantity: totalQuantity,
-      recentListings: listings.slice(0, 10) // Last 10 listings
+      totalListings: stats.total_listings,
+      buyListings: stats.buy_listings,
+      sellListings: stats.sell_listings,
+      averagePrice: stats.average_price ?? null,
+      medianPrice: stats.median_price ?? null,
+      pricePercentiles: stats.median_price == null ? null : {
+        p10: stats.p10_price,
+        p25: stats.p25_price,
+        p50: stats.median_price,
+        p75: stats.p75_price,
+        p90: stats.p90_price
+      },
+      lowestSellPrice: stats.lowest_sell_price ?? null,
+      highestBuyPrice: stats.highest_buy_price ?? null,
+      totalQuantity: stats.total_quantity,
+      updatedAt: stats.updated_at ?? null,
+      recentListings: recentListings // Last 10 listings
     });
   } catch (err) {
     console.error('Error getting market stats:', err);
@@ -1799,6 +1907,101 @@ app.get('/api/market-stats/:itemName', async (req, res) => {
   }
 });
 
+// Price history recorded by scripts/bazaar_data/history.py
+// ?interval=raw|hour|day|week (default day), ?from / ?to in ms since epoch
+const PRICE_HISTORY_INTERVALS = ['raw', 'hour', 'day', 'week'];
+app.get('/api/price-history/:itemName', async (req, res) => {
+  const historyPath = path.join(__dirname, 'data', 'price_history.db');
+  const interval = req.query.interval || 'day';
+  if (!PRICE_HISTORY_INTERVALS.includes(interval)) {
+    return res.status(400).json({ error: `interval must be one of ${PRICE_HISTORY_INTERVALS.join(', ')}` });
+  }
+  const to = Number(req.query.to) || Date.now();
+  const from = Number(req.query.from) || to - 365 * 24 * 60 * 60 * 1000;
+  if (!fs.existsSync(historyPath)) {
+    return res.json({ item: req.params.itemName, interval, from, to, points: [] });
+  }
+  try {
+    const historyDb = await open({
+      filename: historyPath,
+      driver: sqlite3.Database,
+      mode: sqlite3.OPEN_READONLY
+    });
+    const points = interval === 'raw'
+      ? await historyDb.all(
+        `SELECT ts, best_bid, best_ask, bid_volume, ask_volume, listings FROM price_points
+         WHERE item = ? AND ts BETWEEN ? AND ? ORDER BY ts`,
+        [req.params.itemName, from, to]
+      )
+      : await historyDb.all(
+        `SELECT bucket, open, high, low, close, best_bid, best_ask, volume, samples FROM price_rollups
+         WHERE interval = ? AND item = ? AND bucket BETWEEN ? AND ? ORDER BY bucket`,
+        [interval, req.params.itemName, from, to]
+      );
+    await historyDb.close();
+    res.json({ item: req.params.itemName, interval, from, to, points });
+  } catch (err) {
+    console.error('Error getting price history:', err);
+    res.status(500).json({ error: 'Failed to get price history' });
+  }
+});
+
+// Order book kept by scripts/bazaar_data/orderbook.py: best bid/ask in unit
+// prices and the buy/sell listings that cross, best pairs first
+app.get('/api/order-book/:itemName', async (req, res) => {
+  const { itemName } = req.params;
+  try {
+    if (!await hasTable(db, 'order_book_spreads')) {
+      return res.status(503).json({ error: 'Order books have not been built yet' });
+    }
+    const book = await db.get('SELECT * FROM order_book_spreads WHERE item = ?', [itemName]);
+    if (!book) {
+      return res.json({
+        item: itemName,
+        bestBid: null,
+        bestAsk: null,
+        spread: null,
+        bidVolume: 0,
+        askVolume: 0,
+        bids: 0,
+        asks: 0,
+        crossedQuantity: 0,
+        updatedAt: null,
+        matches: []
+      });
+    }
+    const matches = await db.all(
+      `SELECT rank, bid_id, ask_id, bid_price, ask_price, price, quantity FROM order_book_matches
+       WHERE item = ? ORDER BY rank`,
+      [itemName]
+    );
+    res.json({
+      item: itemName,
+      bestBid: book.best_bid,
+      bestAsk: book.best_ask,
+      spread: book.spread,
+      bidVolume: book.bid_volume,
+      askVolume: book.ask_volume,
+      bids: book.bids,
+      asks: book.asks,
+      crossedQuantity: book.crossed_quantity,
+      updatedAt: book.updated_at,
+      matches: matches.map(match => ({
+        rank: match.rank,
+        bidId: match.bid_id,
+        askId: match.ask_id,
+        bidPrice: match.bid_price,
+        askPrice: match.ask_price,
+        price: match.price,
+        quantity: match.quantity
+      }))
+    });
+  } catch (err) {
+    console.error('Error getting order book:', err);
+    res.status(500).json({ error: 'Failed to get order book' });
+  }
+});
+
 // ==== CONSOLIDATED API ENDPOINTS ====
 
 // Get all listings (API endpoint for consistency)
@@ -2181,6 +2384,12 @@ io.on('connection', (socket) => {
     
     console.log('Database connected successfully');
 
+    // The Python jobs (order books, stats, backups) write to the same file:
+    // WAL lets them read while we write, and the busy timeout waits out their
+    // short write transactions instead of failing with SQLITE_BUSY
+    await db.exec('PRAGMA journal_mode = WAL');
+    await db.exec('PRAGMA busy_timeout = 5000');
+
     // Create tables if they don't exist
     await db.exec(`
       CREATE TABLE IF NOT EXISTS listings (
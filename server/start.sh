@@ -11,6 +11,10 @@ mkdir -p /var/log/cron
 echo "Running initial scrape check..."
 /app/scripts/check_and_scrape.sh
 
+# Start the order book watcher (cron restarts it if it stops)
+echo "Starting order book watcher..."
+(cd /app/scripts && python3 -m bazaar_data.orderbook watch >> /var/log/cron/orderbook.log 2>&1 &)
+
 # Start the Node.js server
 echo "Starting Node.js server..."
 cd /app && node server.js